@@ -1,16 +1,255 @@
+import hashlib
+import json
 import logging
-from typing import Any, Dict, Literal, Optional
+from typing import Any, Dict, Literal, Optional, Tuple
 
+import httpx
+
+from app.config import CacheConfig
+from app.domain.ports import StateStore
+from app.infra.cache import NOT_FOUND, TTLCache
 from app.infra.chatwoot_client import ChatwootClient
+from app.infra.media import MediaFile
+from app.infra.single_flight import SingleFlight
+from app.infra.state_store import best_effort_lock
+from app.infra.tracing import TRACER
 
 logger = logging.getLogger(__name__)
 
+# Platform user ids that identify a contact within an inbox (in lookup priority)
+CHANNEL_USER_KEYS = ("vk_user_id", "telegram_user_id")
+
+ContactKey = Tuple[int, str, str]
+ConversationKey = Tuple[int, int, str]
+
+# Conversation statuses that may receive new incoming messages
+REUSABLE_STATUSES = ("open", "pending")
+
+# A 422 from send_message means a stale conversation id only with one of these in
+# its error text; other 422s are validation errors of the message itself
+STALE_CONVERSATION_REASONS = (
+    "not found",
+    "does not exist",
+    "doesn't exist",
+    "missing",
+    "closed",
+    "resolved",
+)
+
 
 class ChatwootService:
-    """Uses ChatwootClient to upsert contact, ensure conversation, and post messages."""
+    """
+    Uses ChatwootClient to upsert contact, ensure conversation, and post messages.
+    With a shared `state` store (several replicas), resolved contact and conversation
+    ids are also kept there, and resolving one channel user or conversation holds a
+    per-key lock, so replicas neither repeat lookups nor create duplicates.
+    Conversation ids are then always read from the store (a status change seen by
+    one replica applies to all); contacts keep the local cache in front.
+    """
 
-    def __init__(self, client: ChatwootClient):
+    def __init__(
+        self,
+        client: ChatwootClient,
+        cache: Optional[CacheConfig] = None,
+        state: Optional[StateStore] = None,
+    ):
         self._client = client
+        cache = cache or CacheConfig()
+        self._state = state
+        self._contact_ttl = cache.contact_ttl
+        self._conversation_ttl = cache.conversation_ttl
+        # (inbox_id, key kind, key value) -> {"id", "source_id"} or NOT_FOUND
+        self._contacts: TTLCache[Dict[str, Any]] = TTLCache(
+            max_size=cache.contact_max_size,
+            ttl=cache.contact_ttl,
+            negative_ttl=cache.contact_negative_ttl,
+        )
+        # contact_id -> fingerprint of the attribute set we last wrote
+        self._attr_fingerprints: TTLCache[bytes] = TTLCache(
+            max_size=cache.contact_max_size,
+            ttl=cache.contact_ttl,
+        )
+        self.attribute_updates_performed = 0
+        self.attribute_updates_skipped = 0
+        # (contact_id, inbox_id, source_id) -> conversation id
+        self._conversations: TTLCache[int] = TTLCache(
+            max_size=cache.conversation_max_size,
+            ttl=cache.conversation_ttl,
+        )
+        # Concurrent cache misses for the same key share one Chatwoot round-trip
+        self._contact_flights: SingleFlight[Dict[str, Any]] = SingleFlight()
+        self._conversation_flights: SingleFlight[int] = SingleFlight()
+
+    @staticmethod
+    def contact_cache_key(
+        inbox_id: int, search_key: str, custom_attributes: Optional[Dict[str, Any]]
+    ) -> ContactKey:
+        """Cache key: platform user id if known (VK/Telegram), else search_key (msisdn)."""
+        attrs = custom_attributes or {}
+        for k in CHANNEL_USER_KEYS:
+            if attrs.get(k):
+                return (int(inbox_id), k, str(attrs[k]))
+        return (int(inbox_id), "search_key", str(search_key))
+
+    @staticmethod
+    def _shared_key(kind: str, key: Tuple[Any, ...]) -> str:
+        return f"cw:{kind}:" + ":".join(str(part) for part in key)
+
+    async def _shared_get(self, key: str) -> Any:
+        if self._state is None:
+            return None
+        try:
+            return await self._state.get(key)
+        except Exception as e:
+            logger.warning("[chatwoot] shared cache read failed: %s", e)
+            return None
+
+    async def _shared_set(self, key: str, value: Any, ttl: float) -> None:
+        if self._state is None:
+            return
+        try:
+            await self._state.set(key, value, ttl=ttl)
+        except Exception as e:
+            logger.warning("[chatwoot] shared cache write failed: %s", e)
+
+    async def _shared_delete(self, *keys: str) -> None:
+        if self._state is None:
+            return
+        for key in keys:
+            try:
+                await self._state.delete(key)
+            except Exception as e:
+                logger.warning("[chatwoot] shared cache delete failed: %s", e)
+
+    async def invalidate_contact(
+        self,
+        *,
+        inbox_id: int,
+        search_key: str,
+        custom_attributes: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Forget a cached contact resolution for one channel user."""
+        cache_key = self.contact_cache_key(inbox_id, search_key, custom_attributes)
+        await self._shared_delete(self._shared_key("contact", cache_key))
+        return self._contacts.invalidate(cache_key)
+
+    async def invalidate_contact_id(self, contact_id: int) -> int:
+        """Forget every cached resolution pointing to a Chatwoot contact id."""
+        reverse_key = f"cw:contact-id:{int(contact_id)}"
+        shared_key = await self._shared_get(reverse_key)
+        if shared_key:
+            await self._shared_delete(shared_key, reverse_key)
+        return self._contacts.invalidate_where(
+            lambda _k, v: v is not NOT_FOUND and v.get("id") == int(contact_id)
+        )
+
+    async def invalidate_conversation(self, conversation_id: int) -> int:
+        """Forget every cached mapping to a conversation (e.g. it was resolved)."""
+        dropped = self._conversations.invalidate_where(
+            lambda _k, v: v == int(conversation_id)
+        )
+        reverse_key = f"cw:conv-id:{int(conversation_id)}"
+        shared_key = await self._shared_get(reverse_key)
+        if shared_key:
+            await self._shared_delete(shared_key, reverse_key)
+            dropped += 1
+        if dropped:
+            logger.info(
+                "[chatwoot] conversation cache invalidated id=%s", conversation_id
+            )
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "contacts": self._contacts.stats(),
+            "conversations": self._conversations.stats(),
+            "attribute_updates": {
+                "performed": self.attribute_updates_performed,
+                "skipped": self.attribute_updates_skipped,
+            },
+            "single_flight": {
+                "contacts": self._contact_flights.stats(),
+                "conversations": self._conversation_flights.stats(),
+            },
+        }
+
+    @staticmethod
+    def _attributes_fingerprint(
+        identifier: Optional[str],
+        custom_attributes: Optional[Dict[str, Any]],
+        additional_attributes: Optional[Dict[str, Any]],
+    ) -> bytes:
+        """Compact, order-independent hash of an attribute set."""
+        raw = json.dumps(
+            [identifier, custom_attributes or {}, additional_attributes],
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest()
+
+    @staticmethod
+    def _contact_has_attributes(
+        contact: Dict[str, Any],
+        identifier: Optional[str],
+        custom_attributes: Optional[Dict[str, Any]],
+        additional_attributes: Optional[Dict[str, Any]],
+    ) -> bool:
+        """True if a fetched contact already holds every value we would PATCH."""
+        if identifier and contact.get("identifier") != identifier:
+            return False
+        for field, wanted in (
+            ("custom_attributes", custom_attributes),
+            ("additional_attributes", additional_attributes),
+        ):
+            current = contact.get(field) or {}
+            for k, v in (wanted or {}).items():
+                if current.get(k) != v:
+                    return False
+        return True
+
+    async def _sync_attributes(
+        self,
+        *,
+        contact_id: int,
+        identifier: Optional[str],
+        custom_attributes: Optional[Dict[str, Any]],
+        additional_attributes: Optional[Dict[str, Any]],
+        current: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        PATCH contact attributes only when they differ from what was last written
+        (or, for a freshly fetched contact, from what it already holds). Best effort.
+        """
+        if not custom_attributes and additional_attributes is None:
+            return
+        fingerprint = self._attributes_fingerprint(
+            identifier, custom_attributes, additional_attributes
+        )
+        unchanged = self._attr_fingerprints.get(contact_id) == fingerprint or (
+            current is not None
+            and self._contact_has_attributes(
+                current, identifier, custom_attributes, additional_attributes
+            )
+        )
+        if unchanged:
+            self.attribute_updates_skipped += 1
+            self._attr_fingerprints.set(contact_id, fingerprint)
+            return
+        try:
+            await self._client.update_contact(
+                contact_id=contact_id,
+                name=None,
+                phone_number=None,
+                email=None,
+                identifier=identifier,
+                custom_attributes=custom_attributes,
+                additional_attributes=additional_attributes,
+            )
+            self.attribute_updates_performed += 1
+            self._attr_fingerprints.set(contact_id, fingerprint)
+        except Exception as e:
+            logger.warning("[chatwoot] update_contact skipped: %s", e)
 
     async def ensure_contact(
         self,
@@ -26,23 +265,99 @@ class ChatwootService:
         """
         Upsert contact and return {'id', 'source_id'}.
         Strategy:
+        - Return the cached resolution for (inbox_id, channel user key) if present.
         - If custom_attributes contain platform user ids (vk_user_id/telegram_user_id), FIRST try /contacts/filter.
         - Else try /contacts/search with search_key (e.g., phone for WhatsApp).
-        - If found -> update attributes (best effort).
+        - If found -> update attributes (best effort, only if they changed).
         - If not found -> create with inbox_id + attributes.
+        A recent "not found" (negative entry) skips the lookups and goes straight to create.
+        Concurrent misses for the same channel user share one lookup/create.
         """
-        contacts = []
+        with TRACER.span("chatwoot.ensure_contact", inbox_id=inbox_id):
+            vk_user_id = (custom_attributes or {}).get("vk_user_id")
+            vk_identifier = f"vk:{vk_user_id}" if vk_user_id else None
+
+            cache_key = self.contact_cache_key(inbox_id, search_key, custom_attributes)
+            shared_key = self._shared_key("contact", cache_key)
+            cached = self._contacts.get(cache_key)
+            if cached is None and self._state is not None:
+                # Another replica may have resolved this user already
+                cached = await self._shared_get(shared_key)
+                if cached is not None:
+                    self._contacts.set(cache_key, cached)
+            if cached is not None and cached is not NOT_FOUND:
+                await self._sync_attributes(
+                    contact_id=cached["id"],
+                    identifier=vk_identifier,
+                    custom_attributes=custom_attributes,
+                    additional_attributes=additional_attributes,
+                )
+                return dict(cached)
+
+            resolved_here = False
+
+            async def _resolve() -> Dict[str, Any]:
+                nonlocal resolved_here
+                async with best_effort_lock(self._state, shared_key):
+                    if self._state is not None:
+                        # Re-check: the lock holder before us may have resolved it
+                        shared = await self._shared_get(shared_key)
+                        if shared is not None:
+                            self._contacts.set(cache_key, shared)
+                            return shared
+                    resolved_here = True
+                    result = await self._resolve_contact(
+                        cache_key=cache_key,
+                        known_missing=cached is NOT_FOUND,
+                        inbox_id=inbox_id,
+                        search_key=search_key,
+                        name=name,
+                        phone=phone,
+                        email=email,
+                        identifier=vk_identifier,
+                        custom_attributes=custom_attributes,
+                        additional_attributes=additional_attributes,
+                    )
+                    await self._shared_set(shared_key, result, self._contact_ttl)
+                    await self._shared_set(
+                        f"cw:contact-id:{result['id']}", shared_key, self._contact_ttl
+                    )
+                    return result
+
+            result = await self._contact_flights.do(cache_key, _resolve)
+            if not resolved_here:
+                # Joined another caller's (or replica's) lookup: apply our own attributes
+                await self._sync_attributes(
+                    contact_id=result["id"],
+                    identifier=vk_identifier,
+                    custom_attributes=custom_attributes,
+                    additional_attributes=additional_attributes,
+                )
+            return dict(result)
+
+    async def _resolve_contact(
+        self,
+        *,
+        cache_key: ContactKey,
+        known_missing: bool,
+        inbox_id: int,
+        search_key: str,
+        name: Optional[str],
+        phone: Optional[str],
+        email: Optional[str],
+        identifier: Optional[str],
+        custom_attributes: Dict[str, Any],
+        additional_attributes: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Look the contact up in Chatwoot (filter, then search) or create it; caches the result."""
 
-        vk_user_id = (custom_attributes or {}).get("vk_user_id")
-        vk_identifier = f"vk:{vk_user_id}" if vk_user_id else None
+        contacts = []
 
         # 1) Attribute-based lookup
         attr_lookup_keys = [
-            k
-            for k in ("vk_user_id", "telegram_user_id")
-            if k in (custom_attributes or {})
+            k for k in CHANNEL_USER_KEYS if k in (custom_attributes or {})
         ]
-        if attr_lookup_keys:
+        if attr_lookup_keys and not known_missing:
             try:
                 res = await self._client.filter_contacts(
                     {k: custom_attributes[k] for k in attr_lookup_keys}
@@ -52,7 +367,7 @@ class ChatwootService:
                 logger.warning("[chatwoot] filter_contacts failed: %s", e)
 
         # 2) Fallback search
-        if not contacts:
+        if not contacts and not known_missing:
             try:
                 res = await self._client.search_contacts(q=search_key)
                 contacts = (res or {}).get("payload") or []
@@ -63,20 +378,14 @@ class ChatwootService:
         if contacts:
             contact = contacts[0]
             contact_id = int(contact.get("id"))
-            # Update attributes only if provided
-            if custom_attributes or additional_attributes is not None:
-                try:
-                    await self._client.update_contact(
-                        contact_id=contact_id,
-                        name=None,
-                        phone_number=None,
-                        email=None,
-                        identifier=vk_identifier,
-                        custom_attributes=custom_attributes,
-                        additional_attributes=additional_attributes,  # NEW
-                    )
-                except Exception as e:
-                    logger.warning("[chatwoot] update_contact skipped: %s", e)
+            # Update attributes only if provided and changed
+            await self._sync_attributes(
+                contact_id=contact_id,
+                identifier=identifier,
+                custom_attributes=custom_attributes,
+                additional_attributes=additional_attributes,
+                current=contact,
+            )
             # Optionally set name if empty
             if name and not (contact.get("name") or "").strip():
                 try:
@@ -87,19 +396,35 @@ class ChatwootService:
                 except Exception as e:
                     logger.warning("[chatwoot] update name skipped: %s", e)
         else:
-            created = await self._client.create_contact(
-                inbox_id=inbox_id,
-                name=name or search_key,
-                phone_number=phone,
-                email=email,
-                identifier=vk_identifier,
-                custom_attributes=custom_attributes or {},
-                additional_attributes=additional_attributes,  # NEW
-            )
+            self._contacts.set_not_found(cache_key)
+            try:
+                created = await self._client.create_contact(
+                    inbox_id=inbox_id,
+                    name=name or search_key,
+                    phone_number=phone,
+                    email=email,
+                    identifier=identifier,
+                    custom_attributes=custom_attributes or {},
+                    additional_attributes=additional_attributes,  # NEW
+                )
+            except Exception:
+                # A create that failed right after a cached miss may be a conflict
+                # (contact created elsewhere): do full lookups next time.
+                if known_missing:
+                    self._contacts.invalidate(cache_key)
+                raise
             payload = (created or {}).get("payload") or {}
             contact = payload.get("contact") or created.get("contact") or {}
             if not contact and "id" in (created or {}):
                 contact = created
+            if contact.get("id") is not None:
+                # Attributes were written on creation
+                self._attr_fingerprints.set(
+                    int(contact["id"]),
+                    self._attributes_fingerprint(
+                        identifier, custom_attributes, additional_attributes
+                    ),
+                )
 
         # 4) Extract source_id
         source_id = self._extract_source_id_for_inbox(contact, inbox_id) or search_key
@@ -109,7 +434,9 @@ class ChatwootService:
             inbox_id,
             source_id,
         )
-        return {"id": int(contact.get("id")), "source_id": source_id}
+        result = {"id": int(contact.get("id")), "source_id": source_id}
+        self._contacts.set(cache_key, result)
+        return result
 
     def _extract_source_id_for_inbox(
         self, contact: Dict[str, Any], inbox_id: int
@@ -131,11 +458,70 @@ class ChatwootService:
         source_id: str,
         custom_attributes: Optional[Dict[str, Any]] = None,
     ) -> int:
-        res = await self._client.list_conversations(contact_id)
+        """
+        Return an open/pending conversation for (contact, inbox, source_id), creating one if needed.
+        The id is cached until Chatwoot reports a status change or a send finds it stale;
+        concurrent misses share one list/create round-trip (across replicas when the
+        state store is shared).
+        """
+        with TRACER.span("chatwoot.ensure_conversation", inbox_id=inbox_id):
+            cache_key: ConversationKey = (
+                int(contact_id),
+                int(inbox_id),
+                str(source_id),
+            )
+            shared_key = self._shared_key("conv", cache_key)
+            if self._state is not None:
+                # No local copy: a status change seen by any replica must apply here
+                cached = await self._shared_get(shared_key)
+                if cached is not None:
+                    return int(cached)
+            else:
+                cached = self._conversations.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            async def _resolve() -> int:
+                async with best_effort_lock(self._state, shared_key):
+                    if self._state is not None:
+                        shared = await self._shared_get(shared_key)
+                        if shared is not None:
+                            return int(shared)
+                    conv_id = await self._resolve_conversation(
+                        inbox_id=inbox_id,
+                        contact_id=contact_id,
+                        source_id=source_id,
+                        custom_attributes=custom_attributes,
+                    )
+                    await self._shared_set(shared_key, conv_id, self._conversation_ttl)
+                    await self._shared_set(
+                        f"cw:conv-id:{conv_id}", shared_key, self._conversation_ttl
+                    )
+                if self._state is None:
+                    self._conversations.set(cache_key, conv_id)
+                return conv_id
+
+            return await self._conversation_flights.do(cache_key, _resolve)
+
+    async def _resolve_conversation(
+        self,
+        *,
+        inbox_id: int,
+        contact_id: int,
+        source_id: str,
+        custom_attributes: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        try:
+            res = await self._client.list_conversations(contact_id)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                # Contact was deleted in Chatwoot; make the next message re-resolve it
+                await self.invalidate_contact_id(contact_id)
+            raise
         conversations = (res or {}).get("payload") or []
 
         for conv in conversations:
-            if conv.get("status") not in ("open", "pending"):
+            if conv.get("status") not in REUSABLE_STATUSES:
                 continue
             nested_source_id = (
                 (conv.get("last_non_activity_message") or {})
@@ -163,19 +549,91 @@ class ChatwootService:
         logger.info("[chatwoot] create conversation id=%s inbox=%s", conv_id, inbox_id)
         return int(conv_id)
 
+    async def deliver_incoming(
+        self,
+        *,
+        inbox_id: int,
+        contact_id: int,
+        source_id: str,
+        content: str,
+        attachment: Optional[MediaFile] = None,
+    ) -> int:
+        """
+        Post an incoming message into the contact's conversation and return its id.
+        - `attachment` (if given) is uploaded with the message.
+        - If Chatwoot rejects a cached conversation id (404/422), re-resolve once and
+          retry.
+        """
+        conv_id = await self.ensure_conversation(
+            inbox_id=inbox_id, contact_id=contact_id, source_id=source_id
+        )
+        try:
+            await self.create_message(
+                conversation_id=conv_id,
+                content=content,
+                direction="incoming",
+                attachment=attachment,
+            )
+        except httpx.HTTPStatusError as e:
+            if not _is_stale_conversation(e.response):
+                raise
+            logger.warning(
+                "[chatwoot] conversation id=%s rejected (%s); re-resolving",
+                conv_id,
+                e.response.status_code,
+            )
+            await self.invalidate_conversation(conv_id)
+            conv_id = await self.ensure_conversation(
+                inbox_id=inbox_id, contact_id=contact_id, source_id=source_id
+            )
+            await self.create_message(
+                conversation_id=conv_id,
+                content=content,
+                direction="incoming",
+                attachment=attachment,
+            )
+        return conv_id
+
     async def create_message(
         self,
         *,
         conversation_id: int,
         content: str,
         direction: Literal["incoming", "outgoing"],
+        attachment: Optional[MediaFile] = None,
     ) -> int:
         message_type = "incoming" if direction == "incoming" else "outgoing"
-        res = await self._client.send_message(
-            conversation_id=conversation_id,
-            content=content or "",
-            message_type=message_type,
-        )
+        if attachment is not None:
+            res = await self._client.send_attachment(
+                conversation_id=conversation_id,
+                content=content or "",
+                # From the start: a retry sends the same file again
+                file=attachment.rewind(),
+                filename=attachment.filename or "attachment",
+                mime_type=attachment.mime_type,
+                message_type=message_type,
+            )
+        else:
+            res = await self._client.send_message(
+                conversation_id=conversation_id,
+                content=content or "",
+                message_type=message_type,
+            )
         msg_id = (res or {}).get("id") or ((res or {}).get("payload") or {}).get("id")
         logger.info("[chatwoot] create_message id=%s type=%s", msg_id, message_type)
         return int(msg_id)
+
+
+def _is_stale_conversation(response: httpx.Response) -> bool:
+    """404, or a 422 whose body reports the conversation as missing or closed."""
+    if response.status_code == 404:
+        return True
+    if response.status_code != 422:
+        return False
+    try:
+        text = response.text.lower()
+    except Exception:
+        return False
+    return "conversation" in text and any(
+        reason in text for reason in STALE_CONVERSATION_REASONS
+    )
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Set
+
+from app.domain.message import TextContent, UnifiedMessage
+from app.infra.journal import JOURNAL_ID_KEY, MESSAGE_KEY, inbound_message
+from app.infra.metrics import COALESCE_FLUSHES, COALESCED_MESSAGES
+from app.infra.tracing import Span, current_span
+
+logger = logging.getLogger(__name__)
+
+Process = Callable[[Dict[str, Any]], Awaitable[None]]
+# submit(key, process, payload, spans of the merged messages) enqueues synchronously
+# (keeps order); the spans are those active when each message was added
+Submit = Callable[[str, Process, Dict[str, Any], List[Span]], "asyncio.Future"]
+
+
+class _Batch:
+    __slots__ = ("channel", "process", "payloads", "chars", "spans", "timer")
+
+    def __init__(self, channel: str, process: Process):
+        self.channel = channel
+        self.process = process
+        self.payloads: List[Dict[str, Any]] = []
+        self.chars = 0
+        self.spans: List[Span] = []  # of the traced messages, linked on flush
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class InboundCoalescer:
+    """
+    Merges consecutive text messages of one sender (key) into one Chatwoot message.
+    - A batch is flushed `window` seconds (per channel) after its last message, once
+      it holds `max_messages` messages or would exceed `max_chars`, and before a
+      non-text message of the same sender (which then follows on its own).
+    - Texts are joined with `separator` in arrival order; the merged payload carries
+      the journal ids of every merged message, so all are acknowledged together.
+    - Flushed batches are handed to `submit` synchronously, which keeps them in
+      order with the sender's later messages.
+    Channels without a window (or with 0) are not coalesced.
+    """
+
+    def __init__(
+        self,
+        *,
+        windows: Mapping[str, float],
+        submit: Submit,
+        max_messages: int = 10,
+        max_chars: int = 4000,
+        separator: str = "\n",
+    ):
+        self._windows = {ch: w for ch, w in windows.items() if w > 0}
+        self._submit = submit
+        self._max_messages = max(1, max_messages)
+        self._max_chars = max_chars
+        self._separator = separator
+        self._batches: Dict[str, _Batch] = {}
+        self._pending: Set["asyncio.Future"] = set()
+        self.messages = 0
+        self.flushes = 0
+
+    def enabled(self, channel: str) -> bool:
+        return channel in self._windows
+
+    def add(
+        self, channel: str, key: str, process: Process, payload: Dict[str, Any]
+    ) -> Optional["asyncio.Future"]:
+        """
+        Buffer one inbound message. Returns the future of a batch flushed right away
+        (size limit or non-text message), which the caller may await for
+        backpressure; None while the message waits in its batch.
+        """
+        message = inbound_message(payload)
+        batch = self._batches.get(key)
+        if not isinstance(message.content, TextContent) or not message.content.text:
+            if batch is not None:
+                self._flush(key, "non_text")
+            # Passed on alone, behind the batch it interrupted
+            self._count(channel, "non_text", 1)
+            return self._track(self._submit(key, process, payload, _traced()))
+
+        text_len = len(message.content.text)
+        if (
+            batch is not None
+            and batch.chars + len(self._separator) + text_len > self._max_chars
+        ):
+            self._flush(key, "size")
+            batch = None
+        if batch is None:
+            batch = self._batches[key] = _Batch(channel, process)
+        elif batch.chars:
+            batch.chars += len(self._separator)
+        batch.payloads.append(payload)
+        batch.spans.extend(_traced())
+        batch.chars += text_len
+
+        if batch.timer is not None:
+            batch.timer.cancel()
+        if len(batch.payloads) >= self._max_messages:
+            return self._flush(key, "size")
+        batch.timer = asyncio.get_running_loop().call_later(
+            self._windows[channel], self._flush, key, "timer"
+        )
+        return None
+
+    def _flush(self, key: str, reason: str) -> Optional["asyncio.Future"]:
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return None
+        if batch.timer is not None:
+            batch.timer.cancel()
+        self._count(batch.channel, reason, len(batch.payloads))
+        return self._track(
+            self._submit(key, batch.process, self._merge(batch), batch.spans)
+        )
+
+    def _merge(self, batch: _Batch) -> Dict[str, Any]:
+        if len(batch.payloads) == 1:
+            return batch.payloads[0]
+        messages: List[UnifiedMessage] = [inbound_message(p) for p in batch.payloads]
+        # The latest message carries the freshest sender details
+        merged = messages[-1].model_copy(
+            update={
+                "content": TextContent(
+                    type="text",
+                    text=self._separator.join(m.content.text for m in messages),
+                )
+            }
+        )
+        journal_ids = [p[JOURNAL_ID_KEY] for p in batch.payloads if JOURNAL_ID_KEY in p]
+        payload: Dict[str, Any] = {MESSAGE_KEY: merged}
+        if journal_ids:
+            payload[JOURNAL_ID_KEY] = journal_ids
+        return payload
+
+    def _count(self, channel: str, reason: str, messages: int) -> None:
+        self.messages += messages
+        self.flushes += 1
+        COALESCED_MESSAGES.inc(channel, amount=messages)
+        COALESCE_FLUSHES.inc(channel, reason)
+
+    def _track(self, fut: "asyncio.Future") -> "asyncio.Future":
+        self._pending.add(fut)
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut: "asyncio.Future") -> None:
+        self._pending.discard(fut)
+        if not fut.cancelled() and fut.exception() is not None:
+            logger.warning("[coalesce] batch failed: %s", fut.exception())
+
+    async def close(self) -> None:
+        """Flush every open batch and wait until all flushed batches were processed."""
+        for key in list(self._batches):
+            self._flush(key, "shutdown")
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "windows": self._windows,
+            "open_batches": len(self._batches),
+            "buffered": sum(len(b.payloads) for b in self._batches.values()),
+            "messages": self.messages,
+            "flushes": self.flushes,
+            # Inbound messages per Chatwoot message (1.0 = nothing merged)
+            "merge_ratio": (
+                round(self.messages / self.flushes, 3) if self.flushes else None
+            ),
+        }
+
+
+def _traced() -> List[Span]:
+    span = current_span()
+    return [span] if span is not None else []
@@ -1,80 +1,267 @@
+import asyncio
+import functools
 import logging
-from typing import Any, Dict, Mapping, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
 
-import httpx
-from pyee.asyncio import AsyncIOEventEmitter
-
-from app.application.chatwoot_service import ChatwootService
+from app.application.chatwoot_service import REUSABLE_STATUSES, ChatwootService
+from app.application.coalesce import InboundCoalescer
+from app.application.lanes import KeyedExecutor
 from app.application.router import MessageRouter
 from app.config import AppConfig
+from app.domain.message import (
+    MediaContent,
+    StickerContent,
+    TextContent,
+    UnifiedMessage,
+)
+from app.domain.ports import StateStore
+from app.infra.adapters.vk_bot import VkAdapter, register_vk_upstream
 from app.infra.chatwoot_client import ChatwootClient
+from app.infra.event_bus import EventBus
+from app.infra.http_pool import HttpPool
+from app.infra.journal import InboundJournal, ack_inbound, inbound_message
+from app.infra.media import MediaFetcher, MediaTooLarge
+from app.infra.media_transform import MediaTransformer
+from app.infra.metrics import ERRORS, FORWARDED_MESSAGES, INBOUND_MESSAGES
+from app.infra.state_store import best_effort_lock
+from app.infra.tracing import TRACER, Span, current_span, use
+from app.infra.vk_profiles import VkProfileResolver
 
 logger = logging.getLogger(__name__)
 
 
-async def _fetch_vk_profile(
-    access_token: str, api_version: str, user_id: str
-) -> Dict[str, Any]:
-    """
-    Fetch minimal VK profile data needed for enrichment:
-    - first_name, last_name (for contact.name)
-    - bdate (for custom attribute vk_bdate)
-    """
-    url = "https://api.vk.com/method/users.get"
-    params = {
-        "user_ids": user_id,
-        "fields": "bdate,city,screen_name",
-        "access_token": access_token,
-        "v": api_version,
-    }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            r = await client.get(url, params=params)
-            r.raise_for_status()
-            data = r.json()
-            resp = (data or {}).get("response") or []
-            return resp[0] if resp else {}
-    except Exception as e:
-        logger.warning("[vk] users.get failed: %s", e)
-        return {}
-
-
 def wire_events(
-    bus: AsyncIOEventEmitter,
+    bus: EventBus,
     config: AppConfig,
     adapters: Mapping[str, Any],
     router: MessageRouter,
-) -> None:
+    http: Optional[HttpPool] = None,
+    stats: Optional[Dict[str, Callable[[], Dict[str, Any]]]] = None,
+    journal: Optional[InboundJournal] = None,
+    state: Optional[StateStore] = None,
+    shutdown: Optional[List[Callable[[], Awaitable[None]]]] = None,
+) -> ChatwootService:
     """
     Register application-level bus handlers.
-    Incoming infra events are normalized and forwarded to ChatwootService.
+    Incoming infra events are normalized and forwarded to ChatwootService,
+    one at a time per channel user (so contacts/conversations are not created
+    twice and messages keep their order); their journal entries are acknowledged
+    once Chatwoot has the message. With a shared `state` store the per-user lane
+    is also locked across replicas. Channels with a coalescing window merge a
+    sender's consecutive texts into one Chatwoot message. Inbound media is streamed
+    from the messenger into a Chatwoot attachment (unless MEDIA_ENABLED=false);
+    stickers and images Chatwoot cannot show are converted off the event loop.
+    Statistics providers are added to `stats` (if given), and coroutines to await
+    once the bus has drained to `shutdown` (if given); returns the service.
     """
+    http = http or HttpPool(config.http)
+    vk_profiles: Optional[VkProfileResolver] = None
+    if config.vk:
+        register_vk_upstream(http)
+        vk_profiles = VkProfileResolver(
+            http=http,
+            upstream=VkAdapter.upstream,
+            access_token=config.vk.access_token,
+            api_version=config.vk.api_version,
+            ttl=config.vk.profile_cache_ttl,
+            max_size=config.vk.profile_cache_max_size,
+            batch_window=config.vk.profile_batch_window_ms / 1000.0,
+            # Count users.get against the same per-token rate limit as sends
+            limiter=getattr(adapters.get("vk"), "limiter", None),
+        )
+
     cw_client = ChatwootClient(
         api_access_token=config.chatwoot.api_access_token,
         account_id=config.chatwoot.account_id,
         base_url=str(config.chatwoot.base_url),
+        http=http,
+    )
+    shared = state if state is not None and state.shared else None
+    cw = ChatwootService(client=cw_client, cache=config.cache, state=shared)
+    lanes = KeyedExecutor(
+        max_lanes=config.ingest.max_lanes,
+        idle_timeout=config.ingest.lane_idle_timeout,
+        max_pending=config.ingest.max_pending,
+        max_pending_per_lane=config.ingest.max_pending_per_lane,
+    )
+    ingest = config.ingest
+    coalescer = InboundCoalescer(
+        windows={
+            channel: ingest.coalesce_window_ms_per_channel.get(
+                channel, ingest.coalesce_window_ms
+            )
+            / 1000.0
+            for channel in ("whatsapp", "telegram", "vk")
+        },
+        submit=lambda key, process, payload, spans: lanes.submit(
+            key,
+            functools.partial(_run_batch, key, spans, time.time_ns(), process, payload),
+        ),
+        max_messages=ingest.coalesce_max_messages,
+        max_chars=ingest.coalesce_max_chars,
+        separator=ingest.coalesce_separator,
     )
-    cw = ChatwootService(client=cw_client)
+    media: Optional[MediaFetcher] = None
+    transformer: Optional[MediaTransformer] = None
+    if config.media.enabled:
+        media = MediaFetcher(http, config.media)
+        if config.media.transform_workers > 0:
+            transformer = MediaTransformer(config.media)
+        # Channels whose media needs their own client (Telethon, decrypt-media)
+        for adapter in adapters.values():
+            register_media = getattr(adapter, "register_media", None)
+            if register_media is not None:
+                register_media(media)
+    if stats is not None:
+        stats["chatwoot"] = cw.stats
+        stats["ingest_lanes"] = lanes.stats
+        stats["ingest_coalesce"] = coalescer.stats
+        if vk_profiles:
+            stats["vk_profiles"] = vk_profiles.stats
+        if media:
+            stats["media"] = media.stats
+        if transformer:
+            stats["media_transform"] = transformer.stats
+    if shutdown is not None:
+        # Batches still waiting for their window are delivered before exit
+        shutdown.append(coalescer.close)
+        # Runs after bus.stop(): no new jobs arrive, queued ones get the drain time
+        shutdown.append(functools.partial(lanes.stop, config.bus.drain_timeout))
+        if transformer:
+            shutdown.append(transformer.close)
 
     def _inbox_from_adapter(key: str) -> Optional[int]:
         a = adapters.get(key)
         return getattr(a, "inbox_id", None)
 
+    async def _ingest(
+        channel: str,
+        user: Any,
+        process: Callable[[Dict[str, Any]], Awaitable[None]],
+        payload: Dict[str, Any],
+    ) -> None:
+        """
+        Queue process(payload) in the user's lane and return, so the bus worker moves
+        on to other users; it only waits while the lanes are full (backpressure).
+        """
+        INBOUND_MESSAGES.inc(channel)
+        key = f"{channel}:{user}"
+        if coalescer.enabled(channel):
+            with TRACER.span(f"ingest.{channel}", lane=key, coalesced=True):
+                coalescer.add(channel, key, process, payload)
+            # A batch flushed right away is queued in the lane like any other job
+            await lanes.wait_for_room(key)
+            return
+        parent = current_span()
+        queued = time.time_ns()
+        job = await lanes.put(
+            key, lambda: _run_queued(channel, key, parent, queued, process, payload)
+        )
+        job.add_done_callback(_job_done)
+
+    async def _run_queued(
+        channel: str,
+        key: str,
+        parent: Optional[Span],
+        queued: int,
+        process: Callable[[Dict[str, Any]], Awaitable[None]],
+        payload: Dict[str, Any],
+    ) -> None:
+        # Lanes run jobs in their own task: re-attach the message's trace; the span
+        # starts when the message was queued, so it includes the lane wait
+        with use(parent), TRACER.span(f"ingest.{channel}", lane=key, start_ns=queued):
+            await _locked(key, process, payload)
+
+    def _job_done(fut: "asyncio.Future") -> None:
+        if not fut.cancelled() and fut.exception() is not None:
+            e = fut.exception()
+            ERRORS.inc("ingest", type(e).__name__)
+            logger.warning("[events] lane job failed: %s", e)
+
+    async def _run_batch(
+        key: str,
+        spans: List[Span],
+        flushed: int,
+        process: Callable[[Dict[str, Any]], Awaitable[None]],
+        payload: Dict[str, Any],
+    ) -> None:
+        # A single message stays in its own trace; a merged batch gets a trace of
+        # its own, starting at the flush and linked to every merged message's span
+        if len(spans) == 1:
+            with use(spans[0]), TRACER.span("ingest.batch", lane=key, start_ns=flushed):
+                await _locked(key, process, payload)
+            return
+        with (
+            use(None),
+            TRACER.linked(
+                "ingest.batch",
+                spans,
+                start_ns=flushed,
+                lane=key,
+                traced_messages=len(spans),
+            ),
+        ):
+            await _locked(key, process, payload)
+
+    async def _locked(
+        key: str,
+        process: Callable[[Dict[str, Any]], Awaitable[None]],
+        payload: Dict[str, Any],
+    ) -> None:
+        # Other replicas may hold messages of the same user
+        async with best_effort_lock(
+            shared, f"lane:{key}", timeout=config.state.lane_lock_timeout
+        ):
+            await process(payload)
+
+    async def _deliver(
+        msg: UnifiedMessage, *, inbox_id: int, contact_id: int, source_id: str
+    ) -> int:
+        """Post msg into Chatwoot; media goes along as an attachment."""
+        deliver = functools.partial(
+            cw.deliver_incoming,
+            inbox_id=inbox_id,
+            contact_id=contact_id,
+            source_id=source_id,
+        )
+        content = msg.content
+        sticker = False
+        if isinstance(content, StickerContent):
+            # Fetched like a photo, then converted to PNG
+            sticker = True
+            content = MediaContent(
+                type="media", media_type="image", url=content.ref, filename="sticker"
+            )
+        if not isinstance(content, MediaContent):
+            text = content.text if isinstance(content, TextContent) else ""
+            return await deliver(content=text)
+        if media is None:
+            return await deliver(
+                content=_media_note(content, "media relay is disabled")
+            )
+        try:
+            attachment = await media.fetch(msg, content)
+        except MediaTooLarge as e:
+            logger.warning("[events] %s media not relayed: %s", msg.channel, e)
+            return await deliver(content=_media_note(content, "file too large"))
+        if transformer is not None:
+            # Stickers and odd or oversized images, re-encoded in a worker process
+            attachment = await transformer.transform(attachment, sticker=sticker)
+        # Closing drops the in-memory buffer or deletes the temp file
+        with attachment:
+            return await deliver(content=content.caption or "", attachment=attachment)
+
     @bus.on("wasender.incoming")
     async def _ingest_wa(payload: Dict[str, Any]) -> None:
+        # The lane key is taken before the first await to keep arrival order
+        msg = inbound_message(payload)
+        await _ingest("whatsapp", msg.sender_id, _process_wa, payload)
+
+    async def _process_wa(payload: Dict[str, Any]) -> None:
         try:
-            raw = payload["data"]["messages"]
-            key = raw.get("key", {}) or {}
-            msg = raw.get("message", {}) or {}
-
-            text = (
-                msg.get("conversation")
-                or (msg.get("extendedTextMessage") or {}).get("text")
-                or ""
-            )
-            remote = key.get("remoteJid") or key.get("participant") or ""
-            msisdn = remote.split("@")[0] if "@" in remote else remote
-            push_name = raw.get("pushName") or msisdn
+            msg = inbound_message(payload)
+            msisdn = msg.sender_id or ""
 
             inbox_id = _inbox_from_adapter("whatsapp")
             if not inbox_id:
@@ -83,29 +270,31 @@ def wire_events(
             contact = await cw.ensure_contact(
                 inbox_id=inbox_id,
                 search_key=msisdn,
-                name=push_name,
+                name=msg.sender_name or msisdn,
                 phone=msisdn,
                 email=None,
-                custom_attributes={"wa_remote_jid": remote},
+                custom_attributes=dict(msg.attributes),
             )
-            conv_id = await cw.ensure_conversation(
+            conv_id = await _deliver(
+                msg,
                 inbox_id=inbox_id,
                 contact_id=contact["id"],
                 source_id=msisdn,
             )
-            await cw.create_message(
-                conversation_id=conv_id,
-                content=(text or "").strip(),
-                direction="incoming",
-            )
+            ack_inbound(journal, payload)
+            FORWARDED_MESSAGES.inc("whatsapp")
             logger.info(
                 "[events] wa -> chatwoot OK conv_id=%s inbox=%s", conv_id, inbox_id
             )
         except Exception as e:
+            ERRORS.inc("ingest", type(e).__name__)
             logger.exception("[events] wasender handling failed: %s", e)
 
     @bus.on("vk.incoming")
     async def _ingest_vk(payload: Dict[str, Any]) -> None:
+        await _ingest("vk", inbound_message(payload).sender_id, _process_vk, payload)
+
+    async def _process_vk(payload: Dict[str, Any]) -> None:
         """
         VK (Callback API) incoming:
         - enrich contact with name (first+last; fallback to screen_name) and bdate
@@ -114,22 +303,18 @@ def wire_events(
         - rely on ensure_contact() to find by /contacts/filter
         """
         try:
-            message = payload.get("message") or {}
-            text = (message.get("text") or "").strip()
-            peer_id = str(message.get("peer_id") or "")
-            from_id = str(message.get("from_id") or peer_id)
+            msg = inbound_message(payload)
+            from_id = msg.sender_id or msg.recipient_id
 
             # Enrich with profile
             vk_name: Optional[str] = None
             vk_bdate: Optional[str] = None
             additional_attributes: Dict[str, Any] = {}
 
-            if config.vk:
-                profile = await _fetch_vk_profile(
-                    access_token=config.vk.access_token,
-                    api_version=config.vk.api_version,
-                    user_id=from_id,
-                )
+            if vk_profiles:
+                # Cached, or coalesced with concurrent lookups into one users.get
+                with TRACER.span("vk.profile"):
+                    profile = await vk_profiles.get(from_id)
                 first = (profile.get("first_name") or "").strip()
                 last = (profile.get("last_name") or "").strip()
                 screen_name = (profile.get("screen_name") or "").strip()
@@ -154,7 +339,7 @@ def wire_events(
             if not inbox_id:
                 raise RuntimeError("VK inbox_id is not configured")
 
-            custom_attributes = {"vk_user_id": from_id, "vk_peer_id": peer_id}
+            custom_attributes = dict(msg.attributes)
             if vk_bdate:
                 custom_attributes["vk_bdate"] = vk_bdate
 
@@ -169,32 +354,46 @@ def wire_events(
                 additional_attributes=additional_attributes,  # pass city here
             )
 
-            conv_id = await cw.ensure_conversation(
+            conv_id = await _deliver(
+                msg,
                 inbox_id=inbox_id,
                 contact_id=ensured["id"],
                 source_id=ensured["source_id"],
             )
-            await cw.create_message(
-                conversation_id=conv_id,
-                content=text,
-                direction="incoming",
-            )
+            ack_inbound(journal, payload)
+            FORWARDED_MESSAGES.inc("vk")
             logger.info(
                 "[events] vk -> chatwoot OK conv_id=%s inbox=%s", conv_id, inbox_id
             )
         except Exception as e:
+            ERRORS.inc("ingest", type(e).__name__)
             logger.exception("[events] vk handling failed: %s", e)
 
     @bus.on("vk.confirmation")
     async def _vk_confirm(ev: Dict[str, Any]) -> None:
         logger.info("[vk] confirmation acknowledged: group_id=%s", ev.get("group_id"))
 
+    @bus.on("chatwoot.conversation_changed")
+    async def _conversation_changed(payload: Dict[str, Any]) -> None:
+        """Drop cached conversation ids once Chatwoot closes/resolves a conversation."""
+        conv_id = payload.get("id")
+        status = payload.get("status")
+        if conv_id is None:
+            return
+        if status not in REUSABLE_STATUSES:
+            await cw.invalidate_conversation(int(conv_id))
+
     @bus.on("chatwoot.outgoing")
     async def _chatwoot_outgoing(payload: Dict[str, Any]) -> None:
         await router.handle_outgoing(payload)
 
     @bus.on("telegram.incoming")
     async def _ingest_telegram(payload: Dict[str, Any]) -> None:
+        msg = inbound_message(payload)
+        user = msg.sender_id or msg.sender_username or ""
+        await _ingest("telegram", user, _process_telegram, payload)
+
+    async def _process_telegram(payload: Dict[str, Any]) -> None:
         """
         Handle incoming Telegram message and forward it to Chatwoot.
         - Search or upsert contact using telegram_user_id and telegram_username.
@@ -202,52 +401,51 @@ def wire_events(
         - Create incoming message in Chatwoot.
         """
         try:
-            text = (payload.get("text") or "").strip()
-            from_id = str(payload.get("from_id") or "")
-            username = payload.get("username")
-            name = payload.get("name") or username or from_id
+            msg = inbound_message(payload)
+            from_id = msg.sender_id or ""
+            username = msg.sender_username
 
             inbox_id = _inbox_from_adapter("telegram")
             if not inbox_id:
                 raise RuntimeError("Telegram inbox_id is not configured")
 
-            # Build custom_attributes for Chatwoot contact lookup
-            custom_attributes = {}
-            if from_id:
-                custom_attributes["telegram_user_id"] = from_id
-            if username:
-                custom_attributes["telegram_username"] = username
-
             # Use username as search_key if available, else from_id
             search_key = username or from_id
 
-            # Upsert contact in Chatwoot
+            # Upsert contact in Chatwoot (looked up by telegram_user_id/_username)
             contact = await cw.ensure_contact(
                 inbox_id=inbox_id,
                 search_key=search_key,
-                name=name,
+                name=msg.sender_name or username or from_id,
                 phone=None,
                 email=None,
-                custom_attributes=custom_attributes,
+                custom_attributes=dict(msg.attributes),
             )
 
             # Use source_id returned by ensure_contact (should be user_id or username)
-            conv_id = await cw.ensure_conversation(
+            conv_id = await _deliver(
+                msg,
                 inbox_id=inbox_id,
                 contact_id=contact["id"],
                 source_id=contact["source_id"],
             )
 
-            await cw.create_message(
-                conversation_id=conv_id,
-                content=text,
-                direction="incoming",
-            )
-
+            ack_inbound(journal, payload)
+            FORWARDED_MESSAGES.inc("telegram")
             logger.info(
                 "[events] telegram -> chatwoot OK conv_id=%s inbox=%s",
                 conv_id,
                 inbox_id,
             )
         except Exception as e:
+            ERRORS.inc("ingest", type(e).__name__)
             logger.exception("[events] telegram handling failed: %s", e)
+
+    return cw
+
+
+def _media_note(content: MediaContent, reason: str) -> str:
+    """Stands in for an attachment that was not relayed, after its caption."""
+    name = f" {content.filename}" if content.filename else ""
+    note = f"[{content.media_type}{name} not relayed: {reason}]"
+    return f"{content.caption}\n{note}" if content.caption else note
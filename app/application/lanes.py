@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+Job = Tuple[Callable[[], Awaitable[Any]], asyncio.Future]
+
+
+class _Lane:
+    def __init__(self):
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.pending = 0  # jobs queued or executing
+
+
+class KeyedExecutor:
+    """
+    Runs jobs one at a time per key (e.g. "telegram:<user_id>"), in submission order,
+    while different keys run concurrently.
+    - At most `max_lanes` lanes exist: a new key first evicts idle lanes, and a lane
+      that empties its queue while there are too many is reclaimed right away.
+      A lane whose queue stays empty for `idle_timeout` seconds is reclaimed too.
+    - put() is the entry point for producers (bus handlers): it enqueues and returns
+      without waiting for the job, unless the key holds more than
+      `max_pending_per_lane` jobs, all lanes more than `max_pending` or there are
+      more than `max_lanes` lanes; then it waits until there is room again.
+    submit()/put()/run() enqueue synchronously before their first await, so callers
+    that start in order (bus handlers for consecutive events) are executed in that
+    order.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_lanes: int = 1000,
+        idle_timeout: float = 5.0,
+        max_pending: int = 10_000,
+        max_pending_per_lane: int = 100,
+    ):
+        self._max_lanes = max(1, max_lanes)
+        self._idle_timeout = idle_timeout
+        self._max_pending = max(1, max_pending)
+        self._max_pending_per_lane = max(1, max_pending_per_lane)
+        self._slots = asyncio.Semaphore(self._max_lanes)
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._waiters: List[asyncio.Future] = []
+        self.pending = 0
+        self.waiting = 0
+        self.jobs = 0
+        self.lanes_created = 0
+        self.lanes_reclaimed = 0
+        self.lanes_evicted = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() after every earlier job with the same key; returns its result."""
+        return await self.submit(key, fn)
+
+    async def put(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Future:
+        """
+        Enqueue fn() and return its future without waiting for the job; waits only
+        while the executor is over one of its bounds (backpressure on the producer).
+        """
+        fut = self.submit(key, fn)
+        await self.wait_for_room(key)
+        return fut
+
+    def submit(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> asyncio.Future:
+        """Enqueue fn() right away (ignoring the bounds); the future has its result."""
+        lane = self._lanes.get(key)
+        if lane is None:
+            if len(self._lanes) >= self._max_lanes:
+                self._evict_idle()
+            lane = self._lanes[key] = _Lane()
+            lane.task = asyncio.create_task(self._drain(key, lane))
+            self.lanes_created += 1
+        fut = asyncio.get_running_loop().create_future()
+        lane.queue.put_nowait((fn, fut))
+        lane.pending += 1
+        self.pending += 1
+        self.jobs += 1
+        return fut
+
+    async def wait_for_room(self, key: Hashable) -> None:
+        """Wait until `key`'s lane, the total backlog and the lane count are in bounds."""
+        while not self._has_room(key):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.waiting += 1
+            try:
+                await waiter
+            finally:
+                self.waiting -= 1
+
+    def _has_room(self, key: Hashable) -> bool:
+        lane = self._lanes.get(key)
+        return (
+            (lane is None or lane.pending <= self._max_pending_per_lane)
+            and self.pending <= self._max_pending
+            and len(self._lanes) <= self._max_lanes
+        )
+
+    def _wake(self) -> None:
+        if not self._waiters:
+            return
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _evict_idle(self) -> None:
+        """Reclaim lanes without jobs now instead of after their idle timeout."""
+        for key, lane in list(self._lanes.items()):
+            if lane.pending == 0 and lane.task is not None:
+                del self._lanes[key]
+                lane.task.cancel()
+                self.lanes_evicted += 1
+
+    async def _drain(self, key: Hashable, lane: _Lane) -> None:
+        try:
+            while True:
+                try:
+                    fn, fut = await asyncio.wait_for(
+                        lane.queue.get(), timeout=self._idle_timeout
+                    )
+                except asyncio.TimeoutError:
+                    if lane.queue.empty():
+                        return
+                    continue
+                # Hold a slot only while executing, so idle lanes are cheap
+                async with self._slots:
+                    lane.running = True
+                    await self._execute(fn, fut)
+                    self._done(lane)
+                    while not lane.queue.empty():
+                        fn, fut = lane.queue.get_nowait()
+                        await self._execute(fn, fut)
+                        self._done(lane)
+                    lane.running = False
+                if len(self._lanes) > self._max_lanes:
+                    # Make room for the lanes of waiting producers
+                    return
+        finally:
+            if self._lanes.get(key) is lane:
+                del self._lanes[key]
+            self.lanes_reclaimed += 1
+            self.pending -= lane.pending
+            lane.pending = 0
+            # Fail anything left behind (only on cancellation)
+            while not lane.queue.empty():
+                _, fut = lane.queue.get_nowait()
+                if not fut.done():
+                    fut.cancel()
+            self._wake()
+
+    def _done(self, lane: _Lane) -> None:
+        lane.pending -= 1
+        self.pending -= 1
+        self._wake()
+
+    @staticmethod
+    async def _execute(fn: Callable[[], Awaitable[Any]], fut: asyncio.Future) -> None:
+        if fut.cancelled():
+            return
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            # Propagate only if the lane itself is being cancelled
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            if not fut.done():
+                fut.set_exception(e)
+        else:
+            if not fut.done():
+                fut.set_result(result)
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """
+        Let queued jobs finish for up to `timeout` seconds, then cancel all lanes
+        (jobs still pending are cancelled).
+        """
+        if timeout > 0 and self.pending:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while self.pending and loop.time() < deadline:
+                waiter = loop.create_future()
+                self._waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(waiter, deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+        tasks = [lane.task for lane in self._lanes.values() if lane.task]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lanes": len(self._lanes),
+            "running": sum(1 for lane in self._lanes.values() if lane.running),
+            "pending": self.pending,
+            "waiting_producers": self.waiting,
+            "max_lanes": self._max_lanes,
+            "max_pending": self._max_pending,
+            "max_pending_per_lane": self._max_pending_per_lane,
+            "jobs": self.jobs,
+            "lanes_created": self.lanes_created,
+            "lanes_reclaimed": self.lanes_reclaimed,
+            "lanes_evicted": self.lanes_evicted,
+        }
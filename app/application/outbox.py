@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Set, Tuple
+
+from app.domain.message import TextContent
+from app.domain.outbox import OutboxItem
+from app.domain.ports import MessengerAdapter, OutboxStore
+from app.infra.metrics import DROPPED_EVENTS, ERRORS
+from app.infra.tracing import TRACER, current_traceparent
+
+logger = logging.getLogger(__name__)
+
+LaneKey = Tuple[str, str]  # (channel, recipient_id)
+
+
+class OutboundDispatcher:
+    """
+    Durable outbound delivery queue for agent replies.
+    - enqueue() persists the item before returning (survives restarts).
+    - Each channel has its own pool of workers; items for one recipient are sent
+      strictly in FIFO order, different recipients are sent in parallel.
+    - Failed sends are retried with exponential backoff (the recipient's lane stays
+      blocked meanwhile to keep order); after max_attempts the item is marked dead.
+    - A failed store update (locked or full disk, closed connection) never kills a
+      worker: the outcome is kept in memory and recorded again with backoff before
+      the lane moves on, so a sent item is not sent twice.
+    """
+
+    def __init__(
+        self,
+        *,
+        store: OutboxStore,
+        adapters: Mapping[str, MessengerAdapter],
+        workers_per_channel: Mapping[str, int],
+        default_workers: int = 4,
+        max_attempts: int = 8,
+        retry_base_delay: float = 2.0,
+        retry_max_delay: float = 300.0,
+    ):
+        self._store = store
+        self._adapters = adapters
+        self._workers_per_channel = dict(workers_per_channel)
+        self._default_workers = max(1, default_workers)
+        self._max_attempts = max(1, max_attempts)
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+
+        self._lanes: Dict[LaneKey, Deque[OutboxItem]] = {}
+        # Lanes that have work and are neither running nor waiting for a retry
+        self._ready: Dict[str, "asyncio.Queue[LaneKey]"] = {}
+        self._scheduled: Set[LaneKey] = set()
+        self._workers: List[asyncio.Task] = []
+        self._retry_handles: Dict[LaneKey, asyncio.TimerHandle] = {}
+        # item id -> (delivered, failed store updates) for outcomes not yet recorded
+        self._unrecorded: Dict[int, Tuple[bool, int]] = {}
+        self._started = False
+
+        self.sent = 0
+        self.failed_attempts = 0
+        self.dead = 0
+        self.store_errors = 0
+        self._sent_per_second: Deque[Tuple[int, int]] = deque()
+
+    def _channel_queue(self, channel: str) -> "asyncio.Queue[LaneKey]":
+        q = self._ready.get(channel)
+        if q is None:
+            q = asyncio.Queue()
+            self._ready[channel] = q
+            if self._started:
+                self._spawn_workers(channel)
+        return q
+
+    def _spawn_workers(self, channel: str) -> None:
+        count = self._workers_per_channel.get(channel, self._default_workers)
+        for n in range(max(1, count)):
+            self._workers.append(
+                asyncio.create_task(self._worker(channel), name=f"outbox-{channel}-{n}")
+            )
+
+    async def start(self) -> None:
+        """Open the store, reload undelivered items and start workers."""
+        await self._store.open()
+        pending = await self._store.load_pending()
+        for item in pending:
+            self._append(item)
+        for channel in self._adapters:
+            self._channel_queue(channel)
+        self._started = True
+        for channel in list(self._ready):
+            self._spawn_workers(channel)
+        logger.info(
+            "[outbox] started: recovered=%d channels=%s",
+            len(pending),
+            sorted(self._ready),
+        )
+
+    async def stop(self) -> None:
+        """Stop workers; undelivered items stay in the store for the next start."""
+        self._started = False
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        await self._store.close()
+        logger.info("[outbox] stopped")
+
+    async def enqueue(self, channel: str, recipient_id: str, text: str) -> int:
+        """Persist an outbound text and schedule its delivery; returns the item id."""
+        item = OutboxItem(
+            channel=channel,
+            recipient_id=recipient_id,
+            text=text,
+            created_at=time.time(),
+            traceparent=current_traceparent(),
+        )
+        item.id = await self._store.put(item)
+        self._append(item)
+        logger.info(
+            "[outbox] enqueued id=%s channel=%s recipient_id=%s",
+            item.id,
+            channel,
+            recipient_id,
+        )
+        return item.id
+
+    def _append(self, item: OutboxItem) -> None:
+        key: LaneKey = (item.channel, item.recipient_id)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+        lane.append(item)
+        self._schedule(key)
+
+    def _schedule(self, key: LaneKey) -> None:
+        # A lane is queued at most once; a running/retrying lane reschedules itself
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        self._channel_queue(key[0]).put_nowait(key)
+
+    async def _worker(self, channel: str) -> None:
+        queue = self._channel_queue(channel)
+        while True:
+            key = await queue.get()
+            lane = self._lanes.get(key)
+            if not lane:
+                self._scheduled.discard(key)
+                self._lanes.pop(key, None)
+                continue
+            item = lane[0]
+            unrecorded = self._unrecorded.pop(item.id, None)
+            if unrecorded is not None:
+                delivered, store_failures = unrecorded
+            else:
+                delivered, store_failures = await self._deliver(item), 0
+            if delivered is None:
+                # Retry later; the lane keeps its slot in _scheduled to preserve order
+                continue
+            try:
+                if delivered:
+                    await self._store.mark_done(item.id)
+                else:
+                    await self._store.mark_dead(item.id, item.attempts, item.last_error)
+            except Exception as e:
+                # Record the outcome on the lane's next turn instead of sending again
+                self._store_failed(item, e, delivered, store_failures + 1)
+                continue
+            lane.popleft()
+            self._scheduled.discard(key)
+            if lane:
+                self._schedule(key)
+            else:
+                self._lanes.pop(key, None)
+
+    async def _deliver(self, item: OutboxItem) -> Optional[bool]:
+        """Send one item. True = sent, False = dead, None = retry scheduled."""
+        adapter = self._adapters.get(item.channel)
+        try:
+            if not adapter:
+                raise RuntimeError(f"No adapter for channel={item.channel}")
+            # Attach the send to the trace of the webhook that queued it
+            with TRACER.resume(
+                "outbox.deliver", item.traceparent, attempt=item.attempts + 1
+            ):
+                await adapter.send_text(
+                    item.recipient_id, TextContent(type="text", text=item.text)
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            item.attempts += 1
+            item.last_error = f"{type(e).__name__}: {e}"
+            self.failed_attempts += 1
+            ERRORS.inc("send", type(e).__name__)
+            if item.attempts >= self._max_attempts or not adapter:
+                self.dead += 1
+                DROPPED_EVENTS.inc(item.channel, "dead")
+                logger.error(
+                    "[outbox] giving up id=%s channel=%s recipient_id=%s after %d attempts: %s",
+                    item.id,
+                    item.channel,
+                    item.recipient_id,
+                    item.attempts,
+                    item.last_error,
+                )
+                return False
+            try:
+                await self._store.mark_retry(item.id, item.attempts, item.last_error)
+            except Exception as se:
+                # Only the stored attempt count lags; the retry goes ahead
+                self.store_errors += 1
+                ERRORS.inc("outbox_store", type(se).__name__)
+                logger.error("[outbox] mark_retry failed id=%s: %s", item.id, se)
+            delay = min(
+                self._retry_max_delay, self._retry_base_delay * 2 ** (item.attempts - 1)
+            )
+            delay *= random.uniform(0.8, 1.2)
+            logger.warning(
+                "[outbox] send failed id=%s attempt=%d; retry in %.1fs: %s",
+                item.id,
+                item.attempts,
+                delay,
+                item.last_error,
+            )
+            self._retry_later((item.channel, item.recipient_id), delay)
+            return None
+
+        self._record_sent()
+        return True
+
+    def _store_failed(
+        self, item: OutboxItem, error: Exception, delivered: bool, failures: int
+    ) -> None:
+        self.store_errors += 1
+        ERRORS.inc("outbox_store", type(error).__name__)
+        self._unrecorded[item.id] = (delivered, failures)
+        delay = min(self._retry_max_delay, self._retry_base_delay * 2 ** (failures - 1))
+        logger.error(
+            "[outbox] recording id=%s as %s failed (%d); retry in %.1fs: %s",
+            item.id,
+            "done" if delivered else "dead",
+            failures,
+            delay,
+            error,
+        )
+        self._retry_later((item.channel, item.recipient_id), delay)
+
+    def _retry_later(self, key: LaneKey, delay: float) -> None:
+        def _requeue() -> None:
+            self._retry_handles.pop(key, None)
+            if self._started:
+                self._channel_queue(key[0]).put_nowait(key)
+
+        self._retry_handles[key] = asyncio.get_running_loop().call_later(
+            delay, _requeue
+        )
+
+    def _record_sent(self) -> None:
+        self.sent += 1
+        now = int(time.monotonic())
+        if self._sent_per_second and self._sent_per_second[-1][0] == now:
+            self._sent_per_second[-1] = (now, self._sent_per_second[-1][1] + 1)
+        else:
+            self._sent_per_second.append((now, 1))
+        while self._sent_per_second and self._sent_per_second[0][0] <= now - 60:
+            self._sent_per_second.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        depth = sum(len(lane) for lane in self._lanes.values())
+        oldest = min(
+            (lane[0].created_at for lane in self._lanes.values() if lane), default=None
+        )
+        cutoff = int(time.monotonic()) - 60
+        last_minute = sum(n for ts, n in self._sent_per_second if ts > cutoff)
+        return {
+            "depth": depth,
+            "recipients": len(self._lanes),
+            "retrying": len(self._retry_handles),
+            "oldest_age_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "sent": self.sent,
+            "sent_per_second_1m": round(last_minute / 60.0, 3),
+            "failed_attempts": self.failed_attempts,
+            "dead": self.dead,
+            "store_errors": self.store_errors,
+            "unrecorded": len(self._unrecorded),
+            "workers": len(self._workers),
+        }
@@ -1,9 +1,13 @@
 import logging
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from app.domain.message import TextContent
 from app.domain.ports import MessengerAdapter
 from app.domain.webhooks.chatwoot import ChatwootMessageCreatedWebhook
+from app.infra.metrics import DROPPED_EVENTS, ERRORS, OUTBOUND_MESSAGES
+
+if TYPE_CHECKING:
+    from app.application.outbox import OutboundDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +25,14 @@ def _dig(src: dict, *path, default=None):
 class MessageRouter:
     """Router: dispatch outgoing text messages to channel adapters."""
 
-    def __init__(self, adapters: Dict[str, MessengerAdapter] | None = None):
+    def __init__(
+        self,
+        adapters: Dict[str, MessengerAdapter] | None = None,
+        outbox: Optional["OutboundDispatcher"] = None,
+    ):
         self.adapters = adapters or {}
+        # When set, outgoing messages are queued durably instead of sent inline
+        self.outbox = outbox
 
     async def handle_incoming(self, msg):
         # Not implemented in this demo
@@ -112,23 +122,28 @@ class MessageRouter:
 
     async def handle_outgoing(self, payload: dict) -> None:
         """
-        Process Chatwoot outgoing webhook and dispatch text to a proper adapter.
+        Process Chatwoot outgoing webhook and dispatch text to a proper adapter
+        (through the durable outbound queue when one is attached).
         Note: we trust channel injected at HTTP layer: payload['conversation']['meta']['channel'].
         """
         try:
             cw = ChatwootMessageCreatedWebhook.model_validate(payload)
         except Exception as e:
             logger.warning("[router] Invalid Chatwoot payload: %s", e)
+            DROPPED_EVENTS.inc("chatwoot", "invalid_payload")
             return
 
         if cw.event != "message_created":
             logger.info("[router] Ignored Chatwoot event: %s", cw.event)
+            DROPPED_EVENTS.inc("chatwoot", "ignored_event")
             return
         if cw.private:
             logger.info("[router] Ignored private message")
+            DROPPED_EVENTS.inc("chatwoot", "private")
             return
         if cw.message_type != "outgoing":
             logger.info("[router] Ignored message_type: %s", cw.message_type)
+            DROPPED_EVENTS.inc("chatwoot", "ignored_message_type")
             return
 
         # Channel comes from raw payload (HTTP layer injected it into meta)
@@ -145,6 +160,12 @@ class MessageRouter:
                 recipient_id,
                 text,
             )
+            DROPPED_EVENTS.inc("chatwoot", "missing_fields")
+            return
+
+        OUTBOUND_MESSAGES.inc(channel)
+        if self.outbox is not None:
+            await self.outbox.enqueue(channel, recipient_id, text)
             return
 
         await self.dispatch_outbound(
@@ -158,9 +179,21 @@ class MessageRouter:
         adapter = self.adapters.get(channel)
         if not adapter:
             logger.warning("[router] No adapter for channel=%s", channel)
+            DROPPED_EVENTS.inc(channel, "no_adapter")
             return
 
-        await adapter.send_text(recipient_id, TextContent(type="text", text=text))
+        try:
+            await adapter.send_text(recipient_id, TextContent(type="text", text=text))
+        except Exception as e:
+            # Inline mode has no retries; the outbound queue retries instead
+            ERRORS.inc("send", type(e).__name__)
+            logger.exception(
+                "[router] OUTBOUND failed: channel=%s recipient_id=%s: %s",
+                channel,
+                recipient_id,
+                e,
+            )
+            return
         logger.info(
             "[router] OUTBOUND: channel=%s recipient_id=%s text=%r",
             channel,
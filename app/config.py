@@ -9,6 +9,21 @@ class TelegramConfig(BaseModel):
     api_hash: str
     session_name: str
     inbox_id: int  # per-channel inbox
+    send_rate: float = 20.0  # messages per second for the whole account
+    send_burst: float = 20.0
+    peer_interval: float = 1.0  # seconds between two messages to one chat
+    send_max_backlog: int = 1000  # pending sends before new ones are rejected
+    flood_max_wait: float = 600.0  # longer FloodWaits fail the send instead
+    # Recipient -> access_hash cache ("" path = memory only)
+    peer_cache_path: str = "data/telegram_peers.sqlite3"
+    peer_cache_ttl: float = 30 * 86400.0
+    peer_cache_negative_ttl: float = 600.0
+    peer_cache_max_size: int = 100_000
+    peer_warmup_dialogs: int = 200  # recent dialogs cached at startup; 0 disables
+    # Incoming sender profiles (username, first name)
+    sender_cache_ttl: float = 86400.0
+    sender_cache_max_size: int = 50_000
+    sender_refresh_after: float = 3600.0  # refresh in the background after this age
 
 
 class WasenderWebhookConfig(BaseModel):
@@ -16,6 +31,15 @@ class WasenderWebhookConfig(BaseModel):
     webhook_secret: str
     api_key: str
     inbox_id: int  # per-channel inbox
+    # Outbound API: pacing (0 = unlimited), retries and circuit breaker
+    send_rate: float = 0.0  # messages per second allowed by the account plan
+    send_burst: Optional[float] = None
+    timeout: float = 15.0
+    max_retries: int = 3
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 30.0
+    breaker_threshold: int = 5  # failed sends in a row before failing fast
+    breaker_reset: float = 30.0  # seconds before a probe send is allowed
 
 
 class VKCommunityConfig(BaseModel):
@@ -27,6 +51,14 @@ class VKCommunityConfig(BaseModel):
     confirmation: str  # Confirmation string from VK
     api_version: str = "5.199"  # VK API version
     inbox_id: int  # per-channel inbox
+    # users.get enrichment: profile cache and lookup coalescing
+    profile_cache_ttl: float = 86400.0  # seconds
+    profile_cache_max_size: int = 50_000
+    profile_batch_window_ms: float = 5.0  # gather concurrent lookups this long
+    # API rate limit and messages.send batching through execute
+    api_rate: float = 20.0  # requests per second for the community token
+    send_batch_window_ms: float = 10.0
+    send_batch_max: int = 25  # calls per execute; 1 disables batching
 
 
 class ChatwootWebhookConfig(BaseModel):
@@ -37,11 +69,148 @@ class ChatwootWebhookConfig(BaseModel):
     channel_by_webhook_id: Dict[str, str] = Field(default_factory=dict)
 
 
+class HttpPoolConfig(BaseModel):
+    # Shared keep-alive pools (one httpx client per upstream)
+    max_connections: int = 100  # total sockets per upstream
+    max_keepalive_connections: int = 20  # idle sockets kept open per upstream
+    keepalive_expiry: float = 30.0  # seconds an idle socket is kept
+    timeout: float = 15.0  # default request timeout, seconds
+    http2: bool = False  # requires the optional 'h2' package
+    warmup: bool = True  # open one connection per upstream at startup
+
+
+class CacheConfig(BaseModel):
+    # In-process caches for Chatwoot lookups
+    contact_ttl: float = 3600.0  # seconds a resolved contact is reused
+    contact_negative_ttl: float = 60.0  # seconds a "not found" lookup is reused
+    contact_max_size: int = 50_000  # entries (LRU eviction above this)
+    conversation_ttl: float = 3600.0  # seconds a conversation id is reused
+    conversation_max_size: int = 50_000
+
+
+class OutboxConfig(BaseModel):
+    # Durable outbound queue for agent replies (Chatwoot -> messengers)
+    enabled: bool = True
+    backend: str = "sqlite"  # "sqlite" | "memory"
+    path: str = "data/outbox.sqlite3"
+    workers: int = 4  # default workers per channel
+    workers_per_channel: Dict[str, int] = Field(default_factory=dict)
+    max_attempts: int = 8
+    retry_base_delay: float = 2.0  # seconds, doubled per attempt
+    retry_max_delay: float = 300.0
+
+
+class JournalConfig(BaseModel):
+    # Write-ahead journal for inbound webhooks (messengers -> Chatwoot)
+    enabled: bool = True
+    path: str = "data/inbound.sqlite3"
+    commit_interval_ms: float = 2.0  # group-commit window
+    max_batch: int = 512
+    max_replays: int = 5  # park an entry after this many restarts without success
+
+
+class DedupeConfig(BaseModel):
+    # Suppress webhook/update redeliveries by message or event id
+    enabled: bool = True
+    ttl: float = 86400.0  # seconds an id is remembered
+    max_size: int = 100_000  # ids kept in memory
+    persistent: bool = False  # also keep ids in SQLite (survives restarts)
+    path: str = "data/dedupe.sqlite3"
+
+
+class IngestConfig(BaseModel):
+    # Per-user serialization of inbound processing (one lane per channel user)
+    max_lanes: int = 1000  # lanes (users with queued messages) at the same time
+    lane_idle_timeout: float = 5.0  # seconds before an idle lane is reclaimed
+    max_pending: int = 10_000  # queued messages over all lanes before producers wait
+    max_pending_per_lane: int = 100  # queued messages of one user before they wait
+    # Merge a sender's consecutive texts into one Chatwoot message (0 = off)
+    coalesce_window_ms: float = 0.0  # quiet period that ends a batch
+    coalesce_window_ms_per_channel: Dict[str, float] = Field(default_factory=dict)
+    coalesce_max_messages: int = 10  # messages merged at most
+    coalesce_max_chars: int = 4000  # characters of a merged message at most
+    coalesce_separator: str = "\n"  # placed between merged texts
+
+
+class MediaConfig(BaseModel):
+    # Inbound media (photos, voice, documents) relayed as Chatwoot attachments
+    enabled: bool = True
+    max_bytes: int = 40 * 1024 * 1024  # larger files are replaced by a note
+    spool_bytes: int = 1024 * 1024  # kept in memory up to this, then a temp file
+    chunk_size: int = 64 * 1024  # bytes read from the messenger per chunk
+    timeout: float = 60.0  # seconds for one download
+    temp_dir: Optional[str] = None  # None = the system temp directory
+    # Image conversion (stickers, WebP/BMP/TIFF, oversized photos) in worker processes
+    transform_workers: int = 2  # 0 = send images as received
+    transform_queue: int = 16  # images waiting for or in a worker at most
+    image_max_side: int = 2560  # pixels; larger photos are downscaled
+    image_quality: int = 85  # JPEG quality of re-encoded photos
+    transform_cache_size: int = 256  # converted images kept (by content hash)
+    transform_cache_ttl: float = 3600.0  # seconds
+
+
+class BusConfig(BaseModel):
+    # In-process event bus: bounded queue and worker tasks per topic
+    queue_size: int = 1000  # events waiting per topic
+    workers: int = 64  # events handled at the same time per topic
+    overflow: str = "block"  # "block" | "reject" | "spill" when a queue is full
+    spill_path: Optional[str] = "data/bus_spill.sqlite3"  # None keeps spills in memory
+    drain_timeout: float = 5.0  # seconds queued events may finish on shutdown
+    queue_size_per_topic: Dict[str, int] = Field(default_factory=dict)
+    workers_per_topic: Dict[str, int] = Field(default_factory=dict)
+    overflow_per_topic: Dict[str, str] = Field(default_factory=dict)
+
+
+class StateConfig(BaseModel):
+    # State shared by gateway replicas: Chatwoot ids, dedupe ids, rate budgets, locks
+    backend: str = "memory"  # "memory" (this process) | "sqlite" (one host) | "redis"
+    path: str = "data/state.sqlite3"
+    url: str = "redis://localhost:6379/0"  # any Redis-protocol server
+    prefix: str = "gateway:"  # key prefix on the Redis server
+    pool_size: int = 8  # connections to the Redis server
+    lock_ttl: float = (
+        30.0  # seconds a lock outlives a crashed holder (renewed while held)
+    )
+    lock_timeout: float = 30.0  # seconds to wait for a per-key lock
+    # Waiting for a user's lane lock held by another replica (may be a media upload)
+    lane_lock_timeout: float = 300.0
+
+
+class IpcConfig(BaseModel):
+    # Split deployment: stateless webhook workers hand events to one connector process
+    role: str = "all"  # "all" | "ingress" | "connector"
+    socket_path: str = "data/gateway.sock"  # Unix socket served by the connector
+    timeout: float = 10.0  # seconds an ingress worker waits for the connector
+    ingress_workers: int = 1  # uvicorn workers started by `python -m app.main`
+
+
+class TracingConfig(BaseModel):
+    # Per-message traces exported as OTLP/JSON (file and/or collector endpoint)
+    enabled: bool = False
+    sample_ratio: float = 0.1  # share of new traces recorded (0..1)
+    path: Optional[str] = "data/traces.jsonl"  # one OTLP request per line
+    otlp_endpoint: Optional[str] = None  # e.g. http://localhost:4318/v1/traces
+    service_name: str = "chatwoot-messenger-gateway"
+    flush_interval: float = 2.0  # seconds between exports
+    max_queue: int = 10_000  # finished spans buffered; extra spans are dropped
+
+
 class AppConfig(BaseModel):
     telegram: Optional[TelegramConfig] = None
     wasender: Optional[WasenderWebhookConfig] = None
     vk: Optional[VKCommunityConfig] = None
     chatwoot: ChatwootWebhookConfig
+    http: HttpPoolConfig = Field(default_factory=HttpPoolConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    outbox: OutboxConfig = Field(default_factory=OutboxConfig)
+    journal: JournalConfig = Field(default_factory=JournalConfig)
+    ingest: IngestConfig = Field(default_factory=IngestConfig)
+    media: MediaConfig = Field(default_factory=MediaConfig)
+    dedupe: DedupeConfig = Field(default_factory=DedupeConfig)
+    tracing: TracingConfig = Field(default_factory=TracingConfig)
+    bus: BusConfig = Field(default_factory=BusConfig)
+    ipc: IpcConfig = Field(default_factory=IpcConfig)
+    state: StateConfig = Field(default_factory=StateConfig)
 
 
 def _getenv(name: str) -> str:
@@ -52,6 +221,261 @@ def _getenv(name: str) -> str:
     return v
 
 
+def _getenv_bool(name: str, default: bool) -> bool:
+    """Parse an optional boolean environment variable (1/true/yes/on)."""
+    v = os.getenv(name)
+    if v is None or not v.strip():
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _build_http_pool_config() -> HttpPoolConfig:
+    """Build shared HTTP pool settings; every variable is optional."""
+    defaults = HttpPoolConfig()
+    return HttpPoolConfig(
+        max_connections=int(
+            os.getenv("HTTP_MAX_CONNECTIONS") or defaults.max_connections
+        ),
+        max_keepalive_connections=int(
+            os.getenv("HTTP_MAX_KEEPALIVE") or defaults.max_keepalive_connections
+        ),
+        keepalive_expiry=float(
+            os.getenv("HTTP_KEEPALIVE_EXPIRY") or defaults.keepalive_expiry
+        ),
+        timeout=float(os.getenv("HTTP_TIMEOUT") or defaults.timeout),
+        http2=_getenv_bool("HTTP_HTTP2", defaults.http2),
+        warmup=_getenv_bool("HTTP_WARMUP", defaults.warmup),
+    )
+
+
+def _build_cache_config() -> CacheConfig:
+    """Build Chatwoot lookup cache settings; every variable is optional."""
+    defaults = CacheConfig()
+    return CacheConfig(
+        contact_ttl=float(os.getenv("CW_CONTACT_CACHE_TTL") or defaults.contact_ttl),
+        contact_negative_ttl=float(
+            os.getenv("CW_CONTACT_CACHE_NEGATIVE_TTL") or defaults.contact_negative_ttl
+        ),
+        contact_max_size=int(
+            os.getenv("CW_CONTACT_CACHE_MAX_SIZE") or defaults.contact_max_size
+        ),
+        conversation_ttl=float(
+            os.getenv("CW_CONVERSATION_CACHE_TTL") or defaults.conversation_ttl
+        ),
+        conversation_max_size=int(
+            os.getenv("CW_CONVERSATION_CACHE_MAX_SIZE")
+            or defaults.conversation_max_size
+        ),
+    )
+
+
+def _build_outbox_config() -> OutboxConfig:
+    """Build outbound queue settings; every variable is optional."""
+    defaults = OutboxConfig()
+    per_channel: Dict[str, int] = {}
+    for channel in ("whatsapp", "telegram", "vk"):
+        v = os.getenv(f"OUTBOX_WORKERS_{channel.upper()}")
+        if v:
+            per_channel[channel] = int(v)
+    return OutboxConfig(
+        enabled=_getenv_bool("OUTBOX_ENABLED", defaults.enabled),
+        backend=os.getenv("OUTBOX_BACKEND") or defaults.backend,
+        path=os.getenv("OUTBOX_PATH") or defaults.path,
+        workers=int(os.getenv("OUTBOX_WORKERS") or defaults.workers),
+        workers_per_channel=per_channel,
+        max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS") or defaults.max_attempts),
+        retry_base_delay=float(
+            os.getenv("OUTBOX_RETRY_BASE_DELAY") or defaults.retry_base_delay
+        ),
+        retry_max_delay=float(
+            os.getenv("OUTBOX_RETRY_MAX_DELAY") or defaults.retry_max_delay
+        ),
+    )
+
+
+def _build_journal_config() -> JournalConfig:
+    """Build inbound journal settings; every variable is optional."""
+    defaults = JournalConfig()
+    return JournalConfig(
+        enabled=_getenv_bool("JOURNAL_ENABLED", defaults.enabled),
+        path=os.getenv("JOURNAL_PATH") or defaults.path,
+        commit_interval_ms=float(
+            os.getenv("JOURNAL_COMMIT_INTERVAL_MS") or defaults.commit_interval_ms
+        ),
+        max_batch=int(os.getenv("JOURNAL_MAX_BATCH") or defaults.max_batch),
+        max_replays=int(os.getenv("JOURNAL_MAX_REPLAYS") or defaults.max_replays),
+    )
+
+
+def _build_ingest_config() -> IngestConfig:
+    """Build inbound processing settings; every variable is optional."""
+    defaults = IngestConfig()
+    windows: Dict[str, float] = {}
+    for channel in ("whatsapp", "telegram", "vk"):
+        v = os.getenv(f"INGEST_COALESCE_WINDOW_MS_{channel.upper()}")
+        if v:
+            windows[channel] = float(v)
+    separator = os.getenv("INGEST_COALESCE_SEPARATOR")
+    return IngestConfig(
+        max_lanes=int(os.getenv("INGEST_MAX_LANES") or defaults.max_lanes),
+        lane_idle_timeout=float(
+            os.getenv("INGEST_LANE_IDLE_TIMEOUT") or defaults.lane_idle_timeout
+        ),
+        max_pending=int(os.getenv("INGEST_MAX_PENDING") or defaults.max_pending),
+        max_pending_per_lane=int(
+            os.getenv("INGEST_MAX_PENDING_PER_LANE") or defaults.max_pending_per_lane
+        ),
+        coalesce_window_ms=float(
+            os.getenv("INGEST_COALESCE_WINDOW_MS") or defaults.coalesce_window_ms
+        ),
+        coalesce_window_ms_per_channel=windows,
+        coalesce_max_messages=int(
+            os.getenv("INGEST_COALESCE_MAX_MESSAGES") or defaults.coalesce_max_messages
+        ),
+        coalesce_max_chars=int(
+            os.getenv("INGEST_COALESCE_MAX_CHARS") or defaults.coalesce_max_chars
+        ),
+        # A literal \n in the variable stands for a line break, e.g. "\n\n" or " | "
+        coalesce_separator=(
+            separator.replace("\\n", "\n") if separator else defaults.coalesce_separator
+        ),
+    )
+
+
+def _build_media_config() -> MediaConfig:
+    """Build inbound media relay settings; every variable is optional."""
+    defaults = MediaConfig()
+    return MediaConfig(
+        enabled=_getenv_bool("MEDIA_ENABLED", defaults.enabled),
+        max_bytes=int(os.getenv("MEDIA_MAX_BYTES") or defaults.max_bytes),
+        spool_bytes=int(os.getenv("MEDIA_SPOOL_BYTES") or defaults.spool_bytes),
+        chunk_size=int(os.getenv("MEDIA_CHUNK_SIZE") or defaults.chunk_size),
+        timeout=float(os.getenv("MEDIA_TIMEOUT") or defaults.timeout),
+        temp_dir=os.getenv("MEDIA_TEMP_DIR") or defaults.temp_dir,
+        transform_workers=int(
+            os.getenv("MEDIA_TRANSFORM_WORKERS") or defaults.transform_workers
+        ),
+        transform_queue=int(
+            os.getenv("MEDIA_TRANSFORM_QUEUE") or defaults.transform_queue
+        ),
+        image_max_side=int(
+            os.getenv("MEDIA_IMAGE_MAX_SIDE") or defaults.image_max_side
+        ),
+        image_quality=int(os.getenv("MEDIA_IMAGE_QUALITY") or defaults.image_quality),
+        transform_cache_size=int(
+            os.getenv("MEDIA_TRANSFORM_CACHE_SIZE") or defaults.transform_cache_size
+        ),
+        transform_cache_ttl=float(
+            os.getenv("MEDIA_TRANSFORM_CACHE_TTL") or defaults.transform_cache_ttl
+        ),
+    )
+
+
+def _build_dedupe_config() -> DedupeConfig:
+    """Build webhook deduplication settings; every variable is optional."""
+    defaults = DedupeConfig()
+    return DedupeConfig(
+        enabled=_getenv_bool("DEDUPE_ENABLED", defaults.enabled),
+        ttl=float(os.getenv("DEDUPE_TTL") or defaults.ttl),
+        max_size=int(os.getenv("DEDUPE_MAX_SIZE") or defaults.max_size),
+        persistent=_getenv_bool("DEDUPE_PERSISTENT", defaults.persistent),
+        path=os.getenv("DEDUPE_PATH") or defaults.path,
+    )
+
+
+def _build_tracing_config() -> TracingConfig:
+    """Build tracing settings; every variable is optional."""
+    defaults = TracingConfig()
+    return TracingConfig(
+        enabled=_getenv_bool("TRACE_ENABLED", defaults.enabled),
+        sample_ratio=float(os.getenv("TRACE_SAMPLE_RATIO") or defaults.sample_ratio),
+        # Empty TRACE_EXPORT_PATH disables the file export
+        path=os.getenv("TRACE_EXPORT_PATH", defaults.path) or None,
+        otlp_endpoint=os.getenv("TRACE_OTLP_ENDPOINT") or None,
+        service_name=os.getenv("TRACE_SERVICE_NAME") or defaults.service_name,
+        flush_interval=float(
+            os.getenv("TRACE_FLUSH_INTERVAL") or defaults.flush_interval
+        ),
+        max_queue=int(os.getenv("TRACE_MAX_QUEUE") or defaults.max_queue),
+    )
+
+
+# Topics published on the event bus (per-topic variables use e.g. BUS_VK_INCOMING_*)
+BUS_TOPICS = (
+    "wasender.incoming",
+    "wasender.outgoing",
+    "vk.incoming",
+    "vk.confirmation",
+    "telegram.incoming",
+    "chatwoot.incoming",
+    "chatwoot.outgoing",
+    "chatwoot.conversation_changed",
+)
+
+
+def _build_bus_config() -> BusConfig:
+    """Build event bus settings; every variable is optional."""
+    defaults = BusConfig()
+    queue_sizes: Dict[str, int] = {}
+    workers: Dict[str, int] = {}
+    overflow: Dict[str, str] = {}
+    for topic in BUS_TOPICS:
+        prefix = "BUS_" + topic.replace(".", "_").upper()
+        v = os.getenv(f"{prefix}_QUEUE_SIZE")
+        if v:
+            queue_sizes[topic] = int(v)
+        v = os.getenv(f"{prefix}_WORKERS")
+        if v:
+            workers[topic] = int(v)
+        v = os.getenv(f"{prefix}_OVERFLOW")
+        if v:
+            overflow[topic] = v.strip().lower()
+    return BusConfig(
+        queue_size=int(os.getenv("BUS_QUEUE_SIZE") or defaults.queue_size),
+        workers=int(os.getenv("BUS_WORKERS") or defaults.workers),
+        overflow=(os.getenv("BUS_OVERFLOW") or defaults.overflow).strip().lower(),
+        # Empty BUS_SPILL_PATH keeps spilled events in memory
+        spill_path=os.getenv("BUS_SPILL_PATH", defaults.spill_path) or None,
+        drain_timeout=float(os.getenv("BUS_DRAIN_TIMEOUT") or defaults.drain_timeout),
+        queue_size_per_topic=queue_sizes,
+        workers_per_topic=workers,
+        overflow_per_topic=overflow,
+    )
+
+
+def _build_state_config() -> StateConfig:
+    """Build shared state settings; every variable is optional."""
+    defaults = StateConfig()
+    return StateConfig(
+        backend=(os.getenv("STATE_BACKEND") or defaults.backend).strip().lower(),
+        path=os.getenv("STATE_PATH") or defaults.path,
+        url=os.getenv("STATE_URL") or defaults.url,
+        prefix=os.getenv("STATE_PREFIX", defaults.prefix),
+        pool_size=int(os.getenv("STATE_POOL_SIZE") or defaults.pool_size),
+        lock_ttl=float(os.getenv("STATE_LOCK_TTL") or defaults.lock_ttl),
+        lock_timeout=float(os.getenv("STATE_LOCK_TIMEOUT") or defaults.lock_timeout),
+        lane_lock_timeout=float(
+            os.getenv("STATE_LANE_LOCK_TIMEOUT") or defaults.lane_lock_timeout
+        ),
+    )
+
+
+def _build_ipc_config() -> IpcConfig:
+    """Build process role and IPC settings; every variable is optional."""
+    defaults = IpcConfig()
+    role = (os.getenv("GATEWAY_ROLE") or defaults.role).strip().lower()
+    if role not in ("all", "ingress", "connector"):
+        raise RuntimeError(
+            f"Invalid GATEWAY_ROLE: {role} (expected all, ingress or connector)"
+        )
+    return IpcConfig(
+        role=role,
+        socket_path=os.getenv("IPC_SOCKET_PATH") or defaults.socket_path,
+        timeout=float(os.getenv("IPC_TIMEOUT") or defaults.timeout),
+        ingress_workers=int(os.getenv("INGRESS_WORKERS") or defaults.ingress_workers),
+    )
+
+
 def _build_channel_map() -> Dict[str, str]:
     """Build a map from webhook ID to channel name."""
     mapping: Dict[str, str] = {}
@@ -80,6 +504,27 @@ def load_config() -> AppConfig:
                 api_hash=_getenv("TG_API_HASH"),
                 session_name=_getenv("TG_SESSION_NAME"),
                 inbox_id=int(os.getenv("TG_INBOX_ID")),
+                send_rate=float(os.getenv("TG_SEND_RATE") or 20),
+                send_burst=float(os.getenv("TG_SEND_BURST") or 20),
+                peer_interval=float(os.getenv("TG_PEER_INTERVAL") or 1),
+                send_max_backlog=int(os.getenv("TG_SEND_MAX_BACKLOG") or 1000),
+                flood_max_wait=float(os.getenv("TG_FLOOD_MAX_WAIT") or 600),
+                peer_cache_path=os.getenv(
+                    "TG_PEER_CACHE_PATH", "data/telegram_peers.sqlite3"
+                ),
+                peer_cache_ttl=float(os.getenv("TG_PEER_CACHE_TTL") or 30 * 86400),
+                peer_cache_negative_ttl=float(
+                    os.getenv("TG_PEER_CACHE_NEGATIVE_TTL") or 600
+                ),
+                peer_cache_max_size=int(os.getenv("TG_PEER_CACHE_MAX_SIZE") or 100_000),
+                peer_warmup_dialogs=int(os.getenv("TG_PEER_WARMUP_DIALOGS") or 200),
+                sender_cache_ttl=float(os.getenv("TG_SENDER_CACHE_TTL") or 86400),
+                sender_cache_max_size=int(
+                    os.getenv("TG_SENDER_CACHE_MAX_SIZE") or 50_000
+                ),
+                sender_refresh_after=float(
+                    os.getenv("TG_SENDER_REFRESH_AFTER") or 3600
+                ),
             )
         else:
             telegram_cfg = None
@@ -95,6 +540,18 @@ def load_config() -> AppConfig:
                 webhook_secret=_getenv("WASENDER_WEBHOOK_SECRET"),
                 api_key=_getenv("WASENDER_API_KEY"),
                 inbox_id=int(os.getenv("WASENDER_INBOX_ID")),
+                send_rate=float(os.getenv("WASENDER_SEND_RATE") or 0),
+                send_burst=(
+                    float(os.getenv("WASENDER_SEND_BURST"))
+                    if os.getenv("WASENDER_SEND_BURST")
+                    else None
+                ),
+                timeout=float(os.getenv("WASENDER_TIMEOUT") or 15),
+                max_retries=int(os.getenv("WASENDER_MAX_RETRIES") or 3),
+                retry_base_delay=float(os.getenv("WASENDER_RETRY_BASE_DELAY") or 0.5),
+                retry_max_delay=float(os.getenv("WASENDER_RETRY_MAX_DELAY") or 30),
+                breaker_threshold=int(os.getenv("WASENDER_BREAKER_THRESHOLD") or 5),
+                breaker_reset=float(os.getenv("WASENDER_BREAKER_RESET") or 30),
             )
         else:
             wasender_cfg = None
@@ -115,6 +572,16 @@ def load_config() -> AppConfig:
                 confirmation=_getenv("VK_CONFIRMATION"),
                 api_version=os.getenv("VK_API_VERSION") or "5.199",
                 inbox_id=int(os.getenv("VK_INBOX_ID")),
+                profile_cache_ttl=float(os.getenv("VK_PROFILE_CACHE_TTL") or 86400),
+                profile_cache_max_size=int(
+                    os.getenv("VK_PROFILE_CACHE_MAX_SIZE") or 50_000
+                ),
+                profile_batch_window_ms=float(
+                    os.getenv("VK_PROFILE_BATCH_WINDOW_MS") or 5
+                ),
+                api_rate=float(os.getenv("VK_API_RATE") or 20),
+                send_batch_window_ms=float(os.getenv("VK_SEND_BATCH_WINDOW_MS") or 10),
+                send_batch_max=int(os.getenv("VK_SEND_BATCH_MAX") or 25),
             )
         else:
             vk_cfg = None
@@ -129,6 +596,17 @@ def load_config() -> AppConfig:
                 base_url=_getenv("CHATWOOT_BASE_URL"),
                 channel_by_webhook_id=_build_channel_map(),
             ),
+            http=_build_http_pool_config(),
+            cache=_build_cache_config(),
+            outbox=_build_outbox_config(),
+            journal=_build_journal_config(),
+            ingest=_build_ingest_config(),
+            media=_build_media_config(),
+            dedupe=_build_dedupe_config(),
+            tracing=_build_tracing_config(),
+            bus=_build_bus_config(),
+            ipc=_build_ipc_config(),
+            state=_build_state_config(),
         )
     except ValidationError as e:
         raise RuntimeError(f"Invalid configuration: {e}") from e
@@ -1,21 +1,127 @@
 import logging
-from typing import Any, Dict
+import time
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
 
 from fastapi import APIRouter, Header, HTTPException, Request
-from pyee.asyncio import AsyncIOEventEmitter
-from starlette.responses import PlainTextResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pydantic import ValidationError
+from pydantic_core import from_json
+from starlette.responses import PlainTextResponse, Response
 
 from app.config import AppConfig
-from app.domain.webhooks.wasender import WasenderWebhookPayload
+from app.domain.ports import EventPublisher
+from app.domain.webhooks.vk import VkCallback
+from app.domain.webhooks.wasender import WASENDER_WEBHOOK, WasenderUpsertWebhook
+from app.infra.dedupe import DedupeStore
+from app.infra.event_bus import BusFull
+from app.infra.journal import MESSAGE_KEY, InboundJournal, publish_inbound
+from app.infra.metrics import DROPPED_EVENTS, REGISTRY, WEBHOOK_LATENCY
+from app.infra.tracing import TRACER
 
 logger = logging.getLogger(__name__)
 
 
-def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
+StatsProvider = Callable[[], Dict[str, Any]]
+OutgoingHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class TimedRoute(APIRoute):
+    """
+    Records handler latency per route template (no ids/secrets from the path).
+    Webhooks (POST routes) also start a trace, or continue the caller's traceparent.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        handler = super().get_route_handler()
+        route = self.path
+        traced = "POST" in (self.methods or ())
+
+        async def timed_handler(request: Request) -> Response:
+            start = time.perf_counter()
+            status = 500
+            trace = (
+                TRACER.trace(
+                    f"POST {route}",
+                    traceparent=request.headers.get("traceparent"),
+                    **{"http.route": route},
+                )
+                if traced
+                else nullcontext()
+            )
+            with trace as span:
+                try:
+                    response = await handler(request)
+                    status = response.status_code
+                    return response
+                except HTTPException as e:
+                    status = e.status_code
+                    raise
+                except RequestValidationError:
+                    status = 422
+                    raise
+                finally:
+                    WEBHOOK_LATENCY.observe(
+                        time.perf_counter() - start, route, str(status)
+                    )
+                    if span is not None:
+                        span.set_attribute("http.response.status_code", status)
+
+        return timed_handler
+
+
+def create_router(
+    bus: EventPublisher,
+    config: AppConfig,
+    stats: Optional[Mapping[str, StatsProvider]] = None,
+    on_outgoing: Optional[OutgoingHandler] = None,
+    journal: Optional[InboundJournal] = None,
+    dedupe: Optional[DedupeStore] = None,
+) -> APIRouter:
     """
     Build HTTP routes with simple security checks.
+    `stats` maps a section name to a callable returning runtime counters for GET /stats.
+    `on_outgoing` (if set) is awaited for Chatwoot outgoing messages before the webhook
+    is acknowledged, e.g. to persist them in the outbound queue; otherwise they are
+    published on the bus as "chatwoot.outgoing".
+    `journal` (if set) durably records inbound messenger events before they are acknowledged.
+    `dedupe` (if set) drops webhook redeliveries (same message/event id) before any work.
+    GET /metrics serves the same pipeline in Prometheus text format.
+    `bus` is the in-process event bus, or the connector's IPC client in ingress workers.
+    Messenger webhooks are decoded from the raw body straight into typed models and
+    normalized once into a UnifiedMessage, which is what the bus carries.
     """
-    router = APIRouter(tags=["webhooks"])
+    router = APIRouter(tags=["webhooks"], route_class=TimedRoute)
+    stats = stats or {}
+
+    async def _claim(scope: str, event_id: Any) -> bool:
+        """True if the event is new (or cannot be deduplicated) and must be handled."""
+        if dedupe is None or event_id in (None, ""):
+            return True
+        return await dedupe.claim(scope, event_id)
+
+    async def _release(scope: str, event_id: Any) -> None:
+        """Let a redelivery through again after the first attempt failed."""
+        if dedupe is not None and event_id not in (None, ""):
+            await dedupe.release(scope, event_id)
+
+    async def _publish(topic: str, payload: Dict[str, Any]) -> None:
+        """
+        Put an event on the bus; a full topic ("reject" policy) or an unreachable
+        connector (ingress role) answers 503.
+        """
+        try:
+            await bus.publish(topic, payload)
+        except (BusFull, ConnectionError) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+    async def _publish_inbound(topic: str, payload: Dict[str, Any]) -> None:
+        """Journal and publish an inbound event; the sender retries on 503."""
+        try:
+            await publish_inbound(bus, journal, topic, payload)
+        except (BusFull, ConnectionError) as e:
+            raise HTTPException(status_code=503, detail=str(e))
 
     @router.get("/health")
     async def health():
@@ -50,10 +156,27 @@ def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
             },
         }
 
+    @router.get("/stats")
+    async def runtime_stats():
+        # Counters only (pool usage, cache hit rates, ...); no secrets here
+        out: Dict[str, Any] = {}
+        for name, provider in stats.items():
+            try:
+                out[name] = provider()
+            except Exception as e:
+                out[name] = {"error": str(e)}
+        return out
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    async def metrics() -> PlainTextResponse:
+        return PlainTextResponse(
+            REGISTRY.render(), media_type="text/plain; version=0.0.4"
+        )
+
     @router.post("/wasender/webhook/{webhook_id}", response_model=dict)
     async def wasender_webhook(
         webhook_id: str,
-        payload: WasenderWebhookPayload,
+        request: Request,
         x_webhook_signature: str | None = Header(
             default=None, alias="X-Webhook-Signature"
         ),
@@ -65,24 +188,32 @@ def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
         if x_webhook_signature != config.wasender.webhook_secret:
             raise HTTPException(status_code=403, detail="Invalid X-Webhook-Signature")
 
+        try:
+            payload = WASENDER_WEBHOOK.validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+
         event = payload.event
         logger.info("[http] Wasender webhook accepted: event=%s", event)
 
         if event == "messages.upsert":
-            try:
-                raw = payload.data["messages"]
-                key = raw["key"]
-                from_me = key["fromMe"]
-                bus.emit(
-                    "wasender.outgoing" if from_me else "wasender.incoming",
-                    payload.model_dump(),
-                )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400, detail=f"Invalid upsert format: {e}"
-                )
+            if not isinstance(payload, WasenderUpsertWebhook):
+                raise HTTPException(status_code=400, detail="Invalid upsert format")
+            message_id = payload.key.id
+            if not await _claim("wasender", message_id):
+                return {"status": "duplicate"}
+            event_payload = {MESSAGE_KEY: payload.to_message()}
+            if payload.key.fromMe:
+                await _publish("wasender.outgoing", event_payload)
+            else:
+                try:
+                    await _publish_inbound("wasender.incoming", event_payload)
+                except Exception:
+                    await _release("wasender", message_id)
+                    raise
         else:
             logger.info("[wasender] Ignored event: %s", event)
+            DROPPED_EVENTS.inc("wasender", "ignored_event")
 
         return {"status": "ok"}
 
@@ -93,7 +224,10 @@ def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
         if not channel and webhook_id != config.chatwoot.webhook_id:
             raise HTTPException(status_code=403, detail="Unknown webhook ID")
 
-        payload = await request.json()
+        try:
+            payload = from_json(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
         event = payload.get("event")
         msg_type = payload.get("message_type")
 
@@ -112,14 +246,38 @@ def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
         )
 
         if event == "message_created":
+            message_id = payload.get("id")
+            if not await _claim("chatwoot", message_id):
+                return {"status": "duplicate"}
             if msg_type == "incoming":
-                bus.emit("chatwoot.incoming", payload)
+                try:
+                    await _publish("chatwoot.incoming", payload)
+                except Exception:
+                    # Not accepted: let Chatwoot's retry through
+                    await _release("chatwoot", message_id)
+                    raise
             elif msg_type == "outgoing":
-                bus.emit("chatwoot.outgoing", payload)
+                if on_outgoing is not None:
+                    try:
+                        await on_outgoing(payload)
+                    except Exception:
+                        await _release("chatwoot", message_id)
+                        raise
+                else:
+                    try:
+                        await _publish("chatwoot.outgoing", payload)
+                    except Exception:
+                        await _release("chatwoot", message_id)
+                        raise
             else:
                 logger.warning("[chatwoot] Unknown message_type: %s", msg_type)
+                DROPPED_EVENTS.inc("chatwoot", "ignored_message_type")
+        elif event in ("conversation_status_changed", "conversation_updated"):
+            # Lets the conversation id cache drop resolved/closed conversations
+            await _publish("chatwoot.conversation_changed", payload)
         else:
             logger.info("[chatwoot] Ignored event: %s", event)
+            DROPPED_EVENTS.inc("chatwoot", "ignored_event")
 
         return {"status": "received"}
 
@@ -142,13 +300,13 @@ def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
             raise HTTPException(status_code=403, detail="Invalid callback ID")
 
         try:
-            payload: Dict[str, Any] = await request.json()
-        except Exception:
+            payload = VkCallback.model_validate_json(await request.body())
+        except ValidationError:
             raise HTTPException(status_code=400, detail="Invalid JSON body")
 
-        event_type = payload.get("type")
-        group_id = payload.get("group_id")
-        secret = payload.get("secret")
+        event_type = payload.type
+        group_id = payload.group_id
+        secret = payload.secret
 
         logger.info("[vk] event received: type=%s group_id=%s", event_type, group_id)
 
@@ -157,7 +315,7 @@ def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
             if group_id != config.vk.group_id:
                 raise HTTPException(status_code=400, detail="Invalid group_id")
             # Optional: emit confirmation event for debugging/metrics
-            bus.emit("vk.confirmation", {"group_id": group_id})
+            await _publish("vk.confirmation", {"group_id": group_id})
             return PlainTextResponse(config.vk.confirmation)
 
         # For all other events, verify secret and group_id
@@ -167,21 +325,24 @@ def create_router(bus: AsyncIOEventEmitter, config: AppConfig) -> APIRouter:
             raise HTTPException(status_code=400, detail="Invalid group_id")
 
         if event_type == "message_new":
+            message = payload.to_message()
+            if message is None:
+                # Nothing to answer to; acknowledge so VK does not retry
+                logger.warning("[vk] message_new without peer_id dropped")
+                DROPPED_EVENTS.inc("vk", "invalid_payload")
+                return PlainTextResponse("ok")
+            event_id = payload.dedupe_id()
+            if not await _claim("vk", event_id):
+                return PlainTextResponse("ok")
             try:
-                obj = payload.get("object") or {}
-                message = obj.get("message") or {}
-                # Emit unified internal event; VkAdapter will convert to UnifiedMessage
-                bus.emit(
-                    "vk.incoming",
-                    {"event": "message_new", "message": message, "raw": payload},
-                )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400, detail=f"Invalid message_new payload: {e}"
-                )
+                await _publish_inbound("vk.incoming", {MESSAGE_KEY: message})
+            except Exception:
+                await _release("vk", event_id)
+                raise
         else:
             # Acknowledge other events to prevent VK retries
             logger.info("[vk] ignored event type: %s", event_type)
+            DROPPED_EVENTS.inc("vk", "ignored_event")
 
         # VK requires literal 'ok' to acknowledge processing
         return PlainTextResponse("ok")
@@ -1,6 +1,41 @@
-from typing import Annotated, Any, Dict, Literal, Union
-
-from pydantic import BaseModel, ConfigDict, Field, HttpUrl
+from types import MappingProxyType
+from typing import Annotated, Any, Literal, Mapping, Union
+
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    ConfigDict,
+    Field,
+    HttpUrl,
+    PlainSerializer,
+)
+
+
+def freeze(value: Any) -> Any:
+    """Read-only copy of JSON-like data: mappings become MappingProxyType, lists tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Plain dict/list copy of frozen data, e.g. to send it as a JSON body."""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+# Read-only mapping fields; serialized (journal, IPC) as plain JSON objects
+FrozenMapping = Annotated[
+    Mapping[str, Any], AfterValidator(freeze), PlainSerializer(thaw, return_type=dict)
+]
+FrozenAttributes = Annotated[
+    Mapping[str, str], AfterValidator(freeze), PlainSerializer(thaw, return_type=dict)
+]
 
 
 # Content payloads (discriminated union)
@@ -51,11 +86,23 @@ Content = Annotated[
 
 # Unified message
 class UnifiedMessage(BaseModel):
-    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+    """
+    An inbound message normalized once per channel at the edge (webhook route or
+    Telegram handler); every later stage reads this same immutable object.
+    - `attributes` are the channel's contact attributes for Chatwoot (e.g.
+      vk_user_id); copy them (dict(...)) to add more.
+    - `raw` is the channel payload some stages need again (Wasender decrypt-media);
+      both are read-only mappings (lists inside become tuples), thaw() for a copy.
+    """
+
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True, frozen=True)
 
     channel: Literal["whatsapp", "telegram", "vk"]
     recipient_id: str
     sender_id: str | None = None
     sender_name: str | None = None
+    sender_username: str | None = None
+    message_id: str | None = None
     content: Content
-    raw: dict | None = None
+    attributes: FrozenAttributes = Field(default_factory=lambda: MappingProxyType({}))
+    raw: FrozenMapping | None = None
@@ -0,0 +1,16 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class OutboxItem(BaseModel):
+    """Agent reply waiting to be delivered to a messenger."""
+
+    id: Optional[int] = None  # assigned by the store
+    channel: str  # "whatsapp" | "telegram" | "vk"
+    recipient_id: str
+    text: str
+    created_at: float  # unix time of enqueue
+    attempts: int = 0
+    last_error: Optional[str] = None
+    traceparent: Optional[str] = None  # trace of the webhook (memory only)
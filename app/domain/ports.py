@@ -1,4 +1,14 @@
-from typing import Awaitable, Callable, Protocol, Set
+from typing import (
+    Any,
+    AsyncContextManager,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Set,
+)
 
 from app.domain.message import (
     ContactContent,
@@ -8,6 +18,7 @@ from app.domain.message import (
     TextContent,
     UnifiedMessage,
 )
+from app.domain.outbox import OutboxItem
 
 OnMessage = Callable[[UnifiedMessage], Awaitable[None]]
 
@@ -32,3 +43,48 @@ class MessengerAdapter(Protocol):
     ) -> None: ...
 
     def capabilities(self) -> Set[str]: ...
+
+
+class OutboxStore(Protocol):
+    """Persistence for the outbound delivery queue (SQLite by default)."""
+
+    async def open(self) -> None: ...
+    async def close(self) -> None: ...
+
+    async def put(self, item: OutboxItem) -> int: ...
+    async def load_pending(self) -> List[OutboxItem]: ...
+    async def mark_done(self, item_id: int) -> None: ...
+    async def mark_retry(self, item_id: int, attempts: int, error: str) -> None: ...
+    async def mark_dead(self, item_id: int, attempts: int, error: str) -> None: ...
+
+
+class EventPublisher(Protocol):
+    """Accepts events for a bus topic (the in-process bus or the connector over IPC)."""
+
+    async def publish(self, topic: str, payload: Dict[str, Any]) -> None: ...
+
+
+class StateStore(Protocol):
+    """
+    Key/value state that gateway replicas can share (caches, dedupe ids, rate
+    budgets, per-key locks). Values are JSON-serializable; ttl is in seconds.
+    `shared` is False for the in-process store, whose state other replicas cannot see.
+    """
+
+    shared: bool
+
+    async def open(self) -> None: ...
+    async def close(self) -> None: ...
+
+    async def get(self, key: str) -> Any: ...
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None: ...
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool: ...
+    async def delete(self, key: str) -> None: ...
+    async def incr(
+        self, key: str, amount: int = 1, ttl: Optional[float] = None
+    ) -> int: ...
+    def lock(
+        self, key: str, *, ttl: Optional[float] = None, timeout: Optional[float] = None
+    ) -> AsyncContextManager[None]: ...
+
+    def stats(self) -> Dict[str, Any]: ...
@@ -0,0 +1,130 @@
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from app.domain.message import (
+    MediaContent,
+    StickerContent,
+    TextContent,
+    UnifiedMessage,
+)
+
+
+class VkPhotoSize(BaseModel):
+    url: str = ""
+    width: int = 0
+    height: int = 0
+
+
+class VkPhoto(BaseModel):
+    sizes: List[VkPhotoSize] = []
+
+
+class VkDoc(BaseModel):
+    url: str = ""
+    title: Optional[str] = None
+
+
+class VkAudioMessage(BaseModel):
+    link_mp3: Optional[str] = None
+    link_ogg: Optional[str] = None
+
+
+class VkSticker(BaseModel):
+    images: List[VkPhotoSize] = []
+
+
+class VkAttachment(BaseModel):
+    type: str
+    photo: Optional[VkPhoto] = None
+    doc: Optional[VkDoc] = None
+    audio_message: Optional[VkAudioMessage] = None
+    sticker: Optional[VkSticker] = None
+
+    def to_content(self) -> Optional[MediaContent]:
+        """A downloadable attachment as MediaContent; None for videos, walls, etc."""
+        if self.photo and self.photo.sizes:
+            largest = max(self.photo.sizes, key=lambda s: s.width * s.height)
+            if largest.url:
+                return MediaContent(type="media", media_type="image", url=largest.url)
+        if self.doc and self.doc.url:
+            return MediaContent(
+                type="media",
+                media_type="document",
+                url=self.doc.url,
+                filename=self.doc.title,
+            )
+        voice = self.audio_message
+        if voice and (voice.link_mp3 or voice.link_ogg):
+            return MediaContent(
+                type="media",
+                media_type="audio",
+                url=voice.link_mp3 or voice.link_ogg or "",
+            )
+        return None
+
+
+class VkMessage(BaseModel):
+    id: Optional[int] = None
+    peer_id: Optional[int] = None
+    from_id: Optional[int] = None
+    text: str = ""
+    attachments: List[VkAttachment] = []
+
+    def to_content(self) -> Union[TextContent, MediaContent, StickerContent]:
+        """
+        The first downloadable attachment, captioned with the text, else the text.
+        Further attachments are listed in the caption (one upload per VK message).
+        A sticker is always sent alone.
+        """
+        for attachment in self.attachments:
+            if attachment.sticker and attachment.sticker.images:
+                largest = max(attachment.sticker.images, key=lambda s: s.width)
+                return StickerContent(type="sticker", ref=largest.url)
+        media: Optional[MediaContent] = None
+        notes: List[str] = []
+        for attachment in self.attachments:
+            content = attachment.to_content()
+            if media is None and content is not None:
+                media = content
+            else:
+                notes.append(str(content.url) if content else f"[{attachment.type}]")
+        text = "\n".join([self.text.strip(), *notes]).strip()
+        if media is not None:
+            return media.model_copy(update={"caption": text or None})
+        return TextContent(type="text", text=text)
+
+
+class VkCallbackObject(BaseModel):
+    message: VkMessage = VkMessage()
+
+
+class VkCallback(BaseModel):
+    """Minimal model for a VK Callback API request."""
+
+    type: str
+    group_id: Optional[int] = None
+    secret: Optional[str] = None
+    event_id: Optional[str] = None
+    object_: VkCallbackObject = Field(default=VkCallbackObject(), alias="object")
+
+    def dedupe_id(self) -> Optional[str]:
+        """VK retries with the same event_id; older API versions lack it."""
+        message_id = self.object_.message.id
+        return self.event_id or (f"message:{message_id}" if message_id else None)
+
+    def to_message(self) -> Optional[UnifiedMessage]:
+        """Normalize a message_new event; None when it has no peer to answer."""
+        msg = self.object_.message
+        if msg.peer_id is None:
+            return None
+        peer_id = str(msg.peer_id)
+        from_id = str(msg.from_id) if msg.from_id is not None else peer_id
+        return UnifiedMessage(
+            channel="vk",
+            recipient_id=peer_id,
+            sender_id=from_id,
+            message_id=str(msg.id) if msg.id is not None else None,
+            content=msg.to_content(),
+            attributes={"vk_user_id": from_id, "vk_peer_id": peer_id},
+        )
@@ -1,42 +1,141 @@
-from typing import Optional
+from typing import Annotated, Literal, Optional, Tuple, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+
+from app.domain.message import (
+    MediaContent,
+    StickerContent,
+    TextContent,
+    UnifiedMessage,
+)
 
 
 class WasenderMessageKey(BaseModel):
-    remoteJid: str
+    remoteJid: str = ""
+    participant: Optional[str] = None
     fromMe: bool
-    id: str
+    id: Optional[str] = None
+
+
+class WasenderExtendedText(BaseModel):
+    text: Optional[str] = None
+
+
+class WasenderMedia(BaseModel):
+    """
+    imageMessage, videoMessage, audioMessage, documentMessage or stickerMessage.
+    Unknown fields (mediaKey, directPath, ...) are kept: decrypt-media needs them.
+    """
+
+    model_config = ConfigDict(extra="allow")
+
+    url: Optional[str] = None
+    mimetype: Optional[str] = None
+    caption: Optional[str] = None
+    fileName: Optional[str] = None
 
 
 class WasenderMessage(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
     conversation: Optional[str] = None
+    extendedTextMessage: Optional[WasenderExtendedText] = None
+    imageMessage: Optional[WasenderMedia] = None
+    videoMessage: Optional[WasenderMedia] = None
+    audioMessage: Optional[WasenderMedia] = None
+    documentMessage: Optional[WasenderMedia] = None
+    stickerMessage: Optional[WasenderMedia] = None
+
+    def media(self) -> Optional[Tuple[str, WasenderMedia]]:
+        """The attachment as (MediaContent.media_type or "sticker", details)."""
+        for media_type, media in (
+            ("image", self.imageMessage),
+            ("video", self.videoMessage),
+            ("audio", self.audioMessage),
+            ("document", self.documentMessage),
+            ("sticker", self.stickerMessage),
+        ):
+            if media is not None:
+                return media_type, media
+        return None
 
 
 class WasenderMessagesPayload(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
     key: WasenderMessageKey
     pushName: Optional[str] = None
     message: Optional[WasenderMessage] = None
 
 
+class WasenderUpsertData(BaseModel):
+    messages: WasenderMessagesPayload
+
+
+class WasenderUpsertWebhook(BaseModel):
+    """Wasender 'messages.upsert' webhook (the only event forwarded to Chatwoot)."""
+
+    event: Literal["messages.upsert"]
+    data: WasenderUpsertData
+
+    @property
+    def key(self) -> WasenderMessageKey:
+        return self.data.messages.key
+
+    def to_message(self) -> UnifiedMessage:
+        """Normalize into the UnifiedMessage consumed by every later stage."""
+        raw = self.data.messages
+        message = raw.message or WasenderMessage()
+        text = message.conversation or (
+            message.extendedTextMessage.text if message.extendedTextMessage else None
+        )
+        remote = raw.key.remoteJid or raw.key.participant or ""
+        msisdn = remote.split("@")[0]
+        content: Union[TextContent, MediaContent, StickerContent]
+        media = message.media()
+        # WhatsApp media is encrypted: fetched via wasender:// (decrypt-media)
+        url = f"wasender://{raw.key.id or ''}"
+        if media is not None and media[0] == "sticker":
+            content = StickerContent(type="sticker", ref=url)
+        elif media is not None:
+            media_type, details = media
+            content = MediaContent(
+                type="media",
+                media_type=media_type,
+                url=url,
+                caption=(details.caption or "").strip() or None,
+                filename=details.fileName,
+                mime_type=details.mimetype,
+            )
+        else:
+            content = TextContent(type="text", text=(text or "").strip())
+        return UnifiedMessage(
+            channel="whatsapp",
+            recipient_id=msisdn,
+            sender_id=msisdn,
+            sender_name=raw.pushName,
+            message_id=raw.key.id,
+            content=content,
+            attributes={"wa_remote_jid": remote},
+            # The original message object, as decrypt-media expects it
+            raw=raw.model_dump(exclude_none=True) if media is not None else None,
+        )
+
+
 class WasenderWebhookPayload(BaseModel):
-    """Minimal model for Wasender 'messages.upsert' webhook."""
+    """Any other Wasender webhook (acknowledged and ignored)."""
 
     event: str
-    data: dict  # keep generic for now
-
-    def get_basic_info(self):
-        """Extract basic message data (if available)."""
-        try:
-            msg_data = self.data["messages"]
-            key = msg_data.get("key", {})
-            text = (msg_data.get("message") or {}).get("conversation")
-            return {
-                "fromMe": key.get("fromMe"),
-                "remoteJid": key.get("remoteJid"),
-                "id": key.get("id"),
-                "text": text,
-                "pushName": msg_data.get("pushName"),
-            }
-        except Exception:
-            return None
+    data: dict = {}
+
+
+# Built once; decodes the raw request body straight into the typed models.
+# A malformed upsert falls through to WasenderWebhookPayload (answered with 400).
+WASENDER_WEBHOOK: TypeAdapter[Union[WasenderUpsertWebhook, WasenderWebhookPayload]] = (
+    TypeAdapter(
+        Annotated[
+            Union[WasenderUpsertWebhook, WasenderWebhookPayload],
+            Field(union_mode="left_to_right"),
+        ]
+    )
+)
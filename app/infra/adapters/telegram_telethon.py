@@ -1,14 +1,40 @@
 import asyncio
 import logging
 import re
-from typing import Optional
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlsplit
 
-from pyee.asyncio import AsyncIOEventEmitter
 from telethon import TelegramClient, errors, events, functions, types
 
 from app.config import TelegramConfig
-from app.domain.message import TextContent
+from app.domain.message import (
+    MediaContent,
+    StickerContent,
+    TextContent,
+    UnifiedMessage,
+)
 from app.domain.ports import MessengerAdapter, OnMessage
+from app.infra.cache import NOT_FOUND, TTLCache
+from app.infra.dedupe import DedupeStore
+from app.infra.event_bus import EventBus
+from app.infra.journal import MESSAGE_KEY, InboundJournal, publish_inbound
+from app.infra.media import MediaFetcher, MediaFile
+from app.infra.metrics import SEND_LATENCY, timed
+from app.infra.send_scheduler import SendScheduler
+from app.infra.telegram_peers import TelegramPeerCache, recipient_keys
+from app.infra.tracing import KIND_CLIENT, TRACER
 
 logger = logging.getLogger(__name__)
 
@@ -17,16 +43,75 @@ USERNAME_RE = re.compile(r"^@?[A-Za-z0-9_]{5,}$")
 # E.164-like phone pattern: optional + and 7..15 digits
 PHONE_RE = re.compile(r"^\+?\d{7,15}$")
 
+# Animated and video stickers: only their still thumbnail can be relayed
+ANIMATED_STICKER_TYPES = ("application/x-tgsticker", "video/webm")
+
+# Resolution errors that mean "this recipient does not exist / is unknown"
+UNRESOLVABLE_ERRORS = (
+    RuntimeError,
+    errors.rpcerrorlist.UsernameNotOccupiedError,
+    errors.rpcerrorlist.UsernameInvalidError,
+)
+# Send errors that may only mean the cached peer (access_hash) went stale
+STALE_PEER_ERRORS = (
+    errors.rpcerrorlist.PeerIdInvalidError,
+    errors.rpcerrorlist.UserIdInvalidError,
+    errors.rpcerrorlist.ChannelInvalidError,
+    errors.rpcerrorlist.ChannelPrivateError,
+)
+
 
 class TelegramAdapter(MessengerAdapter):
-    """Telegram adapter (text only) using native Telethon client (non-bot)."""
+    """
+    Telegram adapter using native Telethon client (non-bot).
+    Sends text; receives text, media (photos, videos, voice, documents) and stickers.
+    """
 
-    def __init__(self, bus: AsyncIOEventEmitter, config: TelegramConfig):
+    def __init__(
+        self,
+        bus: EventBus,
+        config: TelegramConfig,
+        journal: Optional[InboundJournal] = None,
+        dedupe: Optional[DedupeStore] = None,
+    ):
         self.bus = bus
         self._cfg = config
+        self._journal = journal
+        self._dedupe = dedupe
         self.inbox_id = config.inbox_id  # expose per-channel inbox
         self.client: Optional[TelegramClient] = None
         self._cb: Optional[OnMessage] = None
+        # Account-wide pacing; FloodWait pauses sending instead of dropping messages
+        self.scheduler = SendScheduler(
+            name="telegram",
+            send=self._send_now,
+            throttle_delay=self._flood_wait_seconds,
+            rate=config.send_rate,
+            burst=config.send_burst,
+            peer_interval=config.peer_interval,
+            max_backlog=config.send_max_backlog,
+            max_wait=config.flood_max_wait,
+        )
+        # Recipient -> access_hash, so replies need no entity lookups
+        self.peers = TelegramPeerCache(
+            path=config.peer_cache_path or None,
+            ttl=config.peer_cache_ttl,
+            negative_ttl=config.peer_cache_negative_ttl,
+            max_size=config.peer_cache_max_size,
+        )
+        self._warmup_task: Optional[asyncio.Task] = None
+        # sender_id -> {"id", "username", "first_name", "fetched_at"}
+        self._senders: TTLCache[Dict[str, Any]] = TTLCache(
+            max_size=config.sender_cache_max_size, ttl=config.sender_cache_ttl
+        )
+        self._refreshing: Set[int] = set()
+        # telegram:// media url -> Telethon message, so the download needs no lookup
+        self._media_messages: TTLCache[Any] = TTLCache(max_size=1000, ttl=600.0)
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        # sender -> [lock, handlers holding or waiting for it]; see _sender_turn()
+        self._sender_turns: Dict[Any, List[Any]] = {}
+        self.sender_fetches = 0
+        self.sender_refreshes = 0
 
     def on_message(self, cb: OnMessage) -> None:
         self._cb = cb
@@ -41,27 +126,69 @@ class TelegramAdapter(MessengerAdapter):
             app_version="8.4.1",
             lang_code="en",
             system_lang_code="en-US",
+            # Every FloodWait is raised to the send scheduler, which pauses all sends
+            # (Telethon would otherwise sleep through waits up to 60s in one send)
+            flood_sleep_threshold=0,
         )
+        await self.peers.open()
         await self.client.start()
+        self.scheduler.start()
 
         # Register handler for incoming messages (non-bot account)
         @self.client.on(events.NewMessage(incoming=True))
         async def handle_incoming(event):
-            # Extract sender details
-            sender = await event.get_sender()
-            username = getattr(sender, "username", None)
-            first_name = getattr(sender, "first_name", None)
-            from_id = getattr(sender, "id", None)
-
-            # Build message payload for internal bus
-            payload = {
-                "text": event.text,
-                "from_id": str(from_id) if from_id else None,
-                "username": username,
-                "name": first_name or username or str(from_id),
-            }
-            # Emit telegram.incoming event to the bus
-            self.bus.emit("telegram.incoming", payload)
+            # Telethon runs handlers concurrently: queue up behind earlier updates of
+            # the same sender before the first await, so they are published (and get
+            # their lane) in arrival order
+            async with self._sender_turn(event.sender_id or event.chat_id):
+                await _handle(event)
+
+        async def _handle(event):
+            # Each update starts a trace that follows the message through the bus
+            with TRACER.trace("telegram.update", chat_id=event.chat_id):
+                # Updates can be delivered again after a reconnect (message ids are per chat)
+                message_key = f"{event.chat_id}:{event.id}"
+                if self._dedupe and not await self._dedupe.claim(
+                    "telegram", message_key
+                ):
+                    return
+
+                try:
+                    # Extract sender details (usually without a request)
+                    sender = await self._sender_profile(event)
+                    username = sender["username"]
+                    first_name = sender["first_name"]
+                    from_id = sender["id"]
+
+                    # Normalize once; every later stage reads this message
+                    user_id = str(from_id) if from_id else None
+                    attributes = {}
+                    if user_id:
+                        attributes["telegram_user_id"] = user_id
+                    if username:
+                        attributes["telegram_username"] = username
+                    message = UnifiedMessage(
+                        channel="telegram",
+                        recipient_id=user_id or username or "",
+                        sender_id=user_id,
+                        sender_name=first_name or username or str(from_id),
+                        sender_username=username,
+                        message_id=str(event.id),
+                        content=self._content(event),
+                        attributes=attributes,
+                    )
+                    # Journal (if enabled) and emit telegram.incoming event to the bus
+                    await publish_inbound(
+                        self.bus,
+                        self._journal,
+                        "telegram.incoming",
+                        {MESSAGE_KEY: message},
+                    )
+                except Exception:
+                    # Not accepted: let a redelivered update through
+                    if self._dedupe:
+                        await self._dedupe.release("telegram", message_key)
+                    raise
 
         # Be gentle
         await asyncio.sleep(2)
@@ -77,13 +204,188 @@ class TelegramAdapter(MessengerAdapter):
                 "Authorize once with Telethon to create the session file.",
                 self._cfg.session_name,
             )
-        logger.info("[telegram] adapter started (native client, text only)")
+        elif self._cfg.peer_warmup_dialogs > 0:
+            self._warmup_task = asyncio.create_task(self._warm_peer_cache())
+        logger.info("[telegram] adapter started (native client)")
 
     async def stop(self) -> None:
+        if self._warmup_task:
+            self._warmup_task.cancel()
+            await asyncio.gather(self._warmup_task, return_exceptions=True)
+            self._warmup_task = None
+        for task in self._refresh_tasks:
+            task.cancel()
+        await asyncio.gather(*self._refresh_tasks, return_exceptions=True)
+        await self.scheduler.stop()
         if self.client and self.client.is_connected():
             await self.client.disconnect()
+        await self.peers.close()
         logger.info("[telegram] adapter stopped")
 
+    def _content(self, event: Any) -> Union[TextContent, MediaContent, StickerContent]:
+        """Text, or the message's sticker/photo/document as a telegram://chat/msg url."""
+        text = (event.text or "").strip()
+        if event.file is None or event.web_preview is not None:
+            return TextContent(type="text", text=text)
+        url = f"telegram://{event.chat_id}/{event.id}"
+        self._media_messages.set(url, event.message)
+        if event.sticker:
+            return StickerContent(type="sticker", ref=url)
+        if event.photo:
+            media_type = "image"
+        elif event.video or event.video_note or event.gif:
+            media_type = "video"
+        elif event.voice or event.audio:
+            media_type = "audio"
+        else:
+            media_type = "document"
+        return MediaContent(
+            type="media",
+            media_type=media_type,
+            url=url,
+            caption=text or None,
+            filename=event.file.name,
+            mime_type=event.file.mime_type,
+        )
+
+    def register_media(self, media: MediaFetcher) -> None:
+        """
+        Serve telegram:// attachments from Telethon's chunked download iterator
+        (animated stickers: their still thumbnail).
+        """
+
+        async def _source(
+            message: UnifiedMessage, content: MediaContent, file: MediaFile
+        ) -> None:
+            if self.client is None:
+                raise RuntimeError("Telegram client is not started")
+            url = str(content.url)
+            tg_message = self._media_messages.get(url)
+            if tg_message is None:
+                # Replayed after a restart: fetch the message again
+                parts = urlsplit(url)
+                tg_message = await self.client.get_messages(
+                    int(parts.netloc), ids=int(parts.path.strip("/"))
+                )
+            if tg_message is None or tg_message.media is None:
+                raise RuntimeError(f"Telegram media is gone: {url}")
+            mime_type = tg_message.file.mime_type if tg_message.file else None
+            if tg_message.sticker and mime_type in ANIMATED_STICKER_TYPES:
+                # A few KB of WebP, converted to PNG by the media transform stage
+                thumb = await self.client.download_media(
+                    tg_message, file=bytes, thumb=-1
+                )
+                if not thumb:
+                    raise RuntimeError(f"Telegram sticker has no thumbnail: {url}")
+                await file.write(thumb)
+                self._media_messages.invalidate(url)
+                return
+            file.expect(tg_message.file.size if tg_message.file else None)
+            # Telegram serves parts in multiples of 4 KiB, at most 512 KiB
+            chunk_size = min(512 * 1024, max(4096, media.chunk_size // 4096 * 4096))
+            async for chunk in self.client.iter_download(
+                tg_message.media, chunk_size=chunk_size
+            ):
+                await file.write(chunk)
+            self._media_messages.invalidate(url)
+
+        media.register_source("telegram", _source)
+
+    @asynccontextmanager
+    async def _sender_turn(self, sender: Any) -> AsyncIterator[None]:
+        """Serialize updates of one sender; asyncio.Lock wakes waiters in FIFO order."""
+        turn = self._sender_turns.get(sender)
+        if turn is None:
+            turn = self._sender_turns[sender] = [asyncio.Lock(), 0]
+        turn[1] += 1
+        try:
+            async with turn[0]:
+                yield
+        finally:
+            turn[1] -= 1
+            if not turn[1]:
+                del self._sender_turns[sender]
+
+    async def _sender_profile(self, event: Any) -> Dict[str, Any]:
+        """
+        Sender details for an incoming message, avoiding get_sender() round-trips:
+        the entity shipped with the update, else the sender cache, else a fetch.
+        Cached profiles older than sender_refresh_after are refreshed in the background.
+        """
+        if event.sender is not None:
+            return await self._store_sender(event.sender)
+        sender_id = event.sender_id
+        cached = self._senders.get(sender_id) if sender_id is not None else None
+        if cached is not None:
+            age = time.monotonic() - cached["fetched_at"]
+            if age > self._cfg.sender_refresh_after:
+                self._refresh_sender_later(sender_id, event)
+            return cached
+        self.sender_fetches += 1
+        return await self._store_sender(await event.get_sender())
+
+    async def _store_sender(self, sender: Any) -> Dict[str, Any]:
+        profile = {
+            "id": getattr(sender, "id", None),
+            "username": getattr(sender, "username", None),
+            "first_name": getattr(sender, "first_name", None),
+            "fetched_at": time.monotonic(),
+        }
+        if profile["id"] is not None:
+            self._senders.set(profile["id"], profile)
+        await self._remember_entity(sender)
+        return profile
+
+    def _refresh_sender_later(self, sender_id: int, event: Any) -> None:
+        if sender_id in self._refreshing:
+            return
+        self._refreshing.add(sender_id)
+
+        async def _refresh() -> None:
+            try:
+                await self._store_sender(await event.get_sender())
+                self.sender_refreshes += 1
+            except Exception as e:
+                logger.warning(
+                    "[telegram] sender refresh failed for %s: %s", sender_id, e
+                )
+            finally:
+                self._refreshing.discard(sender_id)
+
+        task = asyncio.create_task(_refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def sender_cache_stats(self) -> Dict[str, Any]:
+        return {
+            **self._senders.stats(),
+            "fetches": self.sender_fetches,
+            "background_refreshes": self.sender_refreshes,
+        }
+
+    def _recipient_key(self, raw: str) -> Tuple[str, str]:
+        """Classify a recipient string; returns (kind, value) with kind username/phone/id."""
+        rid = (raw or "").strip()
+        if not rid:
+            raise ValueError("recipient_id is empty")
+
+        # Username: Telethon accepts both with and without leading '@'
+        if USERNAME_RE.match(rid):
+            return "username", rid.lstrip("@")
+
+        # Phone number
+        if PHONE_RE.match(rid):
+            return "phone", rid
+
+        # Explicit "id:<int>" format or a bare integer (user_id)
+        if rid.startswith("id:"):
+            rid = rid[3:].strip()
+        if rid.isdigit():
+            return "id", rid
+
+        # Anything else is not supported
+        raise ValueError("recipient_id must be @username, phone number, or id:<int>")
+
     async def _resolve_entity(self, raw: str):
         """
         Resolve Telethon 'entity' from a recipient string.
@@ -91,72 +393,149 @@ class TelegramAdapter(MessengerAdapter):
           - @username or username
           - phone number (+79991234567)
           - id:<int> or a bare integer (user_id)
+        Known users come from the peer cache (no MTProto request); it is filled from
+        incoming messages, dialog warm-up and previous resolutions.
         Notes:
           - Sending by phone requires importing the phone into your contacts first.
           - Sending by user_id works only if the session already knows this user
             (i.e., has access_hash cached from previous interactions).
         """
-        rid = (raw or "").strip()
-        if not rid:
-            raise ValueError("recipient_id is empty")
+        kind, value = self._recipient_key(raw)
+        key = recipient_keys(
+            user_id=int(value) if kind == "id" else None,
+            username=value if kind == "username" else None,
+            phone=value if kind == "phone" else None,
+        )[0]
+        cached = self.peers.get(key)
+        if cached is NOT_FOUND:
+            raise RuntimeError(f"Recipient {raw!r} could not be resolved recently")
+        if cached is not None:
+            _, user_id, access_hash = cached
+            return types.InputPeerUser(user_id=user_id, access_hash=access_hash)
 
-        # Username: Telethon accepts both with and without leading '@'
-        if USERNAME_RE.match(rid):
-            return rid.lstrip("@")
+        try:
+            entity = await self._lookup_entity(kind, value)
+        except UNRESOLVABLE_ERRORS:
+            self.peers.set_not_found(key)
+            raise
+        await self._remember_entity(entity, extra_keys=[key])
+        return entity
+
+    async def _lookup_entity(self, kind: str, value: str):
+        """Resolve a recipient over MTProto (cache miss)."""
+        if kind == "username":
+            try:
+                return await self.client.get_entity(value)
+            except ValueError:
+                raise RuntimeError(f"Cannot resolve username {value!r}")
 
         # Phone number: import to contacts first, then you can send by the number
-        if PHONE_RE.match(rid):
-            await self.client(
+        if kind == "phone":
+            res = await self.client(
                 functions.contacts.ImportContactsRequest(
                     contacts=[
                         types.InputPhoneContact(
-                            client_id=0, phone=rid, first_name="", last_name=""
+                            client_id=0, phone=value, first_name="", last_name=""
                         )
                     ]
                 )
             )
-            return rid
+            if not res.users:
+                raise RuntimeError(f"No Telegram account for phone {value}")
+            return res.users[0]
 
-        # Explicit "id:<int>" format
-        if rid.startswith("id:"):
-            rid = rid[3:].strip()
+        # user_id: works only if known to the session
+        try:
+            return await self.client.get_entity(int(value))
+        except (ValueError, errors.rpcerrorlist.PeerIdInvalidError):
+            raise RuntimeError(
+                "Cannot resolve user by user_id. "
+                "Use @username or phone number (the phone will be imported)."
+            )
 
-        # Bare integer: try to resolve as user_id (works only if known to the session)
-        if rid.isdigit():
-            user_id = int(rid)
-            try:
-                return await self.client.get_entity(user_id)
-            except (ValueError, errors.rpcerrorlist.PeerIdInvalidError):
-                raise RuntimeError(
-                    "Cannot resolve user by user_id. "
-                    "Use @username or phone number (the phone will be imported)."
-                )
+    async def _remember_entity(
+        self, entity: Any, extra_keys: Iterable[str] = ()
+    ) -> None:
+        """Cache a user's access_hash under its id, username and phone."""
+        if not isinstance(entity, types.User) or entity.access_hash is None:
+            return
+        if getattr(entity, "min", False):
+            return  # "min" constructors carry an access_hash that cannot be used to send
+        keys = recipient_keys(
+            user_id=entity.id, username=entity.username, phone=entity.phone
+        )
+        await self.peers.remember(
+            [*keys, *extra_keys], ("user", entity.id, entity.access_hash)
+        )
 
-        # Anything else is not supported
-        raise ValueError("recipient_id must be @username, phone number, or id:<int>")
+    async def _warm_peer_cache(self) -> None:
+        """Fill the peer cache from recent dialogs (one request per 100 dialogs)."""
+        count = 0
+        try:
+            async for dialog in self.client.iter_dialogs(
+                limit=self._cfg.peer_warmup_dialogs
+            ):
+                if dialog.is_user:
+                    await self._remember_entity(dialog.entity)
+                    count += 1
+            logger.info("[telegram] peer cache warmed from %d dialogs", count)
+        except Exception as e:
+            logger.warning("[telegram] peer cache warm-up failed: %s", e)
 
     async def send_text(self, recipient_id: str, content: TextContent) -> None:
         """
-        Send a simple text message, resolving the recipient first.
-        Handles common Telegram flood/anti-spam errors.
+        Send a simple text message through the send scheduler.
+        Waits while the account is throttled (FloodWait up to TG_FLOOD_MAX_WAIT);
+        raises SendBacklogFull when too many sends are already pending, and re-raises
+        send failures so the outbound queue can retry.
         """
+        # Includes time spent waiting for the pacing/FloodWait schedule
+        with (
+            timed(SEND_LATENCY, "telegram"),
+            TRACER.span("send.telegram", kind=KIND_CLIENT),
+        ):
+            await self.scheduler.submit(recipient_id, content.text)
+
+    @staticmethod
+    def _flood_wait_seconds(e: BaseException) -> Optional[float]:
+        if isinstance(e, errors.rpcerrorlist.FloodWaitError):
+            return float(e.seconds)
+        return None
+
+    async def _send_now(self, recipient_id: str, text: str) -> None:
+        """Resolve the recipient and send once; logs Telegram flood/anti-spam errors."""
         if not self.client or not self.client.is_connected():
-            logger.warning("[telegram] client is not connected; skipping send")
-            return
+            logger.warning("[telegram] client is not connected; cannot send")
+            raise RuntimeError("Telegram client is not connected")
 
         try:
             entity = await self._resolve_entity(recipient_id)
-            await self.client.send_message(entity, content.text)
-            logger.info("[telegram] SENT: %s -> %s", recipient_id, content.text)
+            try:
+                await self.client.send_message(entity, text)
+            except STALE_PEER_ERRORS as e:
+                # Only cache hits are InputPeerUser; a fresh lookup failing is final
+                if not isinstance(entity, types.InputPeerUser):
+                    raise
+                logger.warning(
+                    "[telegram] cached peer of %s rejected (%s); re-resolving",
+                    recipient_id,
+                    type(e).__name__,
+                )
+                await self.peers.forget(entity.user_id)
+                entity = await self._resolve_entity(recipient_id)
+                await self.client.send_message(entity, text)
+            logger.info("[telegram] SENT: %s -> %s", recipient_id, text)
 
         except errors.rpcerrorlist.FloodWaitError as e:
-            # Telegram asks to wait N seconds before retry
-            logger.error("[telegram] FloodWait: wait %s seconds", e.seconds)
-            # Optionally: schedule a delayed retry here
+            # Telegram asks to wait N seconds; the scheduler defers the send
+            logger.warning("[telegram] FloodWait: wait %s seconds", e.seconds)
+            raise
 
         except errors.rpcerrorlist.PeerFloodError:
             # Too many first messages to unknown users in a short time window
             logger.error("[telegram] PeerFloodError: too many first messages")
+            raise
 
         except Exception as e:
-            logger.exception("[telegram] Failed to send text: %s", e)
+            logger.error("[telegram] Failed to send text: %s", e)
+            raise
@@ -2,27 +2,70 @@ import logging
 import secrets
 from typing import Any, Awaitable, Callable, Dict, Optional
 
-import httpx  # NEW
-from pyee.asyncio import AsyncIOEventEmitter
-
 from app.config import VKCommunityConfig
-from app.domain.message import TextContent, UnifiedMessage
-from app.domain.ports import MessengerAdapter, OnMessage
+from app.domain.message import TextContent
+from app.domain.ports import MessengerAdapter, OnMessage, StateStore
+from app.infra.event_bus import EventBus
+from app.infra.http_pool import HttpPool
+from app.infra.journal import inbound_message
+from app.infra.metrics import SEND_LATENCY, timed
+from app.infra.rate_limit import build_rate_limiter
+from app.infra.tracing import KIND_CLIENT, TRACER
+from app.infra.vk_execute import VkApiError, VkExecuteBatcher
 
 logger = logging.getLogger(__name__)
 
+VK_API_BASE_URL = "https://api.vk.com/method"
+
+
+def register_vk_upstream(http: HttpPool) -> None:
+    """Register the VK API upstream (shared by the adapter and profile enrichment)."""
+    http.register(
+        VkAdapter.upstream,
+        base_url=VK_API_BASE_URL,
+        headers={"User-Agent": "chatwoot-integration/1.0"},
+        warmup_url=VK_API_BASE_URL,
+    )
+
 
 class VkAdapter(MessengerAdapter):
     """VK adapter for Callback API (text only)."""
 
-    def __init__(self, bus: AsyncIOEventEmitter, config: VKCommunityConfig):
+    upstream = "vk"
+
+    def __init__(
+        self,
+        bus: EventBus,
+        config: VKCommunityConfig,
+        http: Optional[HttpPool] = None,
+        state: Optional[StateStore] = None,
+    ):
         self._bus = bus
         self._config = config
         self.inbox_id = config.inbox_id
         self._cb: Optional[OnMessage] = None
         self._incoming_listener: Optional[Callable[..., Awaitable[None]]] = None
         self._confirm_listener: Optional[Callable[..., Awaitable[None]]] = None
-        self._http: Optional[httpx.AsyncClient] = None  # NEW
+        # Shared keep-alive pool; also used by VK profile enrichment
+        self._http = http or HttpPool()
+        register_vk_upstream(self._http)
+        # Community tokens allow ~20 requests/second; shared with users.get enrichment
+        # (and with other replicas when the state store is shared)
+        self.limiter = build_rate_limiter(
+            config.api_rate,
+            config.api_rate,
+            state=state,
+            key=f"vk:{config.group_id}",
+        )
+        # Concurrent replies are packed into execute requests (up to 25 per request)
+        self._send_batcher: Optional[VkExecuteBatcher] = None
+        if config.send_batch_max > 1:
+            self._send_batcher = VkExecuteBatcher(
+                request=self._vk_request,
+                method="messages.send",
+                window=config.send_batch_window_ms / 1000.0,
+                max_calls=config.send_batch_max,
+            )
 
     def on_message(self, cb: OnMessage) -> None:
         self._cb = cb
@@ -31,40 +74,12 @@ class VkAdapter(MessengerAdapter):
         return self._config.confirmation
 
     async def start(self) -> None:
-        # Initialize HTTP client once
-        if self._http is None:
-            self._http = httpx.AsyncClient(
-                base_url="https://api.vk.com/method",
-                timeout=15,
-                headers={"User-Agent": "chatwoot-integration/1.0"},
-            )
-
         async def _on_vk_incoming(payload: Dict[str, Any]) -> None:
-            if payload.get("event") != "message_new" or not self._cb:
-                return
-
-            msg = payload.get("message") or {}
-            text = (msg.get("text") or "").strip()
-            peer_id = str(msg.get("peer_id")) if msg.get("peer_id") is not None else ""
-            from_id = (
-                str(msg.get("from_id")) if msg.get("from_id") is not None else peer_id
-            )
-            message_id = str(msg.get("id")) if msg.get("id") is not None else None
-
-            if not self._cb or not peer_id:
-                logger.debug("[vk] skip incoming: no callback or missing peer_id")
+            if not self._cb:
+                logger.debug("[vk] skip incoming: no callback")
                 return
-
-            content = TextContent(type="text", text=text)
-            umsg = UnifiedMessage(
-                channel="vk",
-                sender_id=from_id,
-                recipient_id=peer_id,
-                message_id=message_id,
-                content=content,
-                raw=payload,
-            )
-            await self._cb(umsg)
+            # Normalized once by the callback route
+            await self._cb(inbound_message(payload))
 
         async def _on_vk_confirmation(payload: Dict[str, Any]) -> None:
             group_id = payload.get("group_id")
@@ -80,33 +95,23 @@ class VkAdapter(MessengerAdapter):
     async def stop(self) -> None:
         if self._incoming_listener:
             try:
-                self._bus.remove_listener("vk.incoming", self._incoming_listener)  # type: ignore[attr-defined]
+                self._bus.remove_listener("vk.incoming", self._incoming_listener)
             except Exception:
                 pass
             self._incoming_listener = None
 
         if self._confirm_listener:
             try:
-                self._bus.remove_listener("vk.confirmation", self._confirm_listener)  # type: ignore[attr-defined]
+                self._bus.remove_listener("vk.confirmation", self._confirm_listener)
             except Exception:
                 pass
             self._confirm_listener = None
 
-        # Close HTTP client
-        if self._http:
-            try:
-                await self._http.aclose()
-            except Exception:
-                pass
-            self._http = None
-
+        # HTTP client belongs to the shared pool; it is closed by the app lifespan
         logger.info("[vk] adapter stopped")
 
-    async def _vk_call(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """VK API call with basic error handling."""
-        if not self._http:
-            raise RuntimeError("VK HTTP client is not initialized")
-
+    async def _vk_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Rate-limited VK API request; returns the full response body."""
         # Required parameters
         params = {
             **params,
@@ -114,21 +119,32 @@ class VkAdapter(MessengerAdapter):
             "v": self._config.api_version,
         }
 
-        resp = await self._http.post(f"/{method}", data=params)
+        await self.limiter.acquire()
+        resp = await self._http.client(self.upstream).post(f"/{method}", data=params)
         resp.raise_for_status()
-        data = resp.json()
+        return resp.json()
+
+    async def _vk_call(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """VK API call with basic error handling."""
+        data = await self._vk_request(method, params)
 
         if "error" in data:
             err = data["error"]
             code = err.get("error_code")
             msg = err.get("error_msg")
             logger.error("[vk] API error %s: %s; params=%s", code, msg, params)
-            raise RuntimeError(f"VK API error {code}: {msg}")
+            raise VkApiError(code, msg)
 
         return data.get("response", data)
 
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limiter": self.limiter.stats(),
+            "send_batches": self._send_batcher.stats() if self._send_batcher else None,
+        }
+
     async def send_text(self, recipient_id: str, content: TextContent) -> None:
-        """Send a text message via VK messages.send."""
+        """Send a text message via VK messages.send (failures are re-raised)."""
         # recipient_id must be peer_id: user_id, chat peer (2e9+chat_id) or group peer
         text = content.text or ""
         if not text:
@@ -145,8 +161,13 @@ class VkAdapter(MessengerAdapter):
                 "group_id": self._config.group_id,
                 # Optionally, disable_mentions=1 can be added if needed
             }
-            res = await self._vk_call("messages.send", params)
+            with timed(SEND_LATENCY, "vk"), TRACER.span("send.vk", kind=KIND_CLIENT):
+                if self._send_batcher:
+                    res = await self._send_batcher.call(params)
+                else:
+                    res = await self._vk_call("messages.send", params)
             # Success: VK returns message ID or an array
             logger.info("[vk] SENT: peer_id=%s message_id=%s", recipient_id, res)
         except Exception as e:
-            logger.exception("[vk] Failed to send text to %s: %s", recipient_id, e)
+            logger.error("[vk] Failed to send text to %s: %s", recipient_id, e)
+            raise
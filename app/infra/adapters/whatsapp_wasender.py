@@ -1,81 +1,71 @@
 import logging
-from typing import Optional
-
-from pyee.asyncio import AsyncIOEventEmitter
+from typing import Any, Dict, Optional
 
 from app.config import WasenderWebhookConfig
-from app.domain.message import TextContent, UnifiedMessage
-from app.domain.ports import MessengerAdapter, OnMessage
-from app.domain.webhooks.wasender import WasenderWebhookPayload
+from app.domain.message import MediaContent, TextContent, UnifiedMessage, thaw
+from app.domain.ports import MessengerAdapter, OnMessage, StateStore
+from app.infra.event_bus import EventBus
+from app.infra.http_pool import HttpPool
+from app.infra.journal import inbound_message
+from app.infra.media import MediaFetcher, MediaFile
+from app.infra.metrics import SEND_LATENCY, timed
+from app.infra.tracing import KIND_CLIENT, TRACER
 from app.infra.wasender_client import WasenderClient
 
 logger = logging.getLogger(__name__)
 
 
 class WasenderAdapter(MessengerAdapter):
-    """WhatsApp adapter (text only) via Wasender."""
-
-    def __init__(self, bus: AsyncIOEventEmitter, config: WasenderWebhookConfig):
+    """WhatsApp adapter via Wasender (text out; text and media in)."""
+
+    def __init__(
+        self,
+        bus: EventBus,
+        config: WasenderWebhookConfig,
+        http: Optional[HttpPool] = None,
+        state: Optional[StateStore] = None,
+    ):
         self._bus = bus
         self._config = config
         self.inbox_id = config.inbox_id  # expose per-channel inbox
         self._cb: Optional[OnMessage] = None
-        self._client = WasenderClient(api_key=self._config.api_key)
+        self._client = WasenderClient(
+            api_key=self._config.api_key,
+            http=http,
+            send_rate=config.send_rate,
+            send_burst=config.send_burst,
+            timeout=config.timeout,
+            max_retries=config.max_retries,
+            retry_base_delay=config.retry_base_delay,
+            retry_max_delay=config.retry_max_delay,
+            breaker_threshold=config.breaker_threshold,
+            breaker_reset=config.breaker_reset,
+            state=state,
+        )
 
     def on_message(self, cb: OnMessage) -> None:
         self._cb = cb
 
     async def start(self) -> None:
-        @self.bus.on("wasender.incoming")
+        @self._bus.on("wasender.incoming")
         async def _incoming(payload: dict):
             if not self._cb:
                 logger.warning("[wasender] No on_message callback set; dropping event")
                 return
 
-            try:
-                parsed = WasenderWebhookPayload.model_validate(payload)
-            except Exception as e:
-                logger.warning("[wasender] Invalid webhook payload: %s", e)
-                return
-
-            if parsed.event != "messages.upsert":
-                logger.info("[wasender] Ignored event: %s", parsed.event)
-                return
-
-            info = parsed.get_basic_info()
-            if not info:
-                logger.warning("[wasender] Missing basic message info; skipping")
-                return
-
-            if info.get("fromMe") is True:
+            # Normalized once by the webhook route (echoes go to wasender.outgoing)
+            msg = inbound_message(payload)
+            if isinstance(msg.content, TextContent) and not msg.content.text:
                 logger.info(
-                    "[wasender] Skipping echo/outgoing message id=%s", info.get("id")
+                    "[wasender] Skipping unsupported message from %s", msg.sender_id
                 )
                 return
-
-            text = info.get("text") or ""
-            if not text:
-                logger.info(
-                    "[wasender] Skipping non-text message from %s",
-                    info.get("remoteJid"),
-                )
-                return
-
-            recipient_id = (info.get("remoteJid") or "").split("@")[0]
-            msg = UnifiedMessage(
-                channel="whatsapp",
-                recipient_id=recipient_id,
-                sender_id=recipient_id,
-                sender_name=info.get("pushName"),
-                content=TextContent(type="text", text=text),
-                raw=payload,
-            )
             try:
                 await self._cb(msg)
             except Exception as e:
                 logger.exception("[wasender] on_message callback failed: %s", e)
 
-        @self.bus.on("wasender.outgoing")
+        @self._bus.on("wasender.outgoing")
         async def _outgoing(payload: dict):
             logger.debug("[wasender] Outgoing event received (noop)")
 
@@ -84,11 +74,32 @@ class WasenderAdapter(MessengerAdapter):
     async def stop(self) -> None:
         logger.info("[wasender] adapter stopped")
 
+    def stats(self) -> Dict[str, Any]:
+        return self._client.stats()
+
+    def register_media(self, media: MediaFetcher) -> None:
+        """Serve wasender:// attachments: decrypt-media, then stream its public URL."""
+
+        async def _source(
+            message: UnifiedMessage, content: MediaContent, file: MediaFile
+        ) -> None:
+            if not message.raw:
+                raise ValueError("wasender media message without its raw payload")
+            url = await self._client.decrypt_media(thaw(message.raw))
+            await media.download(url, file)
+
+        media.register_source("wasender", _source)
+
     async def send_text(self, recipient_id: str, content: TextContent) -> None:
-        """Send text via Wasender."""
+        """Send text via Wasender. Failures are logged and re-raised for retries."""
         text = content.text
         try:
-            await self._client.send_text(to=recipient_id, text=text)
+            with (
+                timed(SEND_LATENCY, "whatsapp"),
+                TRACER.span("send.whatsapp", kind=KIND_CLIENT),
+            ):
+                await self._client.send_text(to=recipient_id, text=text)
             logger.info("[wasender] SENT: %s -> %s", recipient_id, text)
         except Exception as e:
-            logger.exception("[wasender] Failed to send text: %s", e)
+            logger.error("[wasender] Failed to send text: %s", e)
+            raise
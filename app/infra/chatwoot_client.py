@@ -1,15 +1,29 @@
-from typing import Any, Dict, List, Optional
+import os
+from typing import Any, BinaryIO, Dict, List, Optional
 
 import httpx
 
+from app.infra.http_pool import HttpPool
+from app.infra.metrics import CHATWOOT_LATENCY, ERRORS, timed
+from app.infra.tracing import KIND_CLIENT, TRACER
+
 
 class ChatwootClient:
     """
     Lightweight HTTP client for Chatwoot API v1.
     Only methods needed by our service are implemented.
+    Requests go through the shared keep-alive pool registered as "chatwoot".
     """
 
-    def __init__(self, api_access_token: str, account_id: int, base_url: str):
+    upstream = "chatwoot"
+
+    def __init__(
+        self,
+        api_access_token: str,
+        account_id: int,
+        base_url: str,
+        http: Optional[HttpPool] = None,
+    ):
         # Normalize base_url and store common parts
         self._base_url = base_url.rstrip("/")
         self._account_id = account_id
@@ -24,15 +38,44 @@ class ChatwootClient:
             "Authorization": f"Bearer {api_access_token}",
         }
 
+        self._http = http or HttpPool()
+        self._http.register(
+            self.upstream,
+            headers=self._headers,
+            warmup_url=f"{self._base_url}/",
+        )
+
+    async def _request(
+        self, operation: str, method: str, url: str, **kwargs: Any
+    ) -> Dict[str, Any]:
+        """
+        Perform a request on the pooled client and return decoded JSON.
+        `operation` (the client method name) labels the latency histogram and span.
+        """
+        with (
+            timed(CHATWOOT_LATENCY, operation),
+            TRACER.span(
+                f"chatwoot.{operation}",
+                kind=KIND_CLIENT,
+                **{"http.request.method": method},
+            ),
+        ):
+            try:
+                r = await self._http.client(self.upstream).request(
+                    method, url, **kwargs
+                )
+                r.raise_for_status()
+                return r.json()
+            except Exception as e:
+                ERRORS.inc("chatwoot", type(e).__name__)
+                raise
+
     # Contacts
     async def search_contacts(self, q: str) -> Dict[str, Any]:
         """Search contacts by name/identifier/email/phone."""
         url = f"{self._account_base}/contacts/search"
         params = {"q": q}
-        async with httpx.AsyncClient(headers=self._headers, timeout=15.0) as client:
-            r = await client.get(url, params=params)
-            r.raise_for_status()
-            return r.json()
+        return await self._request("search_contacts", "GET", url, params=params)
 
     async def filter_contacts(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -51,10 +94,7 @@ class ChatwootClient:
             )
         payload = {"payload": filters}
 
-        async with httpx.AsyncClient(headers=self._headers, timeout=15.0) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+        return await self._request("filter_contacts", "POST", url, json=payload)
 
     async def create_contact(
         self,
@@ -86,10 +126,7 @@ class ChatwootClient:
         if additional_attributes:
             payload["additional_attributes"] = additional_attributes
 
-        async with httpx.AsyncClient(headers=self._headers, timeout=15.0) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+        return await self._request("create_contact", "POST", url, json=payload)
 
     async def update_contact(
         self,
@@ -120,19 +157,13 @@ class ChatwootClient:
         if additional_attributes is not None:
             payload["additional_attributes"] = additional_attributes
 
-        async with httpx.AsyncClient(headers=self._headers, timeout=15.0) as client:
-            r = await client.patch(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+        return await self._request("update_contact", "PATCH", url, json=payload)
 
     # Conversations
     async def list_conversations(self, contact_id: int) -> Dict[str, Any]:
         """List conversations for a contact."""
         url = f"{self._account_base}/contacts/{contact_id}/conversations"
-        async with httpx.AsyncClient(headers=self._headers, timeout=15.0) as client:
-            r = await client.get(url)
-            r.raise_for_status()
-            return r.json()
+        return await self._request("list_conversations", "GET", url)
 
     async def create_conversation(
         self,
@@ -150,10 +181,7 @@ class ChatwootClient:
         if extra_fields:
             payload.update(extra_fields)
 
-        async with httpx.AsyncClient(headers=self._headers, timeout=15.0) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+        return await self._request("create_conversation", "POST", url, json=payload)
 
     # Messages
     async def send_message(
@@ -168,7 +196,32 @@ class ChatwootClient:
         if extra_fields:
             payload.update(extra_fields)
 
-        async with httpx.AsyncClient(headers=self._headers, timeout=15.0) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
+        return await self._request("send_message", "POST", url, json=payload)
+
+    async def send_attachment(
+        self,
+        conversation_id: int,
+        content: str,
+        file: BinaryIO,
+        filename: str,
+        mime_type: Optional[str] = None,
+        **extra_fields: Any,
+    ) -> Dict[str, Any]:
+        """
+        Send a message with one attachment as multipart/form-data.
+        The file is streamed from its current position in chunks, not read whole.
+        """
+        url = f"{self._account_base}/conversations/{conversation_id}/messages"
+        data: Dict[str, Any] = {"content": content}
+        if extra_fields:
+            data.update(extra_fields)
+        files = {
+            "attachments[]": (filename, file, mime_type or "application/octet-stream")
+        }
+        # Overrides the pooled client's JSON default; httpx fills in this boundary
+        headers = {
+            "Content-Type": f"multipart/form-data; boundary={os.urandom(16).hex()}"
+        }
+        return await self._request(
+            "send_attachment", "POST", url, data=data, files=files, headers=headers
+        )
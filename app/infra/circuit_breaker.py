@@ -0,0 +1,87 @@
+import time
+from typing import Any, Callable, Dict
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream that is considered down."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream.
+    - closed: calls pass; `failure_threshold` failures in a row open the circuit.
+    - open: calls fail fast with CircuitOpenError for `reset_timeout` seconds.
+    - half-open: one probe call passes; success closes the circuit, failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._name = name
+        self._failure_threshold = max(1, failure_threshold)
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = "closed"
+        self._probe_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if (
+            self._state == "open"
+            and self._clock() - self._opened_at >= self._reset_timeout
+        ):
+            self._state = "half_open"
+        return self._state
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go to the upstream now."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        self.rejected += 1
+        retry_after = max(0.0, self._opened_at + self._reset_timeout - self._clock())
+        raise CircuitOpenError(self._name, retry_after)
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probe_in_flight = False
+        self._state = "closed"
+
+    def abandon(self) -> None:
+        """The call was cancelled before an outcome: let another probe through."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        probe_failed = self._probe_in_flight
+        self._probe_in_flight = False
+        if probe_failed or (
+            self._state == "closed" and self._failures >= self._failure_threshold
+        ):
+            self._state = "open"
+            self._opened_at = self._clock()
+            self.opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.domain.ports import StateStore
+from app.infra.cache import TTLCache
+from app.infra.metrics import DROPPED_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+class DedupeStore:
+    """
+    Remembers webhook/event ids so redeliveries are processed only once.
+    - Memory tier: bounded LRU of ids seen within `ttl` seconds.
+    - Optional SQLite tier (`path`): survives restarts; ids older than `ttl` expire.
+    - Optional shared tier (`state`): ids seen by any replica; replaces the SQLite tier.
+    claim() marks an id as seen and tells whether it is new; release() forgets it
+    again when processing failed before the event was accepted (so a retry is let in).
+    Ids are namespaced by scope ("wasender", "vk", "chatwoot", "telegram").
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS seen (
+            key TEXT PRIMARY KEY,
+            seen_at REAL NOT NULL
+        );
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int = 100_000,
+        ttl: float = 86400.0,
+        path: Optional[str] = None,
+        state: Optional[StateStore] = None,
+    ):
+        self._ttl = ttl
+        self._seen: TTLCache[bool] = TTLCache(max_size=max_size, ttl=ttl)
+        self._state = state
+        self._path = path if state is None else None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.claimed = 0
+        self.duplicates: Dict[str, int] = {}
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        if not self._path or self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dedupe")
+        purged = await self._run(self._open_sync)
+        logger.info("[dedupe] sqlite tier opened: %s (expired=%d)", self._path, purged)
+
+    def _open_sync(self) -> int:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self._SCHEMA)
+        self._conn = conn
+        return conn.execute(
+            "DELETE FROM seen WHERE seen_at < ?", (time.time() - self._ttl,)
+        ).rowcount
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        await self._run(self._close_sync)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def claim(self, scope: str, event_id: Any) -> bool:
+        """Mark scope:event_id as seen; returns False if it was already seen."""
+        key = f"{scope}:{event_id}"
+        if self._seen.get(key):
+            return self._duplicate(scope, key)
+        self._seen.set(key, True)
+        if self._state is not None:
+            try:
+                fresh = await self._state.add(f"dedupe:{key}", 1, ttl=self._ttl)
+            except Exception as e:
+                # The memory tier still protects this process
+                logger.warning("[dedupe] shared claim failed: %s", e)
+                fresh = True
+            if not fresh:
+                return self._duplicate(scope, key)
+        elif self._executor is not None:
+            try:
+                fresh = await self._run(self._claim_sync, key, time.time())
+            except Exception as e:
+                # The memory tier still protects this process
+                logger.warning("[dedupe] sqlite claim failed: %s", e)
+                fresh = True
+            if not fresh:
+                return self._duplicate(scope, key)
+        self.claimed += 1
+        return True
+
+    def _claim_sync(self, key: str, now: float) -> bool:
+        # Inserts a new id or refreshes an expired one; rowcount 0 = seen recently
+        cur = self._conn.execute(
+            "INSERT INTO seen (key, seen_at) VALUES (?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET seen_at = excluded.seen_at"
+            " WHERE seen.seen_at < ?",
+            (key, now, now - self._ttl),
+        )
+        return cur.rowcount > 0
+
+    async def release(self, scope: str, event_id: Any) -> None:
+        """Forget an id (its processing failed and the sender should retry it)."""
+        key = f"{scope}:{event_id}"
+        self._seen.invalidate(key)
+        if self._state is not None:
+            try:
+                await self._state.delete(f"dedupe:{key}")
+            except Exception as e:
+                logger.warning("[dedupe] shared release failed: %s", e)
+        elif self._executor is not None:
+            try:
+                await self._run(self._release_sync, key)
+            except Exception as e:
+                logger.warning("[dedupe] sqlite release failed: %s", e)
+
+    def _release_sync(self, key: str) -> None:
+        self._conn.execute("DELETE FROM seen WHERE key = ?", (key,))
+
+    def _duplicate(self, scope: str, key: str) -> bool:
+        self.duplicates[scope] = self.duplicates.get(scope, 0) + 1
+        DROPPED_EVENTS.inc(scope, "duplicate")
+        logger.info("[dedupe] duplicate suppressed: %s", key)
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "claimed": self.claimed,
+            "duplicates": dict(self.duplicates),
+            "duplicates_total": sum(self.duplicates.values()),
+            "memory": self._seen.stats(),
+            "persistent": self._executor is not None,
+            "shared": self._state is not None,
+        }
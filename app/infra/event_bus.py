@@ -0,0 +1,389 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pydantic_core import to_json
+
+from app.infra.metrics import BUS_QUEUE_DEPTH, ERRORS
+
+logger = logging.getLogger(__name__)
+
+Payload = Dict[str, Any]
+Listener = Callable[[Payload], Union[Awaitable[None], None]]
+Event = Tuple[Payload, contextvars.Context]
+
+OVERFLOW_POLICIES = ("block", "reject", "spill")
+
+
+class BusFull(RuntimeError):
+    """Raised by publish()/emit() when a topic with the "reject" policy is full."""
+
+    def __init__(self, topic: str):
+        super().__init__(f"Event bus topic {topic!r} is full")
+        self.topic = topic
+
+
+class TopicSettings:
+    def __init__(self, *, queue_size: int, workers: int, overflow: str):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.queue_size = max(1, queue_size)
+        self.workers = max(1, workers)
+        self.overflow = overflow
+
+
+class _SpillFile:
+    """FIFO of events that did not fit in a topic queue, kept in SQLite."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS spill (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            payload TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="bus-spill"
+        )
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self._path, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(self._SCHEMA)
+            # Spilled events do not outlive the process; the journal covers restarts
+            conn.execute("DELETE FROM spill")
+            self._conn = conn
+        return self._conn
+
+    async def push(self, topic: str, payload: Payload) -> None:
+        await self._run(self._push_sync, topic, to_json(payload, fallback=str).decode())
+
+    def _push_sync(self, topic: str, data: str) -> None:
+        self._connect().execute(
+            "INSERT INTO spill (topic, payload) VALUES (?, ?)", (topic, data)
+        )
+
+    async def pop_batch(self, topic: str, limit: int) -> List[Payload]:
+        rows = await self._run(self._pop_sync, topic, limit)
+        return [json.loads(data) for data in rows]
+
+    def _pop_sync(self, topic: str, limit: int) -> List[str]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT id, payload FROM spill WHERE topic = ? ORDER BY id LIMIT ?",
+            (topic, limit),
+        ).fetchall()
+        if rows:
+            conn.execute(
+                "DELETE FROM spill WHERE topic = ? AND id <= ?", (topic, rows[-1][0])
+            )
+        return [data for _, data in rows]
+
+    async def close(self) -> None:
+        await self._run(self._close_sync)
+        self._executor.shutdown(wait=True)
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _Topic:
+    def __init__(self, name: str, settings: TopicSettings):
+        self.name = name
+        self.settings = settings
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(settings.queue_size)
+        self.listeners: List[Listener] = []
+        self.workers: List[asyncio.Task] = []
+        self.busy = 0
+        # Spill (memory variant) and the number of spilled events not yet queued
+        self.overflow: Deque[Payload] = deque()
+        self.spilled_pending = 0
+        self.pump: Optional[asyncio.Task] = None
+        self.published = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.spilled = 0
+        self.blocked = 0
+
+
+class EventBus:
+    """
+    In-process publish/subscribe bus with bounded per-topic queues.
+    - Each topic has a queue of `queue_size` events and `workers` tasks; a worker
+      runs the topic's listeners one after another for each event, so at most
+      `workers` events per topic are handled at once.
+    - When a queue is full the topic's overflow policy applies: "block" makes
+      publish() wait for room, "reject" raises BusFull, "spill" moves the excess
+      to a SQLite file (or memory without `spill_path`) that is fed back in order.
+    - Listeners run in the context of the publisher (contextvars, e.g. tracing).
+    Drop-in for the pyee emitter usage: on() (also as decorator), emit(),
+    remove_listener(). Prefer `await publish()`, which honors backpressure;
+    emit() cannot wait, so on a full "block" topic it defers the event to a task.
+    """
+
+    def __init__(
+        self,
+        *,
+        default: Optional[TopicSettings] = None,
+        topics: Optional[Mapping[str, TopicSettings]] = None,
+        spill_path: Optional[str] = None,
+        drain_timeout: float = 5.0,
+    ):
+        self._default = default or TopicSettings(
+            queue_size=1000, workers=32, overflow="block"
+        )
+        self._settings = dict(topics or {})
+        self._spill_path = spill_path
+        self._spill_file: Optional[_SpillFile] = None
+        self._drain_timeout = drain_timeout
+        self._topics: Dict[str, _Topic] = {}
+        self._deferred: Set[asyncio.Task] = set()
+        self._running = False
+
+    # Subscriptions
+
+    def on(self, topic: str, listener: Optional[Listener] = None) -> Any:
+        """Subscribe a listener; without one, returns a decorator."""
+        if listener is None:
+
+            def decorator(fn: Listener) -> Listener:
+                self._topic(topic).listeners.append(fn)
+                return fn
+
+            return decorator
+        self._topic(topic).listeners.append(listener)
+        return listener
+
+    def remove_listener(self, topic: str, listener: Listener) -> None:
+        t = self._topics.get(topic)
+        if t is not None and listener in t.listeners:
+            t.listeners.remove(listener)
+
+    def listeners(self, topic: str) -> List[Listener]:
+        t = self._topics.get(topic)
+        return list(t.listeners) if t is not None else []
+
+    # Publishing
+
+    async def publish(self, topic: str, payload: Payload) -> None:
+        """Queue an event, applying the topic's overflow policy when it is full."""
+        t = self._topic(topic)
+        t.published += 1
+        if not t.listeners:
+            return
+        self._ensure_workers(t)
+        event: Event = (payload, contextvars.copy_context())
+        if not t.spilled_pending:
+            try:
+                t.queue.put_nowait(event)
+                return
+            except asyncio.QueueFull:
+                pass
+        policy = t.settings.overflow
+        if policy == "reject":
+            t.rejected += 1
+            raise BusFull(topic)
+        if policy == "spill":
+            await self._spill(t, payload)
+            return
+        t.blocked += 1
+        try:
+            await t.queue.put(event)
+        finally:
+            t.blocked -= 1
+
+    def emit(self, topic: str, payload: Payload) -> bool:
+        """Non-blocking publish; returns True if the topic has listeners."""
+        t = self._topic(topic)
+        if not t.listeners:
+            t.published += 1
+            return False
+        self._ensure_workers(t)
+        if not t.spilled_pending:
+            try:
+                t.queue.put_nowait((payload, contextvars.copy_context()))
+                t.published += 1
+                return True
+            except asyncio.QueueFull:
+                if t.settings.overflow == "reject":
+                    t.published += 1
+                    t.rejected += 1
+                    raise BusFull(topic)
+        # "block" and "spill" need to wait: finish the publish in a task
+        task = asyncio.get_running_loop().create_task(self.publish(topic, payload))
+        self._deferred.add(task)
+        task.add_done_callback(self._deferred.discard)
+        return True
+
+    async def _spill(self, t: _Topic, payload: Payload) -> None:
+        t.spilled += 1
+        t.spilled_pending += 1
+        if self._spill_path:
+            if self._spill_file is None:
+                self._spill_file = _SpillFile(self._spill_path)
+            await self._spill_file.push(t.name, payload)
+        else:
+            t.overflow.append(payload)
+        if t.pump is None or t.pump.done():
+            t.pump = asyncio.get_running_loop().create_task(self._pump(t))
+
+    async def _pump(self, t: _Topic) -> None:
+        """Move spilled events back into the queue, oldest first, as room frees up."""
+        while t.spilled_pending:
+            if self._spill_file is not None:
+                batch = await self._spill_file.pop_batch(t.name, t.settings.queue_size)
+            else:
+                batch = [t.overflow.popleft() for _ in range(len(t.overflow))]
+            if not batch:
+                # Rows still being written by publishers
+                await asyncio.sleep(0.01)
+                continue
+            for payload in batch:
+                # Spilled events lost their publisher's context
+                await t.queue.put((payload, contextvars.Context()))
+                t.spilled_pending -= 1
+
+    # Workers
+
+    def _topic(self, name: str) -> _Topic:
+        t = self._topics.get(name)
+        if t is None:
+            t = self._topics[name] = _Topic(
+                name, self._settings.get(name, self._default)
+            )
+            BUS_QUEUE_DEPTH.set_function(t.queue.qsize, name)
+        return t
+
+    def _ensure_workers(self, t: _Topic) -> None:
+        if t.workers or not self._running:
+            return
+        loop = asyncio.get_running_loop()
+        t.workers = [
+            loop.create_task(self._worker(t)) for _ in range(t.settings.workers)
+        ]
+
+    async def _worker(self, t: _Topic) -> None:
+        while True:
+            payload, ctx = await t.queue.get()
+            t.busy += 1
+            try:
+                # A task per event carries the publisher's contextvars
+                await asyncio.create_task(self._dispatch(t, payload), context=ctx)
+            finally:
+                t.busy -= 1
+                t.processed += 1
+                t.queue.task_done()
+
+    async def _dispatch(self, t: _Topic, payload: Payload) -> None:
+        for listener in list(t.listeners):
+            try:
+                result = listener(payload)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                t.failed += 1
+                ERRORS.inc("bus", type(e).__name__)
+                logger.exception("[bus] listener for %s failed: %s", t.name, e)
+
+    async def start(self) -> None:
+        """Start workers for every topic (events published earlier are kept)."""
+        self._running = True
+        for t in self._topics.values():
+            if t.listeners:
+                self._ensure_workers(t)
+
+    async def stop(self) -> None:
+        """Let queued events finish for up to `drain_timeout` seconds, then cancel."""
+        pending = [
+            asyncio.create_task(t.queue.join())
+            for t in self._topics.values()
+            if t.workers
+        ]
+        if pending:
+            _, not_done = await asyncio.wait(pending, timeout=self._drain_timeout)
+            for task in not_done:
+                task.cancel()
+            if not_done:
+                logger.warning(
+                    "[bus] stopped with unprocessed events: %s", self.depths()
+                )
+        tasks = [w for t in self._topics.values() for w in t.workers]
+        tasks += [t.pump for t in self._topics.values() if t.pump is not None]
+        tasks += list(self._deferred)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for t in self._topics.values():
+            t.workers = []
+            t.pump = None
+        self._running = False
+        if self._spill_file is not None:
+            await self._spill_file.close()
+            self._spill_file = None
+
+    # Introspection
+
+    def depths(self) -> Dict[str, int]:
+        return {
+            name: t.queue.qsize() + t.spilled_pending
+            for name, t in self._topics.items()
+            if t.queue.qsize() or t.spilled_pending
+        }
+
+    def in_flight(self) -> int:
+        return sum(t.busy for t in self._topics.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "depth": t.queue.qsize(),
+                "capacity": t.settings.queue_size,
+                "spilled_pending": t.spilled_pending,
+                "workers": t.settings.workers,
+                "busy": t.busy,
+                "overflow": t.settings.overflow,
+                "published": t.published,
+                "processed": t.processed,
+                "failed": t.failed,
+                "rejected": t.rejected,
+                "spilled": t.spilled,
+                "blocked_publishers": t.blocked,
+            }
+            for name, t in self._topics.items()
+        }
@@ -0,0 +1,151 @@
+import importlib.util
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config import HttpPoolConfig
+
+logger = logging.getLogger(__name__)
+
+
+class _Upstream:
+    """Registration data and counters for one upstream."""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        headers: Dict[str, str],
+        warmup_url: Optional[str],
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.headers = headers
+        self.warmup_url = warmup_url
+        self.client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.errors = 0
+
+
+class HttpPool:
+    """
+    Registry of shared keep-alive httpx clients, one per upstream.
+    - Upstream clients (Chatwoot, Wasender, VK) register themselves at construction.
+    - start() opens the clients and warms one connection per upstream.
+    - aclose() closes every socket on shutdown.
+    - client() is lazy, so code running outside the app lifespan still works.
+    """
+
+    def __init__(self, config: Optional[HttpPoolConfig] = None):
+        self._config = config or HttpPoolConfig()
+        self._upstreams: Dict[str, _Upstream] = {}
+        self._transports: Dict[str, httpx.AsyncBaseTransport] = {}
+        self._http2 = self._config.http2
+        if self._http2 and importlib.util.find_spec("h2") is None:
+            logger.warning(
+                "[http] HTTP/2 requested but 'h2' is not installed; using HTTP/1.1"
+            )
+            self._http2 = False
+
+    def register(
+        self,
+        name: str,
+        *,
+        base_url: str = "",
+        headers: Optional[Dict[str, str]] = None,
+        warmup_url: Optional[str] = None,
+    ) -> None:
+        """Declare an upstream; the first registration wins."""
+        if name in self._upstreams:
+            return
+        self._upstreams[name] = _Upstream(
+            name=name,
+            base_url=base_url,
+            headers=dict(headers or {}),
+            warmup_url=warmup_url,
+        )
+
+    def mount(self, name: str, transport: httpx.AsyncBaseTransport) -> None:
+        """Route an upstream through a custom transport (e.g. local stand-in servers)."""
+        self._transports[name] = transport
+
+    def client(self, name: str) -> httpx.AsyncClient:
+        """Return the shared client for an upstream, creating it on first use."""
+        up = self._upstreams.get(name)
+        if up is None:
+            raise KeyError(f"HTTP upstream is not registered: {name}")
+        if up.client is None or up.client.is_closed:
+            up.client = self._build_client(up)
+        return up.client
+
+    def _build_client(self, up: _Upstream) -> httpx.AsyncClient:
+        cfg = self._config
+        limits = httpx.Limits(
+            max_connections=cfg.max_connections,
+            max_keepalive_connections=cfg.max_keepalive_connections,
+            keepalive_expiry=cfg.keepalive_expiry,
+        )
+
+        async def _on_response(response: httpx.Response) -> None:
+            up.requests += 1
+            if response.status_code >= 500:
+                up.errors += 1
+
+        return httpx.AsyncClient(
+            base_url=up.base_url,
+            headers=up.headers,
+            timeout=cfg.timeout,
+            limits=limits,
+            http2=self._http2,
+            transport=self._transports.get(up.name),
+            event_hooks={"response": [_on_response]},
+        )
+
+    async def start(self) -> None:
+        """Open a client per upstream and pre-establish one connection each."""
+        for up in self._upstreams.values():
+            client = self.client(up.name)
+            if not self._config.warmup or not up.warmup_url:
+                continue
+            try:
+                # Any response (even 401/404) leaves a warm TCP+TLS connection behind
+                await client.head(up.warmup_url)
+                logger.info("[http] warmed up upstream=%s", up.name)
+            except Exception as e:
+                logger.warning("[http] warm-up failed upstream=%s: %s", up.name, e)
+
+    async def aclose(self) -> None:
+        """Close all pooled connections."""
+        for up in self._upstreams.values():
+            if up.client is not None:
+                try:
+                    await up.client.aclose()
+                except Exception:
+                    pass
+                up.client = None
+        logger.info("[http] pools closed")
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-upstream pool statistics (connections by state, request counters)."""
+        out: Dict[str, Any] = {}
+        for up in self._upstreams.values():
+            item: Dict[str, Any] = {
+                "open": up.client is not None and not up.client.is_closed,
+                "requests": up.requests,
+                "server_errors": up.errors,
+            }
+            pool = getattr(getattr(up.client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", None) or [])
+            if pool is not None:
+                idle = sum(1 for c in connections if c.is_idle())
+                item.update(
+                    {
+                        "connections": len(connections),
+                        "idle": idle,
+                        "active": len(connections) - idle,
+                        "in_flight": len(getattr(pool, "_requests", None) or []),
+                    }
+                )
+            out[up.name] = item
+        return out
@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from pydantic_core import to_json
+
+from app.infra.event_bus import BusFull
+from app.infra.tracing import KIND_SERVER, TRACER, current_traceparent
+
+logger = logging.getLogger(__name__)
+
+# Frames are single JSON lines; webhook bodies stay far below this
+MAX_FRAME = 16 * 1024 * 1024
+
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def _frame(data: Dict[str, Any]) -> bytes:
+    # Payloads may carry pydantic models (e.g. the inbound UnifiedMessage)
+    return to_json(data, fallback=str) + b"\n"
+
+
+class IpcServer:
+    """
+    Connector side of the ingress -> connector channel (Unix socket, JSON lines).
+    - Every request {"id", "topic", "payload", "traceparent"} is passed to
+      `handler(topic, payload)` in its own task, in arrival order; the reply
+      {"id", "ok"} is sent once the handler returns (the event is journaled or
+      queued), so ingress workers acknowledge webhooks only after that.
+    - BusFull is answered as "full" (the ingress returns 503), other errors as "error".
+    """
+
+    def __init__(self, path: str, handler: EventHandler):
+        self._path = path
+        self._handler = handler
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self.received = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def start(self) -> None:
+        if self._server is not None:
+            return
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self._path):
+            # Left behind by a previous connector that did not shut down cleanly
+            os.unlink(self._path)
+        self._server = await asyncio.start_unix_server(
+            self._serve, path=self._path, limit=MAX_FRAME
+        )
+        os.chmod(self._path, 0o600)
+        logger.info("[ipc] connector listening on %s", self._path)
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+        logger.info("[ipc] connector stopped")
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        current = asyncio.current_task()
+        if current is not None:
+            self._connections.add(current)
+        requests: Set[asyncio.Task] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    logger.warning("[ipc] invalid frame dropped: %s", e)
+                    continue
+                task = asyncio.create_task(self._handle(request, writer))
+                requests.add(task)
+                task.add_done_callback(requests.discard)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # Replies for events already accepted are still sent if possible
+            await asyncio.gather(*requests, return_exceptions=True)
+            writer.close()
+            if current is not None:
+                self._connections.discard(current)
+
+    async def _handle(
+        self, request: Dict[str, Any], writer: asyncio.StreamWriter
+    ) -> None:
+        topic = request.get("topic") or ""
+        reply: Dict[str, Any] = {"id": request.get("id"), "ok": True}
+        self.received += 1
+        try:
+            with TRACER.resume(
+                "ipc.receive", request.get("traceparent"), kind=KIND_SERVER, topic=topic
+            ):
+                await self._handler(topic, request.get("payload") or {})
+        except BusFull as e:
+            self.rejected += 1
+            reply = {
+                "id": request.get("id"),
+                "ok": False,
+                "error": "full",
+                "detail": str(e),
+            }
+        except Exception as e:
+            self.failed += 1
+            logger.exception("[ipc] handling %s failed: %s", topic, e)
+            reply = {
+                "id": request.get("id"),
+                "ok": False,
+                "error": "error",
+                "detail": str(e),
+            }
+        if writer.is_closing():
+            return
+        try:
+            writer.write(_frame(reply))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "role": "connector",
+            "connections": len(self._connections),
+            "received": self.received,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+
+class IpcClient:
+    """
+    Ingress side: publishes events to the connector over its Unix socket.
+    One connection per worker process carries any number of concurrent requests
+    (matched by id); it is (re)opened on demand.
+    - publish() returns once the connector accepted the event; BusFull is raised
+      when the connector's bus is full, ConnectionError when it is unreachable
+      or does not answer within `timeout` seconds.
+    """
+
+    def __init__(self, path: str, *, timeout: float = 10.0):
+        self._path = path
+        self._timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.connects = 0
+
+    async def _connection(self) -> asyncio.StreamWriter:
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    self._path, limit=MAX_FRAME
+                )
+            except OSError as e:
+                raise ConnectionError(f"connector unreachable at {self._path}: {e}")
+            self._writer = writer
+            self._reader_task = asyncio.create_task(self._read_replies(reader))
+            self.connects += 1
+            logger.info("[ipc] connected to connector at %s", self._path)
+            return writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                fut = self._pending.pop(reply.get("id"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(reply)
+        except (ConnectionError, ValueError) as e:
+            logger.warning("[ipc] connection to connector failed: %s", e)
+        finally:
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(
+                        ConnectionError("connector closed the connection")
+                    )
+
+    async def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        writer = await self._connection()
+        request_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = fut
+        try:
+            writer.write(
+                _frame(
+                    {
+                        "id": request_id,
+                        "topic": topic,
+                        "payload": payload,
+                        "traceparent": current_traceparent(),
+                    }
+                )
+            )
+            await writer.drain()
+            reply = await asyncio.wait_for(fut, timeout=self._timeout)
+        except asyncio.TimeoutError:
+            self.failed += 1
+            raise ConnectionError(f"connector did not answer within {self._timeout}s")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+        if reply.get("ok"):
+            self.sent += 1
+            return
+        if reply.get("error") == "full":
+            self.rejected += 1
+            raise BusFull(topic)
+        self.failed += 1
+        raise RuntimeError(f"connector failed to accept {topic}: {reply.get('detail')}")
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "role": "ingress",
+            "connected": self._writer is not None and not self._writer.is_closing(),
+            "in_flight": len(self._pending),
+            "sent": self.sent,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "connects": self.connects,
+        }
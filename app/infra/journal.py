@@ -0,0 +1,283 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+from app.domain.message import UnifiedMessage
+from app.domain.ports import EventPublisher
+
+logger = logging.getLogger(__name__)
+
+# Key injected into bus payloads so consumers can acknowledge journal entries
+JOURNAL_ID_KEY = "_journal_id"
+# Key of the normalized UnifiedMessage in inbound bus payloads
+MESSAGE_KEY = "message"
+
+JournalEntry = Tuple[int, str, Dict[str, Any]]  # (entry id, bus topic, payload)
+
+
+class InboundJournal:
+    """
+    Append-only write-ahead journal for inbound webhook events (SQLite, WAL mode).
+    - append() returns once the entry is durable; concurrent appends are group-committed
+      (one transaction and one fsync per batch, not per message).
+    - ack() marks an entry processed; acks are batched into the next commit.
+    - replay() returns entries that were never acknowledged (e.g. after a crash).
+    All SQLite access runs on one dedicated thread.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS journal (
+            id INTEGER PRIMARY KEY,
+            topic TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            replays INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending'
+        );
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        commit_interval: float = 0.002,
+        max_batch: int = 512,
+        max_replays: int = 5,
+    ):
+        self._path = path
+        self._commit_interval = commit_interval
+        self._max_batch = max(1, max_batch)
+        self._max_replays = max_replays
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._appends: List[Tuple[int, str, str, float, asyncio.Future]] = []
+        self._acks: List[int] = []
+        self._next_id = 0
+        self._closing = False
+
+        self.appended = 0
+        self.acked = 0
+        self.commits = 0
+        self.replayed = 0
+        self.dead = 0
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._next_id = await self._run(self._open_sync)
+        self._closing = False
+        self._writer = asyncio.create_task(self._write_loop(), name="journal-writer")
+        logger.info("[journal] opened: %s", self._path)
+
+    def _open_sync(self) -> int:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: every commit is fsynced; group commit keeps that to one fsync per batch
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(self._SCHEMA)
+        self._conn = conn
+        row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM journal").fetchone()
+        return int(row[0])
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        if self._writer:
+            # Let the writer finish its current commit instead of cancelling mid-flight
+            self._closing = True
+            self._wakeup.set()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        # Flush whatever is still buffered
+        await self._commit_pending()
+        await self._run(self._close_sync)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def append(self, topic: str, payload: Dict[str, Any]) -> int:
+        """Durably record an inbound event; returns its entry id."""
+        if self._executor is None:
+            raise RuntimeError("Inbound journal is not open")
+        self._next_id += 1
+        entry_id = self._next_id
+        fut = asyncio.get_running_loop().create_future()
+        self._appends.append(
+            (entry_id, topic, to_json(payload, fallback=str).decode(), time.time(), fut)
+        )
+        self._wakeup.set()
+        await fut
+        return entry_id
+
+    def ack(self, entry_id: int) -> None:
+        """Mark an entry processed (persisted with the next group commit)."""
+        self._acks.append(int(entry_id))
+        self._wakeup.set()
+
+    async def _write_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._closing and len(self._appends) < self._max_batch:
+                # Let concurrent appends join this commit
+                await asyncio.sleep(self._commit_interval)
+            await self._commit_pending()
+            if self._closing:
+                return
+
+    async def _commit_pending(self) -> None:
+        appends, self._appends = self._appends, []
+        acks, self._acks = self._acks, []
+        if not appends and not acks:
+            return
+        rows = [(a[0], a[1], a[2], a[3]) for a in appends]
+        try:
+            await self._run(self._commit_sync, rows, acks)
+        except Exception as e:
+            logger.exception("[journal] commit failed: %s", e)
+            for *_, fut in appends:
+                if not fut.done():
+                    fut.set_exception(e)
+            # Acks are retried with the next commit
+            self._acks.extend(acks)
+            return
+        self.commits += 1
+        self.appended += len(appends)
+        self.acked += len(acks)
+        for *_, fut in appends:
+            if not fut.done():
+                fut.set_result(None)
+
+    def _commit_sync(
+        self, rows: List[Tuple[int, str, str, float]], acks: List[int]
+    ) -> None:
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            if rows:
+                conn.executemany(
+                    "INSERT INTO journal (id, topic, payload, created_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            if acks:
+                conn.executemany(
+                    "DELETE FROM journal WHERE id = ?", [(a,) for a in acks]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def replay(self) -> List[JournalEntry]:
+        """
+        Return unacknowledged entries in arrival order and count the replay.
+        Entries replayed more than max_replays times are parked as 'dead'.
+        """
+        entries, dead = await self._run(self._replay_sync)
+        self.replayed += len(entries)
+        self.dead += dead
+        if entries or dead:
+            logger.info(
+                "[journal] replaying %d entries (%d parked)", len(entries), dead
+            )
+        return entries
+
+    def _replay_sync(self) -> Tuple[List[JournalEntry], int]:
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            dead = conn.execute(
+                "UPDATE journal SET status = 'dead' WHERE status = 'pending' AND replays >= ?",
+                (self._max_replays,),
+            ).rowcount
+            rows = conn.execute(
+                "SELECT id, topic, payload FROM journal WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+            conn.execute(
+                "UPDATE journal SET replays = replays + 1 WHERE status = 'pending'"
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(r[0], r[1], json.loads(r[2])) for r in rows], dead
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "appended": self.appended,
+            "acked": self.acked,
+            "commits": self.commits,
+            "avg_batch": (
+                round(self.appended / self.commits, 2) if self.commits else 0.0
+            ),
+            "buffered": len(self._appends),
+            "replayed": self.replayed,
+            "dead": self.dead,
+        }
+
+
+def inbound_message(payload: Dict[str, Any]) -> UnifiedMessage:
+    """
+    The UnifiedMessage of an inbound bus payload. In-process it is the object built
+    at the edge; after a process boundary (journal replay, IPC, bus spill) it is a
+    dict and is validated here, then stored back so other listeners reuse it.
+    """
+    message = payload[MESSAGE_KEY]
+    if not isinstance(message, UnifiedMessage):
+        message = payload[MESSAGE_KEY] = UnifiedMessage.model_validate(message)
+    return message
+
+
+async def publish_inbound(
+    bus: EventPublisher,
+    journal: Optional[InboundJournal],
+    topic: str,
+    payload: Dict[str, Any],
+) -> None:
+    """
+    Journal an inbound event (if a journal is configured), then publish it on the bus.
+    If the bus refuses it (BusFull), the entry is acknowledged before re-raising: the
+    sender is told to retry, and a replay would otherwise deliver the message twice.
+    """
+    if journal is not None:
+        payload[JOURNAL_ID_KEY] = await journal.append(topic, payload)
+    try:
+        await bus.publish(topic, payload)
+    except Exception:
+        ack_inbound(journal, payload)
+        raise
+
+
+def ack_inbound(journal: Optional[InboundJournal], payload: Dict[str, Any]) -> None:
+    """
+    Acknowledge the journal entry carried by a bus payload (no-op without one);
+    a list holds the entries of messages merged into one.
+    """
+    entry_id = payload.get(JOURNAL_ID_KEY)
+    if journal is None or entry_id is None:
+        return
+    for item in entry_id if isinstance(entry_id, list) else (entry_id,):
+        journal.ack(item)
@@ -0,0 +1,244 @@
+import asyncio
+import io
+import logging
+import mimetypes
+import os
+import tempfile
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+from app.config import MediaConfig
+from app.domain.message import MediaContent, UnifiedMessage
+from app.infra.http_pool import HttpPool
+from app.infra.metrics import MEDIA_BYTES, MEDIA_FILES
+from app.infra.tracing import KIND_CLIENT, TRACER
+
+logger = logging.getLogger(__name__)
+
+
+class MediaTooLarge(ValueError):
+    """The file exceeds MEDIA_MAX_BYTES; raised before or while downloading."""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"media file of {size} bytes exceeds the {limit} byte limit")
+        self.size = size
+        self.limit = limit
+
+
+class MediaFile:
+    """
+    A downloaded attachment, written chunk by chunk.
+    - Kept in memory up to `spool_bytes`, then moved to a temp file (deleted on
+      close), so a large video never sits in RAM as a whole.
+    - write() raises MediaTooLarge as soon as `max_bytes` would be exceeded, which
+      aborts the download instead of finishing it.
+    - The multipart upload reads `file` in chunks; rewind() before sending again.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int,
+        spool_bytes: int,
+        filename: Optional[str] = None,
+        mime_type: Optional[str] = None,
+        temp_dir: Optional[str] = None,
+    ):
+        self.filename = filename
+        self.mime_type = mime_type
+        self.size = 0
+        self._max_bytes = max_bytes
+        self._spool_bytes = spool_bytes
+        self._temp_dir = temp_dir
+        # BytesIO has no fileno(), so httpx sizes it without forcing it to disk
+        self.file: BinaryIO = io.BytesIO()
+        self.path: Optional[str] = None  # set once moved to a temp file
+
+    def expect(self, size: Optional[int]) -> None:
+        """Fail fast on a size announced by the source (Content-Length, file info)."""
+        if size is not None and size > self._max_bytes:
+            raise MediaTooLarge(size, self._max_bytes)
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    def getbuffer(self) -> memoryview:
+        """The content of an in-memory file (without a copy)."""
+        if not isinstance(self.file, io.BytesIO):
+            raise ValueError("media file is on disk; read it from `path`")
+        return self.file.getbuffer()
+
+    async def write(self, chunk: bytes) -> None:
+        size = self.size + len(chunk)
+        if size > self._max_bytes:
+            raise MediaTooLarge(size, self._max_bytes)
+        if not self.on_disk and size > self._spool_bytes:
+            await asyncio.to_thread(self._rollover)
+        if self.on_disk:
+            await asyncio.to_thread(self.file.write, chunk)
+        else:
+            self.file.write(chunk)
+        self.size = size
+
+    def _rollover(self) -> None:
+        spooled = self.getbuffer()
+        # Named, so worker processes (image transforms) can open it; deleted on close
+        tmp = tempfile.NamedTemporaryFile(dir=self._temp_dir, prefix="media-")
+        tmp.write(spooled)
+        spooled.release()
+        self.file = tmp  # type: ignore[assignment]
+        self.path = tmp.name
+
+    def rewind(self) -> BinaryIO:
+        self.file.seek(0)
+        return self.file
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "MediaFile":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# source(message, content, file): writes the attachment of `message` into `file`
+MediaSource = Callable[[UnifiedMessage, MediaContent, MediaFile], Awaitable[None]]
+
+
+class MediaFetcher:
+    """
+    Downloads inbound attachments into MediaFile buffers for the Chatwoot upload.
+    - http(s) URLs (VK attachments, resolved Wasender media) are streamed through
+      the shared "media" upstream pool.
+    - Channels register a source for their own URL scheme, e.g. telegram://chat/msg
+      (Telethon's download iterator) or wasender://message-id (decrypt-media first).
+    - Every download is bounded by `timeout` and MEDIA_MAX_BYTES.
+    """
+
+    upstream = "media"
+
+    def __init__(self, http: HttpPool, config: Optional[MediaConfig] = None):
+        self._http = http
+        self._config = config or MediaConfig()
+        self._http.register(self.upstream)
+        self._sources: Dict[str, MediaSource] = {
+            "http": self._download_content_url,
+            "https": self._download_content_url,
+        }
+        self.files = 0
+        self.bytes = 0
+        self.spilled = 0
+        self.too_large = 0
+        self.failures = 0
+
+    @property
+    def chunk_size(self) -> int:
+        return self._config.chunk_size
+
+    def register_source(self, scheme: str, source: MediaSource) -> None:
+        self._sources[scheme] = source
+
+    async def fetch(
+        self, message: UnifiedMessage, content: Optional[MediaContent] = None
+    ) -> MediaFile:
+        """
+        Download the attachment of a MediaContent message (or `content`, e.g. a
+        sticker described as an image); close() the result.
+        """
+        if content is None:
+            if not isinstance(message.content, MediaContent):
+                raise TypeError(f"message has no media: {message.content.type}")
+            content = message.content
+        url = str(content.url)
+        scheme = urlsplit(url).scheme
+        source = self._sources.get(scheme)
+        if source is None:
+            raise ValueError(f"no media source for {scheme or url!r}")
+
+        cfg = self._config
+        media = MediaFile(
+            max_bytes=cfg.max_bytes,
+            spool_bytes=cfg.spool_bytes,
+            filename=content.filename,
+            mime_type=content.mime_type,
+            temp_dir=cfg.temp_dir,
+        )
+        try:
+            with TRACER.span(
+                "media.fetch", kind=KIND_CLIENT, channel=message.channel, scheme=scheme
+            ):
+                async with asyncio.timeout(cfg.timeout):
+                    await source(message, content, media)
+        except MediaTooLarge:
+            media.close()
+            self.too_large += 1
+            MEDIA_FILES.inc(message.channel, "too_large")
+            raise
+        except Exception:
+            media.close()
+            self.failures += 1
+            MEDIA_FILES.inc(message.channel, "failed")
+            raise
+        except BaseException:
+            media.close()
+            raise
+
+        if not media.mime_type:
+            media.mime_type = mimetypes.guess_type(media.filename or url)[0]
+        if not media.filename:
+            media.filename = _default_filename(url, content, media.mime_type)
+        self.files += 1
+        self.bytes += media.size
+        if media.on_disk:
+            self.spilled += 1
+        MEDIA_BYTES.inc(message.channel, amount=media.size)
+        logger.info(
+            "[media] fetched %s bytes=%d on_disk=%s",
+            media.filename,
+            media.size,
+            media.on_disk,
+        )
+        return media
+
+    async def _download_content_url(
+        self, message: UnifiedMessage, content: MediaContent, media: MediaFile
+    ) -> None:
+        await self.download(str(content.url), media)
+
+    async def download(self, url: str, media: MediaFile) -> None:
+        """Stream an http(s) URL into `media` chunk by chunk."""
+        client = self._http.client(self.upstream)
+        async with client.stream(
+            "GET", url, follow_redirects=True, timeout=self._config.timeout
+        ) as r:
+            r.raise_for_status()
+            length = r.headers.get("Content-Length", "")
+            media.expect(int(length) if length.isdigit() else None)
+            if not media.mime_type:
+                media.mime_type = (
+                    r.headers.get("Content-Type", "").split(";")[0].strip() or None
+                )
+            async for chunk in r.aiter_bytes(self._config.chunk_size):
+                await media.write(chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "spilled_to_disk": self.spilled,
+            "too_large": self.too_large,
+            "failures": self.failures,
+            "max_bytes": self._config.max_bytes,
+        }
+
+
+def _default_filename(url: str, content: MediaContent, mime_type: Optional[str]) -> str:
+    """Name from the URL path when it has an extension, else from the media type."""
+    name = os.path.basename(unquote(urlsplit(url).path))
+    if name and "." in name:
+        return name
+    ext = mimetypes.guess_extension(mime_type or "") or ""
+    return f"{content.media_type}{ext}"
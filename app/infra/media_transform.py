@@ -0,0 +1,216 @@
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple, Union
+
+from PIL import Image
+
+from app.config import MediaConfig
+from app.infra.cache import NOT_FOUND, TTLCache
+from app.infra.media import MediaFile
+from app.infra.metrics import ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Formats Chatwoot (and the messengers' web clients) display inline
+KEPT_FORMATS = ("JPEG", "PNG", "GIF")
+FORMAT_FILES = {"JPEG": (".jpg", "image/jpeg"), "PNG": (".png", "image/png")}
+STICKER_MAX_SIDE = 512
+
+# (encoded image, Pillow format)
+Transformed = Tuple[bytes, str]
+
+
+def transform_image(
+    src: Union[bytes, str], *, sticker: bool, max_side: int, quality: int
+) -> Optional[Transformed]:
+    """
+    Runs in a worker process. Re-encodes an image Chatwoot can not show as is:
+    - stickers (WebP, sticker thumbnails) become PNG, keeping transparency;
+    - other formats (WebP, BMP, TIFF, ...) become JPEG, or PNG if transparent;
+    - images larger than `max_side` pixels are downscaled (aspect ratio kept).
+    `src` is the file path (large files) or the bytes. Returns None when the image
+    can be sent unchanged; animated GIFs always are.
+    """
+    with Image.open(src if isinstance(src, str) else io.BytesIO(src)) as im:
+        source_format = im.format or ""
+        limit = min(max_side, STICKER_MAX_SIDE) if sticker else max_side
+        oversized = max(im.size) > limit
+        if source_format == "GIF" and not sticker:
+            return None
+        transparent = im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info
+        if sticker or (source_format not in KEPT_FORMATS and transparent):
+            target = "PNG"
+        elif source_format in KEPT_FORMATS:
+            target = source_format
+        else:
+            target = "JPEG"
+        if target == source_format and not oversized:
+            return None
+
+        if oversized:
+            # Decodes JPEGs at a reduced scale first, then resamples
+            im.thumbnail((limit, limit))
+        if target == "JPEG" and im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        elif target == "PNG" and im.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+            im = im.convert("RGBA")
+        out = io.BytesIO()
+        if target == "JPEG":
+            im.save(out, "JPEG", quality=quality, optimize=True)
+        else:
+            im.save(out, target, optimize=True)
+        return out.getvalue(), target
+
+
+class MediaTransformer:
+    """
+    Converts and downscales inbound images in a process pool, off the event loop.
+    - At most `transform_queue` images wait for or run in the `transform_workers`
+      processes; further callers wait (backpressure on their lane).
+    - Large files are handed over by path, small ones as bytes; the result comes
+      back as bytes and is written into a new MediaFile.
+    - Results are cached by content hash, so the same sticker is converted once.
+    - A failed transform is logged and the original file is sent instead.
+    """
+
+    def __init__(self, config: Optional[MediaConfig] = None):
+        self._config = config or MediaConfig()
+        self._slots = asyncio.Semaphore(max(1, self._config.transform_queue))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Unchanged images are cached as NOT_FOUND (no worker needed next time)
+        self._cache: TTLCache[Transformed] = TTLCache(
+            max_size=self._config.transform_cache_size,
+            ttl=self._config.transform_cache_ttl,
+            negative_ttl=self._config.transform_cache_ttl,
+        )
+        self.waiting = 0
+        self.converted = 0
+        self.unchanged = 0
+        self.failures = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=max(1, self._config.transform_workers)
+            )
+        return self._pool
+
+    async def transform(self, media: MediaFile, *, sticker: bool = False) -> MediaFile:
+        """
+        Return `media` itself if it can be sent as is, else a converted MediaFile
+        (`media` is closed then). Non-image files are returned untouched.
+        """
+        if not sticker and not (media.mime_type or "").startswith("image/"):
+            return media
+        try:
+            key = (await self._digest(media), sticker)
+            result = self._cache.get(key)
+            if result is None:
+                result = await self._run(media, sticker)
+                if result is None:
+                    self._cache.set_not_found(key)
+                elif len(result[0]) <= self._config.spool_bytes:
+                    self._cache.set(key, result)
+            if result is None or result is NOT_FOUND:
+                self.unchanged += 1
+                return media
+            converted = await self._to_media_file(media, *result)
+        except Exception as e:
+            self.failures += 1
+            ERRORS.inc("media_transform", type(e).__name__)
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. out of memory): start fresh processes next time
+                self._pool = None
+            logger.warning(
+                "[media] transform failed for %s, sending it as is: %s",
+                media.filename,
+                e,
+            )
+            return media
+        self.converted += 1
+        logger.info(
+            "[media] transformed %s bytes=%d -> %s bytes=%d",
+            media.filename,
+            media.size,
+            converted.filename,
+            converted.size,
+        )
+        media.close()
+        return converted
+
+    async def _digest(self, media: MediaFile) -> str:
+        if media.path is None:
+            return hashlib.sha256(media.getbuffer()).hexdigest()
+        media.file.flush()
+        return await asyncio.to_thread(_file_digest, media.path)
+
+    async def _run(self, media: MediaFile, sticker: bool) -> Optional[Transformed]:
+        # Paths cross the process boundary; bytes only for small in-memory files
+        src: Union[bytes, str] = (
+            media.path if media.path is not None else bytes(media.getbuffer())
+        )
+        job = functools.partial(
+            transform_image,
+            src,
+            sticker=sticker,
+            max_side=self._config.image_max_side,
+            quality=self._config.image_quality,
+        )
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor(), job
+            )
+        finally:
+            self._slots.release()
+
+    async def _to_media_file(
+        self, media: MediaFile, data: bytes, image_format: str
+    ) -> MediaFile:
+        ext, mime_type = FORMAT_FILES[image_format]
+        stem = os.path.splitext(media.filename or "image")[0]
+        cfg = self._config
+        converted = MediaFile(
+            max_bytes=cfg.max_bytes,
+            spool_bytes=cfg.spool_bytes,
+            filename=stem + ext,
+            mime_type=mime_type,
+            temp_dir=cfg.temp_dir,
+        )
+        try:
+            await converted.write(data)
+        except BaseException:
+            converted.close()
+            raise
+        return converted
+
+    async def close(self) -> None:
+        """Stop the worker processes (images in flight are dropped)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self._config.transform_workers,
+            "waiting": self.waiting,
+            "converted": self.converted,
+            "unchanged": self.unchanged,
+            "failures": self.failures,
+            "cache": self._cache.stats(),
+        }
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
@@ -0,0 +1,279 @@
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; covers fast cache hits up to slow upstream timeouts
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in self._values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def set_function(self, fn: Callable[[], float], *labels: str) -> None:
+        self._functions[labels] = fn
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        values = dict(self._values)
+        for labels, fn in self._functions.items():
+            try:
+                values[labels] = float(fn())
+            except Exception:
+                continue
+        for labels, value in values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._bounds = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self._bounds) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self._bounds, value)] += 1
+        self._sums[labels] += value
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        names = (*self.labelnames, "le")
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip((*self._bounds, math.inf), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, (*labels, _format_value(bound)))}"
+                    f" {cumulative}"
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {repr(self._sums[labels])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def timed(histogram: Histogram, *labels: str) -> Iterator[None]:
+    """Observe the duration of a block; an "outcome" label (ok/error) is appended."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels, outcome)
+
+
+# Metrics are only updated from the event loop thread: plain dict updates, no locks.
+REGISTRY = Registry()
+
+WEBHOOK_LATENCY = REGISTRY.register(
+    Histogram(
+        "gateway_http_request_duration_seconds",
+        "Time spent handling HTTP routes (webhooks, health, stats).",
+        ("route", "status"),
+    )
+)
+CHATWOOT_LATENCY = REGISTRY.register(
+    Histogram(
+        "gateway_chatwoot_request_duration_seconds",
+        "Chatwoot API call latency by client method.",
+        ("operation", "outcome"),
+    )
+)
+SEND_LATENCY = REGISTRY.register(
+    Histogram(
+        "gateway_send_duration_seconds",
+        "Messenger send_text latency by channel.",
+        ("channel", "outcome"),
+    )
+)
+INBOUND_MESSAGES = REGISTRY.register(
+    Counter(
+        "gateway_inbound_messages_total",
+        "Messenger events accepted for delivery to Chatwoot.",
+        ("channel",),
+    )
+)
+FORWARDED_MESSAGES = REGISTRY.register(
+    Counter(
+        "gateway_forwarded_messages_total",
+        "Inbound messages posted into Chatwoot.",
+        ("channel",),
+    )
+)
+COALESCED_MESSAGES = REGISTRY.register(
+    Counter(
+        "gateway_coalesced_messages_total",
+        "Inbound messages passed through the coalescing window.",
+        ("channel",),
+    )
+)
+COALESCE_FLUSHES = REGISTRY.register(
+    Counter(
+        "gateway_coalesce_flushes_total",
+        "Chatwoot messages produced by the coalescing window, by flush reason.",
+        ("channel", "reason"),
+    )
+)
+MEDIA_FILES = REGISTRY.register(
+    Counter(
+        "gateway_media_files_total",
+        "Inbound media files relayed to Chatwoot, by outcome.",
+        ("channel", "outcome"),
+    )
+)
+MEDIA_BYTES = REGISTRY.register(
+    Counter(
+        "gateway_media_bytes_total",
+        "Bytes of inbound media downloaded from the messengers.",
+        ("channel",),
+    )
+)
+OUTBOUND_MESSAGES = REGISTRY.register(
+    Counter(
+        "gateway_outbound_messages_total",
+        "Agent replies routed to a messenger.",
+        ("channel",),
+    )
+)
+ERRORS = REGISTRY.register(
+    Counter(
+        "gateway_errors_total",
+        "Errors by pipeline stage and exception type.",
+        ("stage", "type"),
+    )
+)
+DROPPED_EVENTS = REGISTRY.register(
+    Counter(
+        "gateway_dropped_events_total",
+        "Events dropped or ignored (duplicates, unsupported types, invalid payloads).",
+        ("source", "reason"),
+    )
+)
+UNLOCKED_RUNS = REGISTRY.register(
+    Counter(
+        "gateway_unlocked_runs_total",
+        "Work run without (or after losing) its shared per-key lock; per-user order "
+        "across replicas is not guaranteed for it.",
+        ("reason",),
+    )
+)
+BUS_TASKS_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "gateway_bus_tasks_in_flight",
+        "Event bus events currently being handled.",
+    )
+)
+BUS_QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "gateway_bus_queue_depth",
+        "Events waiting in an event bus topic queue.",
+        ("topic",),
+    )
+)
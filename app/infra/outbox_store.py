@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.domain.outbox import OutboxItem
+from app.domain.ports import OutboxStore
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryOutboxStore(OutboxStore):
+    """Non-durable store (tests, ephemeral deployments)."""
+
+    def __init__(self):
+        self._items: Dict[int, OutboxItem] = {}
+        self._next_id = 1
+
+    async def open(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+    async def put(self, item: OutboxItem) -> int:
+        item_id = self._next_id
+        self._next_id += 1
+        self._items[item_id] = item.model_copy(update={"id": item_id})
+        return item_id
+
+    async def load_pending(self) -> List[OutboxItem]:
+        return [self._items[k] for k in sorted(self._items)]
+
+    async def mark_done(self, item_id: int) -> None:
+        self._items.pop(item_id, None)
+
+    async def mark_retry(self, item_id: int, attempts: int, error: str) -> None:
+        item = self._items.get(item_id)
+        if item:
+            item.attempts = attempts
+            item.last_error = error
+
+    async def mark_dead(self, item_id: int, attempts: int, error: str) -> None:
+        self._items.pop(item_id, None)
+
+
+class SqliteOutboxStore(OutboxStore):
+    """
+    Durable store on a local SQLite file (WAL mode).
+    All access goes through one dedicated thread, so the event loop never blocks
+    on disk I/O and the connection is never shared between threads.
+    Delivered rows are deleted; undeliverable rows are kept with status='dead'.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            recipient_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            status TEXT NOT NULL DEFAULT 'pending'
+        );
+        CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id);
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._executor is None:
+            raise RuntimeError("Outbox store is not open")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        await self._run(self._open_sync)
+        logger.info("[outbox] sqlite store opened: %s", self._path)
+
+    def _open_sync(self) -> None:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL in WAL mode: durable across process crashes, fsync only on checkpoint
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self._SCHEMA)
+        self._conn = conn
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        await self._run(self._close_sync)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def put(self, item: OutboxItem) -> int:
+        return await self._run(self._put_sync, item)
+
+    def _put_sync(self, item: OutboxItem) -> int:
+        cur = self._conn.execute(
+            "INSERT INTO outbox (channel, recipient_id, text, created_at, attempts)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                item.channel,
+                item.recipient_id,
+                item.text,
+                item.created_at,
+                item.attempts,
+            ),
+        )
+        return int(cur.lastrowid)
+
+    async def load_pending(self) -> List[OutboxItem]:
+        return await self._run(self._load_pending_sync)
+
+    def _load_pending_sync(self) -> List[OutboxItem]:
+        rows = self._conn.execute(
+            "SELECT id, channel, recipient_id, text, created_at, attempts, last_error"
+            " FROM outbox WHERE status = 'pending' ORDER BY id"
+        ).fetchall()
+        return [
+            OutboxItem(
+                id=r[0],
+                channel=r[1],
+                recipient_id=r[2],
+                text=r[3],
+                created_at=r[4],
+                attempts=r[5],
+                last_error=r[6],
+            )
+            for r in rows
+        ]
+
+    async def mark_done(self, item_id: int) -> None:
+        await self._run(
+            self._execute_sync, "DELETE FROM outbox WHERE id = ?", (item_id,)
+        )
+
+    async def mark_retry(self, item_id: int, attempts: int, error: str) -> None:
+        await self._run(
+            self._execute_sync,
+            "UPDATE outbox SET attempts = ?, last_error = ? WHERE id = ?",
+            (attempts, error, item_id),
+        )
+
+    async def mark_dead(self, item_id: int, attempts: int, error: str) -> None:
+        await self._run(
+            self._execute_sync,
+            "UPDATE outbox SET attempts = ?, last_error = ?, status = 'dead' WHERE id = ?",
+            (attempts, error, item_id),
+        )
+
+    def _execute_sync(self, sql: str, params: tuple) -> None:
+        self._conn.execute(sql, params)
+
+
+def build_outbox_store(backend: str, path: str) -> OutboxStore:
+    """Create the configured store ("sqlite" or "memory")."""
+    if backend == "memory":
+        return MemoryOutboxStore()
+    if backend == "sqlite":
+        return SqliteOutboxStore(path)
+    raise ValueError(f"Unknown outbox backend: {backend}")
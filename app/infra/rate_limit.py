@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+from app.domain.ports import StateStore
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, up to `burst` saved up.
+    acquire() reserves its tokens immediately (the balance may go negative) and
+    sleeps off the debt, so concurrent callers are served in call order.
+    A rate <= 0 disables limiting.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._rate = rate
+        self._burst = max(1.0, burst if burst is not None else rate)
+        self._clock = clock
+        self._tokens = self._burst
+        self._updated = clock()
+        self.acquired = 0
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take tokens now and return how many seconds the caller must wait."""
+        self.acquired += 1
+        if self._rate <= 0:
+            return 0.0
+        self._refill()
+        self._tokens -= tokens
+        if self._tokens >= 0:
+            return 0.0
+        delay = -self._tokens / self._rate
+        self.waits += 1
+        self.waited_seconds += delay
+        return delay
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        if self._rate > 0:
+            self._refill()
+        return {
+            "rate": self._rate,
+            "burst": self._burst,
+            "tokens": round(self._tokens, 3),
+            "acquired": self.acquired,
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
+
+
+class SharedRateLimiter:
+    """
+    Rate limit shared by every replica through the state store: acquisitions are
+    counted per fixed window (one second, or 1/rate for slower rates) and callers
+    over the window's budget wait for the next one. A local TokenBucket still
+    smooths this process's bursts. If the store is unreachable the local bucket
+    alone applies.
+    """
+
+    def __init__(
+        self,
+        state: StateStore,
+        key: str,
+        rate: float,
+        burst: Optional[float] = None,
+    ):
+        self._state = state
+        self._key = key
+        self._rate = rate
+        self._bucket = TokenBucket(rate, burst)
+        self._window = max(1.0, 1.0 / rate) if rate > 0 else 1.0
+        self._budget = max(1, round(rate * self._window))
+        self.shared_waits = 0
+        self.store_errors = 0
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        await self._bucket.acquire(tokens)
+        if self._rate <= 0:
+            return
+        while True:
+            now = time.time()
+            window = int(now // self._window)
+            try:
+                used = await self._state.incr(
+                    f"rate:{self._key}:{window}",
+                    max(1, round(tokens)),
+                    ttl=self._window * 2,
+                )
+            except Exception as e:
+                self.store_errors += 1
+                logger.warning("[rate] shared budget %s unavailable: %s", self._key, e)
+                return
+            if used <= self._budget:
+                return
+            self.shared_waits += 1
+            await asyncio.sleep((window + 1) * self._window - now)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._bucket.stats(),
+            "shared": {
+                "key": self._key,
+                "budget_per_window": self._budget,
+                "window_seconds": self._window,
+                "waits": self.shared_waits,
+                "store_errors": self.store_errors,
+            },
+        }
+
+
+RateLimiter = Union[TokenBucket, SharedRateLimiter]
+
+
+def build_rate_limiter(
+    rate: float,
+    burst: Optional[float] = None,
+    *,
+    state: Optional[StateStore] = None,
+    key: str = "",
+) -> RateLimiter:
+    """Local TokenBucket, or a SharedRateLimiter when `state` is shared between replicas."""
+    if state is not None and state.shared and rate > 0:
+        return SharedRateLimiter(state, key, rate, burst)
+    return TokenBucket(rate, burst)
@@ -0,0 +1,254 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.infra.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SendFn = Callable[[str, str], Awaitable[None]]
+# Maps a send error to a pause in seconds (throttling) or None (a real failure)
+ThrottleFn = Callable[[BaseException], Optional[float]]
+
+
+class SendBacklogFull(RuntimeError):
+    """Raised by submit() when too many sends are already waiting."""
+
+
+class _Job:
+    def __init__(self, peer: str, text: str, future: asyncio.Future):
+        self.peer = peer
+        self.text = text
+        self.future = future
+        self.created_at = time.monotonic()
+
+
+class SendScheduler:
+    """
+    Paces outgoing sends for one messenger account.
+    - A global token bucket caps the account-wide send rate.
+    - Each peer has its own FIFO queue with at most one send in flight, and
+      consecutive sends to one peer are spaced by `peer_interval` seconds; a timer
+      heap holds the peers that have a send due.
+    - When a send is throttled (e.g. Telegram FloodWait), all sends pause for the
+      requested time and the message goes back to the head of its peer's queue
+      instead of being dropped, so the peer's order is kept.
+    - submit() resolves once the message is actually sent (or failed), and rejects
+      new work with SendBacklogFull when `max_backlog` sends are already pending.
+    Throttles longer than `max_wait` are returned to the caller as errors.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        send: SendFn,
+        throttle_delay: ThrottleFn,
+        rate: float,
+        burst: Optional[float] = None,
+        peer_interval: float = 1.0,
+        max_backlog: int = 1000,
+        max_wait: float = 600.0,
+    ):
+        self._name = name
+        self._send = send
+        self._throttle_delay = throttle_delay
+        self._bucket = TokenBucket(rate, burst)
+        self._peer_interval = peer_interval
+        self._max_backlog = max(1, max_backlog)
+        self._max_wait = max_wait
+
+        # (ready at, sequence, peer) of peers with queued sends and none in flight
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._queues: Dict[str, Deque[_Job]] = {}
+        self._scheduled: Set[str] = set()  # peers on the heap
+        self._busy: Set[str] = set()  # peers with a send in flight
+        self._queued = 0
+        self._peer_next: Dict[str, float] = {}
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._attempts: Set[asyncio.Task] = set()
+
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    @property
+    def backlog(self) -> int:
+        return self._queued + len(self._attempts)
+
+    def start(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(
+                self._dispatch_loop(), name=f"{self._name}-send-scheduler"
+            )
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for task in self._attempts:
+            task.cancel()
+        await asyncio.gather(*self._attempts, return_exceptions=True)
+        error = RuntimeError(f"{self._name} send scheduler stopped")
+        for queue in self._queues.values():
+            for job in queue:
+                if not job.future.done():
+                    job.future.set_exception(error)
+        self._queues.clear()
+        self._heap.clear()
+        self._scheduled.clear()
+        self._queued = 0
+
+    async def submit(self, peer: str, text: str) -> None:
+        """Queue a send and wait until it has been delivered (or has failed)."""
+        if self.backlog >= self._max_backlog:
+            self.rejected += 1
+            raise SendBacklogFull(
+                f"{self._name} send backlog is full ({self.backlog} pending)"
+            )
+        job = _Job(
+            peer=peer, text=text, future=asyncio.get_running_loop().create_future()
+        )
+        self._queues.setdefault(peer, deque()).append(job)
+        self._queued += 1
+        self._schedule(peer, time.monotonic())
+        await job.future
+
+    def _schedule(self, peer: str, ready_at: float) -> None:
+        """Put `peer` on the heap unless it is already there or sending."""
+        if peer in self._scheduled or peer in self._busy:
+            return
+        self._scheduled.add(peer)
+        heapq.heappush(self._heap, (ready_at, next(self._seq), peer))
+        self._wakeup.set()
+
+    async def _sleep_until(self, deadline: float) -> None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            ready_at, _, peer = self._heap[0]
+            deadline = max(ready_at, self._paused_until)
+            if deadline > time.monotonic():
+                # Sleep until the earliest peer is due (or a new one arrives)
+                await self._sleep_until(deadline)
+                continue
+            heapq.heappop(self._heap)
+            self._scheduled.discard(peer)
+            queue = self._queues.get(peer)
+            while queue and queue[0].future.done():
+                queue.popleft()  # caller gave up
+                self._queued -= 1
+            if not queue:
+                self._queues.pop(peer, None)
+                continue
+            now = time.monotonic()
+            peer_next = self._peer_next.get(peer, 0.0)
+            if peer_next > now:
+                self._schedule(peer, peer_next)
+                continue
+
+            await self._bucket.acquire()
+            if self._paused_until > time.monotonic():
+                # Throttled while waiting for a token
+                self._schedule(peer, self._paused_until)
+                continue
+            job = queue.popleft()
+            self._queued -= 1
+            self._busy.add(peer)
+            self._peer_next[peer] = time.monotonic() + self._peer_interval
+            if len(self._peer_next) > 10_000:
+                self._prune_peers()
+            task = asyncio.create_task(self._attempt(job))
+            self._attempts.add(task)
+            task.add_done_callback(self._attempts.discard)
+
+    def _prune_peers(self) -> None:
+        now = time.monotonic()
+        self._peer_next = {p: t for p, t in self._peer_next.items() if t > now}
+
+    async def _attempt(self, job: _Job) -> None:
+        try:
+            await self._send(job.peer, job.text)
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.set_exception(
+                    RuntimeError(f"{self._name} send scheduler stopped")
+                )
+            raise
+        except Exception as e:
+            delay = self._throttle_delay(e)
+            if delay is None or delay > self._max_wait:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                self._release(job.peer)
+                return
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            logger.warning(
+                "[%s] throttled for %.1fs; send to %s deferred",
+                self._name,
+                delay,
+                job.peer,
+            )
+            # Back to the head of the peer's queue, ahead of its later messages
+            self._queues.setdefault(job.peer, deque()).appendleft(job)
+            self._queued += 1
+            self._release(job.peer)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(None)
+            self._release(job.peer)
+
+    def _release(self, peer: str) -> None:
+        """The peer's send is over: schedule its next one, if any."""
+        self._busy.discard(peer)
+        if self._queues.get(peer):
+            self._schedule(
+                peer, max(self._peer_next.get(peer, 0.0), self._paused_until)
+            )
+        else:
+            self._queues.pop(peer, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "deferred": self._queued,
+            "peers": len(self._queues),
+            "in_flight": len(self._attempts),
+            "paused_for_seconds": round(max(0.0, self._paused_until - now), 3),
+            "oldest_wait_seconds": round(
+                max(
+                    (now - q[0].created_at for q in self._queues.values() if q),
+                    default=0.0,
+                ),
+                3,
+            ),
+            "sent": self.sent,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "bucket": self._bucket.stats(),
+        }
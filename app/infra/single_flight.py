@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Collapses concurrent calls with the same key into one execution.
+    - The first caller runs fn(); callers arriving while it is in flight await
+      the same result (or exception) instead of repeating the work.
+    - The call runs in its own task: a cancelled waiter does not cancel it for others.
+    - Nothing is remembered after completion (caching is the caller's job).
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, "asyncio.Future[T]"] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        fut = self._in_flight.get(key)
+        if fut is not None:
+            self.collapsed += 1
+        else:
+            self.executions += 1
+            fut = asyncio.ensure_future(fn())
+            self._in_flight[key] = fut
+            fut.add_done_callback(lambda _f: self._forget(key, fut))
+        return await asyncio.shield(fut)
+
+    def _forget(self, key: Hashable, fut: "asyncio.Future[T]") -> None:
+        if self._in_flight.get(key) is fut:
+            del self._in_flight[key]
+        # Mark the exception retrieved even if every waiter was cancelled
+        if not fut.cancelled():
+            fut.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,615 @@
+import abc
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from app.domain.ports import StateStore
+from app.infra.metrics import UNLOCKED_RUNS
+
+logger = logging.getLogger(__name__)
+
+
+class LockTimeout(TimeoutError):
+    """A per-key lock could not be acquired within its timeout."""
+
+    def __init__(self, key: str):
+        super().__init__(f"Timed out waiting for lock {key!r}")
+        self.key = key
+
+
+class _BaseStateStore(StateStore, abc.ABC):
+    """
+    Per-key locks on top of add()/delete-if-owner, shared by every backend.
+    A lock is a key holding a random token with a TTL (so a crashed holder
+    cannot block others forever); waiters poll with exponential backoff.
+    While the block runs, the holder extends the TTL every third of it, so long
+    jobs (media uploads) keep the lock; a lock found taken over is counted as lost.
+    """
+
+    shared = True
+
+    def __init__(self, *, lock_ttl: float = 30.0, lock_timeout: float = 30.0):
+        self._lock_ttl = lock_ttl
+        self._lock_timeout = lock_timeout
+        self.locks = 0
+        self.lock_waits = 0
+        self.lock_timeouts = 0
+        self.lock_losses = 0
+
+    @asynccontextmanager
+    async def lock(
+        self, key: str, *, ttl: Optional[float] = None, timeout: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        lock_key = f"lock:{key}"
+        token = os.urandom(12).hex()
+        deadline = time.monotonic() + (
+            self._lock_timeout if timeout is None else timeout
+        )
+        delay = 0.005
+        waited = False
+        while not await self.add(lock_key, token, ttl or self._lock_ttl):
+            if time.monotonic() >= deadline:
+                self.lock_timeouts += 1
+                raise LockTimeout(key)
+            if not waited:
+                waited = True
+                self.lock_waits += 1
+            await asyncio.sleep(delay)
+            delay = min(0.1, delay * 2)
+        self.locks += 1
+        renewal = asyncio.create_task(
+            self._keep_lock(key, lock_key, token, ttl or self._lock_ttl)
+        )
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+            try:
+                await self._release(lock_key, token)
+            except Exception as e:
+                # Expires on its own after the lock TTL
+                logger.warning("[state] releasing lock %s failed: %s", key, e)
+
+    async def _keep_lock(self, key: str, lock_key: str, token: str, ttl: float) -> None:
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                held = await self._extend(lock_key, token, ttl)
+            except Exception as e:
+                # Try again next round; the TTL still has two thirds left
+                logger.warning("[state] extending lock %s failed: %s", key, e)
+                continue
+            if not held:
+                self.lock_losses += 1
+                UNLOCKED_RUNS.inc("lock_lost")
+                logger.error(
+                    "[state] lock %s expired and was taken over; the rest of the "
+                    "block runs unlocked",
+                    key,
+                )
+                return
+
+    @abc.abstractmethod
+    async def _release(self, lock_key: str, token: str) -> None:
+        """Delete `lock_key` only if it still holds `token`."""
+
+    @abc.abstractmethod
+    async def _extend(self, lock_key: str, token: str, ttl: float) -> bool:
+        """Reset the TTL of `lock_key` if it still holds `token`; False if it does not."""
+
+    def _lock_stats(self) -> Dict[str, Any]:
+        return {
+            "acquired": self.locks,
+            "waits": self.lock_waits,
+            "timeouts": self.lock_timeouts,
+            "lost": self.lock_losses,
+        }
+
+
+@asynccontextmanager
+async def best_effort_lock(
+    state: Optional[StateStore], key: str, *, timeout: Optional[float] = None
+) -> AsyncIterator[None]:
+    """
+    Hold `state.lock(key)` around the block; without a state store, or when the lock
+    cannot be taken (store down, timeout), the block still runs unlocked, which is
+    logged and counted in gateway_unlocked_runs_total.
+    """
+    async with AsyncExitStack() as stack:
+        if state is not None:
+            try:
+                await stack.enter_async_context(state.lock(key, timeout=timeout))
+            except Exception as e:
+                reason = "timeout" if isinstance(e, LockTimeout) else "store_error"
+                UNLOCKED_RUNS.inc(reason)
+                logger.error(
+                    "[state] running without lock %s (%s), order not guaranteed: %s",
+                    key,
+                    reason,
+                    e,
+                )
+        yield
+
+
+class MemoryStateStore(_BaseStateStore):
+    """State of this process only (the default; nothing is shared)."""
+
+    shared = False
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._writes = 0
+
+    async def open(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        self._data.clear()
+
+    def _live(self, key: str) -> Optional[Tuple[Optional[float], Any]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] is not None and item[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def _store(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._writes += 1
+        if self._writes % 10_000 == 0:
+            now = time.monotonic()
+            for k in [k for k, (exp, _) in self._data.items() if exp and exp <= now]:
+                del self._data[k]
+
+    async def get(self, key: str) -> Any:
+        item = self._live(key)
+        return item[1] if item is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._store(key, value, ttl)
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        if self._live(key) is not None:
+            return False
+        self._store(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        item = self._live(key)
+        if item is None:
+            self._store(key, amount, ttl)
+            return amount
+        value = int(item[1]) + amount
+        self._data[key] = (item[0], value)
+        return value
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        item = self._live(lock_key)
+        if item is not None and item[1] == token:
+            del self._data[lock_key]
+
+    async def _extend(self, lock_key: str, token: str, ttl: float) -> bool:
+        item = self._live(lock_key)
+        if item is None or item[1] != token:
+            return False
+        self._data[lock_key] = (time.monotonic() + ttl, token)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "keys": len(self._data),
+            "locks": self._lock_stats(),
+        }
+
+
+class SqliteStateStore(_BaseStateStore):
+    """
+    State in a local SQLite file (WAL mode), shared by the processes of one host
+    (ingress workers, replicas on the same machine). Expired rows are ignored and
+    purged on open and every `purge_every` writes.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL
+        );
+    """
+
+    def __init__(self, path: str, *, purge_every: int = 10_000, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._path = path
+        self._purge_every = purge_every
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writes = 0
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._executor is None:
+            raise RuntimeError("State store is not open")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state")
+        purged = await self._run(self._open_sync)
+        logger.info("[state] sqlite store opened: %s (expired=%d)", self._path, purged)
+
+    def _open_sync(self) -> int:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self._SCHEMA)
+        self._conn = conn
+        return self._purge_sync()
+
+    def _purge_sync(self) -> int:
+        return self._conn.execute(
+            "DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        ).rowcount
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        await self._run(self._close_sync)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % self._purge_every == 0:
+            self._purge_sync()
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    async def get(self, key: str) -> Any:
+        return await self._run(self._get_sync, key)
+
+    def _get_sync(self, key: str) -> Any:
+        row = self._conn.execute(
+            "SELECT value FROM state WHERE key = ?"
+            " AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._run(self._set_sync, key, json.dumps(value), self._expiry(ttl))
+
+    def _set_sync(self, key: str, data: str, expires_at: Optional[float]) -> None:
+        self._conn.execute(
+            "INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET"
+            " value = excluded.value, expires_at = excluded.expires_at",
+            (key, data, expires_at),
+        )
+        self._wrote()
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self._run(
+            self._add_sync, key, json.dumps(value), self._expiry(ttl)
+        )
+
+    def _add_sync(self, key: str, data: str, expires_at: Optional[float]) -> bool:
+        # Inserts a new key or replaces an expired one; rowcount 0 = key is live
+        cur = self._conn.execute(
+            "INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET"
+            " value = excluded.value, expires_at = excluded.expires_at"
+            " WHERE state.expires_at IS NOT NULL AND state.expires_at <= ?",
+            (key, data, expires_at, time.time()),
+        )
+        self._wrote()
+        return cur.rowcount > 0
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._delete_sync, key, None)
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        await self._run(self._delete_sync, lock_key, json.dumps(token))
+
+    async def _extend(self, lock_key: str, token: str, ttl: float) -> bool:
+        return await self._run(
+            self._extend_sync, lock_key, json.dumps(token), self._expiry(ttl)
+        )
+
+    def _extend_sync(self, key: str, data: str, expires_at: Optional[float]) -> bool:
+        cur = self._conn.execute(
+            "UPDATE state SET expires_at = ? WHERE key = ? AND value = ?"
+            " AND (expires_at IS NULL OR expires_at > ?)",
+            (expires_at, key, data, time.time()),
+        )
+        return cur.rowcount > 0
+
+    def _delete_sync(self, key: str, only_value: Optional[str]) -> None:
+        if only_value is None:
+            self._conn.execute("DELETE FROM state WHERE key = ?", (key,))
+        else:
+            self._conn.execute(
+                "DELETE FROM state WHERE key = ? AND value = ?", (key, only_value)
+            )
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await self._run(self._incr_sync, key, amount, self._expiry(ttl))
+
+    def _incr_sync(self, key: str, amount: int, expires_at: Optional[float]) -> int:
+        # An expired counter starts over (and takes the new expiry)
+        row = self._conn.execute(
+            "INSERT INTO state (key, value, expires_at) VALUES (?1, ?2, ?3)"
+            " ON CONFLICT(key) DO UPDATE SET"
+            " value = CASE WHEN state.expires_at IS NOT NULL AND state.expires_at <= ?4"
+            "  THEN ?2 ELSE CAST(state.value AS INTEGER) + ?2 END,"
+            " expires_at = CASE WHEN state.expires_at IS NOT NULL AND state.expires_at <= ?4"
+            "  THEN ?3 ELSE state.expires_at END"
+            " RETURNING value",
+            (key, amount, expires_at, time.time()),
+        ).fetchone()
+        self._wrote()
+        return int(row[0])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "locks": self._lock_stats()}
+
+
+class RespError(RuntimeError):
+    """Error reply from a Redis-protocol server."""
+
+
+class _RespConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+
+    @staticmethod
+    def _encode(args: Tuple[Any, ...]) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    async def execute(self, *args: Any) -> Any:
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await self._read()
+
+    async def _read(self) -> Any:
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the state server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            return (await self._reader.readexactly(size + 2))[:-2]
+        if kind == b"*":
+            size = int(rest)
+            if size < 0:
+                return None
+            return [await self._read() for _ in range(size)]
+        raise ConnectionError(f"unexpected reply from the state server: {line!r}")
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class RespStateStore(_BaseStateStore):
+    """
+    State in a Redis-protocol server (Redis, Valkey, KeyDB, ...), shared by every
+    replica. Minimal RESP2 client: a pool of up to `pool_size` connections,
+    opened on demand; a connection that fails or times out is discarded.
+    `url`: redis://[user:password@]host[:port][/db] (rediss:// for TLS).
+    """
+
+    # Delete the lock only if we still hold it (it may have expired and moved on)
+    _RELEASE_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) else return 0 end"
+    )
+    # Extend the lock only while we still hold it
+    _EXTEND_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    )
+    # INCRBY and, for a new counter, its expiry in one atomic step: a crash between
+    # separate commands would leave a counter that never expires
+    _INCR_SCRIPT = (
+        "local value = redis.call('incrby', KEYS[1], ARGV[1]) "
+        "if tonumber(ARGV[2]) > 0 and value == tonumber(ARGV[1]) then "
+        "redis.call('pexpire', KEYS[1], ARGV[2]) end "
+        "return value"
+    )
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        prefix: str = "",
+        pool_size: int = 8,
+        timeout: float = 5.0,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        parts = urlsplit(url)
+        if parts.scheme not in ("redis", "rediss"):
+            raise ValueError(f"Unsupported state store URL: {url}")
+        self._host = parts.hostname or "localhost"
+        self._port = parts.port or 6379
+        self._ssl = parts.scheme == "rediss"
+        self._username = unquote(parts.username) if parts.username else None
+        self._password = unquote(parts.password) if parts.password else None
+        self._db = int(parts.path.lstrip("/") or 0)
+        self._prefix = prefix
+        self._timeout = timeout
+        self._slots = asyncio.Semaphore(max(1, pool_size))
+        self._idle: List[_RespConnection] = []
+        self.commands = 0
+        self.errors = 0
+
+    async def _connect(self) -> _RespConnection:
+        reader, writer = await asyncio.open_connection(
+            self._host, self._port, ssl=self._ssl or None
+        )
+        conn = _RespConnection(reader, writer)
+        if self._password:
+            auth = (
+                (self._username, self._password)
+                if self._username
+                else (self._password,)
+            )
+            await conn.execute("AUTH", *auth)
+        if self._db:
+            await conn.execute("SELECT", self._db)
+        return conn
+
+    async def _execute(self, *args: Any) -> Any:
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(self._connect(), self._timeout)
+                result = await asyncio.wait_for(conn.execute(*args), self._timeout)
+            except RespError:
+                self.errors += 1
+                if conn is not None:
+                    self._idle.append(conn)
+                raise
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                self.errors += 1
+                if conn is not None:
+                    conn.close()
+                raise ConnectionError(f"state server {self._host}:{self._port}: {e}")
+            except BaseException:
+                # Cancelled mid-command: the reply may still be unread, so the
+                # connection can not go back to the pool
+                if conn is not None:
+                    conn.close()
+                raise
+            self.commands += 1
+            self._idle.append(conn)
+            return result
+
+    def _key(self, key: str) -> str:
+        return self._prefix + key
+
+    @staticmethod
+    def _ttl_ms(ttl: Optional[float]) -> List[Any]:
+        return ["PX", max(1, int(ttl * 1000))] if ttl else []
+
+    async def open(self) -> None:
+        await self._execute("PING")
+        logger.info("[state] connected to %s:%s/%s", self._host, self._port, self._db)
+
+    async def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
+
+    async def get(self, key: str) -> Any:
+        data = await self._execute("GET", self._key(key))
+        return json.loads(data) if data is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._execute(
+            "SET", self._key(key), json.dumps(value), *self._ttl_ms(ttl)
+        )
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        reply = await self._execute(
+            "SET", self._key(key), json.dumps(value), "NX", *self._ttl_ms(ttl)
+        )
+        return reply is not None
+
+    async def delete(self, key: str) -> None:
+        await self._execute("DEL", self._key(key))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        # First increment of a new counter starts its window (0 = no expiry)
+        ttl_ms = max(1, int(ttl * 1000)) if ttl else 0
+        value = await self._execute(
+            "EVAL", self._INCR_SCRIPT, 1, self._key(key), amount, ttl_ms
+        )
+        return int(value)
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        await self._execute(
+            "EVAL", self._RELEASE_SCRIPT, 1, self._key(lock_key), json.dumps(token)
+        )
+
+    async def _extend(self, lock_key: str, token: str, ttl: float) -> bool:
+        reply = await self._execute(
+            "EVAL",
+            self._EXTEND_SCRIPT,
+            1,
+            self._key(lock_key),
+            json.dumps(token),
+            max(1, int(ttl * 1000)),
+        )
+        return bool(reply)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "connections_idle": len(self._idle),
+            "commands": self.commands,
+            "errors": self.errors,
+            "locks": self._lock_stats(),
+        }
+
+
+def build_state_store(
+    backend: str,
+    *,
+    path: str,
+    url: str,
+    prefix: str = "",
+    pool_size: int = 8,
+    lock_ttl: float = 30.0,
+    lock_timeout: float = 30.0,
+) -> StateStore:
+    """Create the configured store ("memory", "sqlite" or "redis")."""
+    locks = {"lock_ttl": lock_ttl, "lock_timeout": lock_timeout}
+    if backend == "memory":
+        return MemoryStateStore(**locks)
+    if backend == "sqlite":
+        return SqliteStateStore(path, **locks)
+    if backend == "redis":
+        return RespStateStore(url, prefix=prefix, pool_size=pool_size, **locks)
+    raise ValueError(f"Unknown state backend: {backend}")
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.infra.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# (kind, peer id, access hash); kind is "user", "chat" or "channel"
+PeerRef = Tuple[str, int, int]
+
+
+def recipient_keys(
+    *,
+    user_id: Optional[int] = None,
+    username: Optional[str] = None,
+    phone: Optional[str] = None,
+) -> List[str]:
+    """Cache keys under which one peer can be looked up."""
+    keys: List[str] = []
+    if user_id is not None:
+        keys.append(f"id:{int(user_id)}")
+    if username:
+        keys.append(f"username:{username.lstrip('@').lower()}")
+    if phone:
+        digits = re.sub(r"\D", "", phone)
+        if digits:
+            keys.append(f"phone:{digits}")
+    return keys
+
+
+class TelegramPeerCache:
+    """
+    Recipient -> peer reference (with access_hash) cache for Telegram sends.
+    - Keys are "id:<user_id>", "username:<name>" and "phone:<digits>".
+    - Entries live `ttl` seconds; recipients that could not be resolved are
+      remembered for `negative_ttl` seconds (memory only).
+    - With a `path`, positive entries are kept in SQLite and reloaded on start,
+      so replies after a restart resolve without any MTProto request.
+    - forget() drops a peer Telegram no longer accepts (stale access_hash).
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS peers (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            peer_id INTEGER NOT NULL,
+            access_hash INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(
+        self,
+        *,
+        path: Optional[str] = None,
+        ttl: float = 30 * 86400.0,
+        negative_ttl: float = 600.0,
+        max_size: int = 100_000,
+    ):
+        self._path = path
+        self._ttl = ttl
+        self._max_size = max_size
+        self._peers: TTLCache[PeerRef] = TTLCache(
+            max_size=max_size, ttl=ttl, negative_ttl=negative_ttl
+        )
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stored = 0
+        self.forgotten = 0
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        if not self._path or self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="telegram-peers"
+        )
+        rows = await self._run(self._open_sync)
+        now = time.time()
+        for key, kind, peer_id, access_hash, updated_at in rows:
+            self._peers.set(
+                key, (kind, peer_id, access_hash), ttl=self._ttl - (now - updated_at)
+            )
+        logger.info("[telegram] peer cache loaded: %d entries", len(rows))
+
+    def _open_sync(self) -> List[Tuple[str, str, int, int, float]]:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self._SCHEMA)
+        self._conn = conn
+        conn.execute(
+            "DELETE FROM peers WHERE updated_at < ?", (time.time() - self._ttl,)
+        )
+        # Oldest first, so the LRU keeps the most recently seen peers
+        return conn.execute(
+            "SELECT key, kind, peer_id, access_hash, updated_at FROM"
+            " (SELECT * FROM peers ORDER BY updated_at DESC LIMIT ?)"
+            " ORDER BY updated_at",
+            (self._max_size,),
+        ).fetchall()
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        await self._run(self._close_sync)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, recipient_key: str) -> Any:
+        """Return a PeerRef, NOT_FOUND (recently unresolvable) or None (unknown)."""
+        return self._peers.get(recipient_key)
+
+    def set_not_found(self, recipient_key: str) -> None:
+        self._peers.set_not_found(recipient_key)
+
+    async def remember(self, keys: Iterable[str], peer: PeerRef) -> None:
+        """Store a peer under every key; only writes to disk what changed."""
+        changed = [k for k in keys if self._peers.peek(k) != peer]
+        for k in changed:
+            self._peers.set(k, peer)
+        if not changed or self._executor is None:
+            return
+        now = time.time()
+        rows = [(k, peer[0], peer[1], peer[2], now) for k in changed]
+        try:
+            await self._run(self._store_sync, rows)
+            self.stored += len(rows)
+        except Exception as e:
+            logger.warning("[telegram] peer cache write failed: %s", e)
+
+    async def forget(self, peer_id: int) -> int:
+        """Drop every key of a peer whose access_hash Telegram rejected."""
+        dropped = self._peers.invalidate_where(
+            lambda _, v: isinstance(v, tuple) and v[1] == peer_id
+        )
+        self.forgotten += dropped
+        if self._executor is not None:
+            try:
+                await self._run(self._forget_sync, peer_id)
+            except Exception as e:
+                logger.warning("[telegram] peer cache delete failed: %s", e)
+        return dropped
+
+    def _forget_sync(self, peer_id: int) -> None:
+        self._conn.execute("DELETE FROM peers WHERE peer_id = ?", (peer_id,))
+
+    def _store_sync(self, rows: List[Tuple[str, str, int, int, float]]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO peers (key, kind, peer_id, access_hash, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._peers.stats(),
+            "stored": self.stored,
+            "forgotten": self.forgotten,
+            "persistent": self._executor is not None,
+        }
@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.infra.http_pool import HttpPool
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# W3C trace context header: version-trace_id-parent_id-flags
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation of a trace; the active span lives in a contextvar."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "kind",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+        "links",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        kind: int,
+        attributes: Dict[str, Any],
+        start_ns: Optional[int] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        # Spans of other traces this one relates to, e.g. messages merged into a batch
+        self.links: List[Tuple[str, str]] = []
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)}
+                for k, v in self.attributes.items()
+                if v is not None
+            ],
+            "status": (
+                {"code": 2, "message": self.error}
+                if self.error is not None
+                else {"code": 1}
+            ),
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        if self.links:
+            out["links"] = [
+                {"traceId": trace_id, "spanId": span_id}
+                for trace_id, span_id in self.links
+            ]
+        return out
+
+
+class OtlpJsonExporter:
+    """
+    Buffers finished spans and exports them every `flush_interval` seconds as
+    OTLP/JSON ExportTraceServiceRequest documents.
+    - `path`: appended one request per line (OpenTelemetry file exporter format).
+    - `endpoint`: POSTed to an OTLP/HTTP collector (e.g. .../v1/traces).
+    - At most `max_queue` spans wait for export; more are dropped and counted.
+    """
+
+    upstream = "otlp"
+
+    def __init__(
+        self,
+        *,
+        service_name: str,
+        path: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        http: Optional[HttpPool] = None,
+        flush_interval: float = 2.0,
+        max_queue: int = 10_000,
+    ):
+        self._service_name = service_name
+        self._path = path
+        self._endpoint = endpoint
+        self._http = http or HttpPool()
+        if endpoint:
+            self._http.register(
+                self.upstream, headers={"Content-Type": "application/json"}
+            )
+        self._flush_interval = flush_interval
+        self._max_queue = max_queue
+        self._queue: Deque[Span] = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def export(self, span: Span) -> None:
+        if len(self._queue) >= self._max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        if self._path:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="trace-export"
+            )
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(
+            "[tracing] exporting to %s",
+            ", ".join(filter(None, [self._path, self._endpoint])) or "nowhere",
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Export everything buffered so far; failures are logged, spans dropped."""
+        if not self._queue:
+            return
+        spans: List[Span] = list(self._queue)
+        self._queue.clear()
+        body = json.dumps(self._request_body(spans), separators=(",", ":"))
+        try:
+            if self._executor is not None:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self._executor, self._append_sync, body)
+            if self._endpoint:
+                resp = await self._http.client(self.upstream).post(
+                    self._endpoint, content=body
+                )
+                resp.raise_for_status()
+            self.exported += len(spans)
+        except Exception as e:
+            self.failed += len(spans)
+            logger.warning("[tracing] export of %d spans failed: %s", len(spans), e)
+
+    def _append_sync(self, line: str) -> None:
+        with open(self._path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def _request_body(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self._service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "app"},
+                            "spans": [s.to_otlp() for s in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+class Tracer:
+    """
+    Creates spans for sampled traces; a no-op until configure() is called.
+    - trace() starts a trace at an ingress point (webhook, Telegram update) or
+      continues one from a W3C traceparent; `sample_ratio` decides per new trace.
+    - span() records a child of the active span, and does nothing when the current
+      message is not sampled, so instrumentation is cheap to leave on.
+    - linked() starts a trace for a batch, linked to the traces it was built from.
+    The active span follows asyncio tasks through contextvars; code that hands work
+    to another task (lanes, queues) passes the span along with use() or traceparent.
+    """
+
+    def __init__(self):
+        self._exporter: Optional[OtlpJsonExporter] = None
+        self._sample_ratio = 0.0
+
+    def configure(self, exporter: OtlpJsonExporter, sample_ratio: float) -> None:
+        self._exporter = exporter
+        self._sample_ratio = min(1.0, max(0.0, sample_ratio))
+
+    @contextmanager
+    def trace(
+        self,
+        name: str,
+        *,
+        traceparent: Optional[str] = None,
+        kind: int = KIND_SERVER,
+        **attributes: Any,
+    ) -> Iterator[Optional[Span]]:
+        if self._exporter is None:
+            yield None
+            return
+        parent = _parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = random.random() < self._sample_ratio
+        if not sampled:
+            token = _current.set(None)
+            try:
+                yield None
+            finally:
+                _current.reset(token)
+            return
+        with self._record(Span(name, trace_id, parent_id, kind, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def resume(
+        self,
+        name: str,
+        traceparent: Optional[str],
+        *,
+        kind: int = KIND_INTERNAL,
+        **attributes: Any,
+    ) -> Iterator[Optional[Span]]:
+        """Continue a trace handed over through a queue; untraced work stays untraced."""
+        if not traceparent:
+            yield None
+            return
+        with self.trace(name, traceparent=traceparent, kind=kind, **attributes) as span:
+            yield span
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        *,
+        kind: int = KIND_INTERNAL,
+        start_ns: Optional[int] = None,
+        **attributes: Any,
+    ) -> Iterator[Optional[Span]]:
+        """
+        Child of the active span; `start_ns` backdates it, e.g. to when the work was
+        queued, so the span covers the wait.
+        """
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(name, parent.trace_id, parent.span_id, kind, attributes, start_ns)
+        with self._record(span):
+            yield span
+
+    @contextmanager
+    def linked(
+        self,
+        name: str,
+        links: Sequence[Optional[Span]],
+        *,
+        kind: int = KIND_INTERNAL,
+        start_ns: Optional[int] = None,
+        **attributes: Any,
+    ) -> Iterator[Optional[Span]]:
+        """
+        Start a new trace for work done on behalf of several traced operations (a
+        batch), linked to their spans; nothing is recorded if none of them is traced.
+        """
+        sources = [s for s in links if s is not None]
+        if self._exporter is None or not sources:
+            yield None
+            return
+        span = Span(name, os.urandom(16).hex(), None, kind, attributes, start_ns)
+        span.links = [(s.trace_id, s.span_id) for s in sources]
+        with self._record(span):
+            yield span
+
+    @contextmanager
+    def _record(self, span: Span) -> Iterator[Span]:
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            if self._exporter is not None:
+                self._exporter.export(span)
+
+
+def _parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    if not value:
+        return None
+    m = TRACEPARENT_RE.match(value.strip().lower())
+    if not m:
+        return None
+    return m.group(1), m.group(2), bool(int(m.group(3), 16) & 1)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent of the active span (None when the message is not traced)."""
+    span = _current.get()
+    return span.traceparent if span is not None else None
+
+
+@contextmanager
+def use(span: Optional[Span]) -> Iterator[Optional[Span]]:
+    """Make `span` the active parent in another task (without ending it)."""
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+TRACER = Tracer()
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# VK allows at most 25 API calls inside one execute request
+VK_EXECUTE_MAX_CALLS = 25
+# Keep the generated VKScript well below the request size limits
+VK_EXECUTE_MAX_CODE_LENGTH = 60_000
+
+# (method, params) -> full VK response body ({"response": ...} or {"error": ...})
+RequestFn = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class VkApiError(RuntimeError):
+    def __init__(self, code: Any, message: Any):
+        super().__init__(f"VK API error {code}: {message}")
+        self.code = code
+
+
+class VkExecuteBatcher:
+    """
+    Packs concurrent calls of one VK method into `execute` requests.
+    - Calls made within `window` seconds are sent together, up to `max_calls` per
+      execute (VK's limit is 25); a lone call is sent as a plain request.
+    - Each caller gets its own result; failed calls inside an execute are matched to
+      their entry in `execute_errors` and raised as VkApiError for that caller only.
+    """
+
+    def __init__(
+        self,
+        *,
+        request: RequestFn,
+        method: str,
+        window: float = 0.01,
+        max_calls: int = VK_EXECUTE_MAX_CALLS,
+    ):
+        self._request = request
+        self._method = method
+        self._window = window
+        self._max_calls = max(1, min(max_calls, VK_EXECUTE_MAX_CALLS))
+        self._pending: List[Tuple[Dict[str, Any], str, asyncio.Future]] = []
+        self._pending_code_length = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.calls = 0
+        self.requests = 0
+        self.executes = 0
+
+    async def call(self, params: Dict[str, Any]) -> Any:
+        """Queue one call and return its `response` value."""
+        self.calls += 1
+        # Callers' params (not the shared access token) are embedded into the script
+        expr = f"API.{self._method}({json.dumps(params, ensure_ascii=False)})"
+        if self._pending and (
+            self._pending_code_length + len(expr) > VK_EXECUTE_MAX_CODE_LENGTH
+        ):
+            self._flush()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((params, expr, fut))
+        self._pending_code_length += len(expr) + 1
+        if len(self._pending) >= self._max_calls:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._window, self._flush)
+        return await asyncio.shield(fut)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        self._pending_code_length = 0
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._send_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(
+        self, batch: List[Tuple[Dict[str, Any], str, asyncio.Future]]
+    ) -> None:
+        self.requests += 1
+        try:
+            if len(batch) == 1:
+                params, _, fut = batch[0]
+                data = await self._request(self._method, params)
+                _resolve(fut, data)
+                return
+            self.executes += 1
+            code = "return [" + ",".join(expr for _, expr, _ in batch) + "];"
+            data = await self._request("execute", {"code": code})
+        except Exception as e:
+            for *_, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        if "error" in data:
+            # The whole execute was rejected (auth, rate limit, bad script, ...)
+            for *_, fut in batch:
+                _resolve(fut, data)
+            return
+
+        results = data.get("response") or []
+        errors = list(data.get("execute_errors") or [])
+        for i, (_, _, fut) in enumerate(batch):
+            result = results[i] if i < len(results) else False
+            if result is False:
+                # Failed calls return false; their errors are listed in call order
+                err = errors.pop(0) if errors else {}
+                _resolve(fut, {"error": err or {"error_msg": "execute call failed"}})
+            else:
+                _resolve(fut, {"response": result})
+        logger.debug("[vk] execute sent %d %s calls", len(batch), self._method)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "requests": self.requests,
+            "executes": self.executes,
+            "pending": len(self._pending),
+        }
+
+
+def _resolve(fut: asyncio.Future, data: Dict[str, Any]) -> None:
+    if fut.done():
+        return
+    if "error" in data:
+        err = data["error"] or {}
+        fut.set_exception(VkApiError(err.get("error_code"), err.get("error_msg")))
+    else:
+        fut.set_result(data.get("response"))
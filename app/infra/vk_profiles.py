@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from app.infra.cache import NOT_FOUND, TTLCache
+from app.infra.http_pool import HttpPool
+from app.infra.rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# users.get accepts up to 1000 ids per call
+VK_USERS_GET_MAX_IDS = 1000
+
+
+class VkProfileResolver:
+    """
+    Cached, micro-batched VK users.get lookups for contact enrichment.
+    - Profiles are cached (TTL, bounded LRU); unknown ids are negatively cached.
+    - Concurrent lookups within `batch_window` seconds are coalesced into one
+      users.get request and each waiter receives its own profile.
+    - Failures resolve to {} (enrichment is best effort) and are not cached.
+    """
+
+    def __init__(
+        self,
+        *,
+        http: HttpPool,
+        upstream: str,
+        access_token: str,
+        api_version: str,
+        fields: str = "bdate,city,screen_name",
+        ttl: float = 86400.0,
+        max_size: int = 50_000,
+        batch_window: float = 0.005,
+        max_batch: int = 100,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self._http = http
+        self._upstream = upstream
+        self._access_token = access_token
+        self._api_version = api_version
+        self._fields = fields
+        self._limiter = limiter
+        self._cache: TTLCache[Dict[str, Any]] = TTLCache(
+            max_size=max_size, ttl=ttl, negative_ttl=min(ttl, 3600.0)
+        )
+        self._batch_window = batch_window
+        self._max_batch = max(1, min(max_batch, VK_USERS_GET_MAX_IDS))
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.requested_ids = 0
+        self.coalesced = 0
+
+    async def get(self, user_id: str) -> Dict[str, Any]:
+        """Return the profile for one user id ({} if unknown or on error)."""
+        uid = str(user_id)
+        cached = self._cache.get(uid)
+        if cached is NOT_FOUND:
+            return {}
+        if cached is not None:
+            return cached
+
+        fut = self._pending.get(uid)
+        if fut is not None:
+            self.coalesced += 1
+        else:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            self._pending[uid] = fut
+            if len(self._pending) >= self._max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self._batch_window, self._flush)
+        # Shield: one cancelled waiter must not cancel the shared future
+        return await asyncio.shield(fut)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._fetch_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch_batch(self, batch: Dict[str, asyncio.Future]) -> None:
+        ids: List[str] = list(batch.keys())
+        params = {
+            "user_ids": ",".join(ids),
+            "fields": self._fields,
+            "access_token": self._access_token,
+            "v": self._api_version,
+        }
+        profiles: Dict[str, Dict[str, Any]] = {}
+        try:
+            self.requests += 1
+            self.requested_ids += len(ids)
+            if self._limiter:
+                await self._limiter.acquire()
+            r = await self._http.client(self._upstream).get(
+                "/users.get", params=params, timeout=10.0
+            )
+            r.raise_for_status()
+            data = r.json() or {}
+            if "error" in data:
+                err = data["error"]
+                raise RuntimeError(
+                    f"VK API error {err.get('error_code')}: {err.get('error_msg')}"
+                )
+            for item in data.get("response") or []:
+                profiles[str(item.get("id"))] = item
+        except Exception as e:
+            logger.warning("[vk] users.get failed for %d ids: %s", len(ids), e)
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_result({})
+            return
+
+        for uid, fut in batch.items():
+            profile = profiles.get(uid)
+            if profile is None:
+                self._cache.set_not_found(uid)
+            else:
+                self._cache.set(uid, profile)
+            if not fut.done():
+                fut.set_result(profile or {})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self._cache.stats(),
+            "requests": self.requests,
+            "requested_ids": self.requested_ids,
+            "coalesced": self.coalesced,
+            "pending": len(self._pending),
+        }
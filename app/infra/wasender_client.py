@@ -1,28 +1,193 @@
+import asyncio
+import hashlib
 import logging
+import random
+from email.utils import parsedate_to_datetime
+from time import time
+from typing import Any, Dict, Optional
 
 import httpx
 
+from app.domain.ports import StateStore
+from app.infra.circuit_breaker import CircuitBreaker
+from app.infra.http_pool import HttpPool
+from app.infra.rate_limit import build_rate_limiter
+
 logger = logging.getLogger(__name__)
 
+# Responses worth retrying: rate limited or upstream trouble
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or HTTP date)."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
 
 class WasenderClient:
-    """Minimal async client for sending text messages via Wasender API (demo only)."""
+    """
+    Async client for sending text messages via Wasender API (and resolving inbound
+    media).
+    - Requests, retries included, are paced by a token bucket (`send_rate` per
+      second, 0 = unlimited).
+    - Timeouts, connection errors, 429 and 5xx are retried with exponential backoff
+      and jitter, honoring Retry-After.
+    - After `breaker_threshold` failed sends in a row the circuit opens and sends fail
+      fast with CircuitOpenError (the outbound queue keeps them) until a probe succeeds.
+    """
+
+    upstream = "wasender"
 
-    def __init__(self, api_key: str, base_url: str = "https://www.wasenderapi.com/api"):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://www.wasenderapi.com/api",
+        http: Optional[HttpPool] = None,
+        *,
+        send_rate: float = 0.0,
+        send_burst: Optional[float] = None,
+        timeout: float = 15.0,
+        max_retries: int = 3,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 30.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+        state: Optional[StateStore] = None,
+    ):
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
         self._headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        self._http = http or HttpPool()
+        self._http.register(
+            self.upstream, headers=self._headers, warmup_url=f"{self.base_url}/"
+        )
+        # Shared between replicas per API key (hashed: keys end up in the state store)
+        self._limiter = build_rate_limiter(
+            send_rate,
+            send_burst,
+            state=state,
+            key="wasender:" + hashlib.sha256(api_key.encode()).hexdigest()[:16],
+        )
+        self._timeout = timeout
+        self._max_retries = max(0, max_retries)
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        self.breaker = CircuitBreaker(
+            self.upstream,
+            failure_threshold=breaker_threshold,
+            reset_timeout=breaker_reset,
+        )
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after
+        delay = min(self._retry_max_delay, self._retry_base_delay * 2**attempt)
+        # Full jitter: spread retries of concurrent senders
+        return random.uniform(0, delay)
 
     async def send_text(self, to: str, text: str) -> dict:
         """Send a plain text message. Adjust endpoint if your Wasender differs."""
+        self.breaker.before_call()
+        try:
+            data = await self._send_with_retries(to, text)
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in RETRYABLE_STATUSES:
+                self.breaker.record_failure()
+            else:
+                # Our request is wrong (bad number, auth, ...): upstream is healthy
+                self.breaker.record_success()
+            raise
+        except Exception:
+            # Any other outcome (transport errors, a malformed reply) counts as a
+            # failure, which also ends a half-open probe
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return data
+
+    async def _send_with_retries(self, to: str, text: str) -> dict:
         payload = {"to": to, "text": text}
         url = f"{self.base_url}/send-message"
-        async with httpx.AsyncClient(headers=self._headers, timeout=15) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            logger.info("[wasender] API send_message ok: to=%s", to)
-            return data
+        client = self._http.client(self.upstream)
+
+        attempt = 0
+        while True:
+            # Retries are requests too: each one spends a token of the rate budget
+            await self._limiter.acquire()
+            self.attempts += 1
+            retry_after: Optional[float] = None
+            try:
+                resp = await client.post(url, json=payload, timeout=self._timeout)
+                if resp.status_code in RETRYABLE_STATUSES:
+                    retry_after = _retry_after_seconds(resp)
+                resp.raise_for_status()
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error: Exception = e
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUSES:
+                    raise
+                error = e
+            else:
+                data = resp.json()
+                logger.info("[wasender] API send_message ok: to=%s", to)
+                return data
+
+            delay = self._backoff(attempt, retry_after)
+            if attempt >= self._max_retries or delay > self._retry_max_delay:
+                self.failures += 1
+                raise error
+            attempt += 1
+            self.retries += 1
+            logger.warning(
+                "[wasender] send_message failed (%s); retry %d/%d in %.1fs",
+                error,
+                attempt,
+                self._max_retries,
+                delay,
+            )
+            await asyncio.sleep(delay)
+
+    async def decrypt_media(self, message: Dict[str, Any]) -> str:
+        """
+        Resolve an inbound media message (the webhook's data.messages object) into a
+        temporary public URL of the decrypted file.
+        """
+        client = self._http.client(self.upstream)
+        resp = await client.post(
+            f"{self.base_url}/decrypt-media",
+            json={"data": {"messages": message}},
+            timeout=self._timeout,
+        )
+        resp.raise_for_status()
+        url = (resp.json() or {}).get("publicUrl")
+        if not url:
+            raise RuntimeError("decrypt-media returned no publicUrl")
+        return url
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "failures": self.failures,
+            "breaker": self.breaker.stats(),
+            "limiter": self._limiter.stats(),
+        }
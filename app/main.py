@@ -1,20 +1,35 @@
 import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict, List
 
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI
-from pyee.asyncio import AsyncIOEventEmitter
 
 from app.application.events import wire_events
+from app.application.outbox import OutboundDispatcher
 from app.application.router import MessageRouter
-from app.config import load_config
+from app.config import BUS_TOPICS, load_config
 from app.delivery.http import create_router
 from app.infra.adapters.telegram_telethon import TelegramAdapter
 from app.infra.adapters.vk_bot import VkAdapter
 from app.infra.adapters.whatsapp_wasender import WasenderAdapter
+from app.infra.dedupe import DedupeStore
+from app.infra.event_bus import BusFull, EventBus, TopicSettings
+from app.infra.http_pool import HttpPool
+from app.infra.ipc import IpcClient, IpcServer
+from app.infra.journal import (
+    JOURNAL_ID_KEY,
+    InboundJournal,
+    inbound_message,
+    publish_inbound,
+)
+from app.infra.metrics import BUS_TASKS_IN_FLIGHT
+from app.infra.outbox_store import build_outbox_store
+from app.infra.state_store import build_state_store
+from app.infra.tracing import TRACER, OtlpJsonExporter
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
@@ -24,48 +39,290 @@ logging.basicConfig(
 load_dotenv()
 config = load_config()
 
-# Shared event bus
-bus = AsyncIOEventEmitter()
+# Process role. "all": everything in one process (single uvicorn worker).
+# "ingress": stateless webhook workers that hand events to the connector over IPC.
+# "connector": one process owning Telegram, the journal, the outbox and all senders.
+ingress_only = config.ipc.role == "ingress"
+
+# Shared event bus: bounded queue and workers per topic
+bus = EventBus(
+    default=TopicSettings(
+        queue_size=config.bus.queue_size,
+        workers=config.bus.workers,
+        overflow=config.bus.overflow,
+    ),
+    topics={
+        topic: TopicSettings(
+            queue_size=config.bus.queue_size_per_topic.get(
+                topic, config.bus.queue_size
+            ),
+            workers=config.bus.workers_per_topic.get(topic, config.bus.workers),
+            overflow=config.bus.overflow_per_topic.get(topic, config.bus.overflow),
+        )
+        for topic in BUS_TOPICS
+    },
+    spill_path=config.bus.spill_path,
+    drain_timeout=config.bus.drain_timeout,
+)
+BUS_TASKS_IN_FLIGHT.set_function(bus.in_flight)
+
+# Shared keep-alive HTTP pools (one client per upstream, opened in lifespan)
+http_pool = HttpPool(config.http)
+
+# Write-ahead journal: inbound webhooks are durable before they are acknowledged
+journal = (
+    InboundJournal(
+        config.journal.path,
+        commit_interval=config.journal.commit_interval_ms / 1000.0,
+        max_batch=config.journal.max_batch,
+        max_replays=config.journal.max_replays,
+    )
+    if config.journal.enabled and not ingress_only
+    else None
+)
+
+# Sampled per-message traces, exported as OTLP/JSON
+trace_exporter = (
+    OtlpJsonExporter(
+        service_name=config.tracing.service_name,
+        path=config.tracing.path,
+        endpoint=config.tracing.otlp_endpoint,
+        http=http_pool,
+        flush_interval=config.tracing.flush_interval,
+        max_queue=config.tracing.max_queue,
+    )
+    if config.tracing.enabled
+    else None
+)
+if trace_exporter:
+    TRACER.configure(trace_exporter, config.tracing.sample_ratio)
 
-# Build adapters registry only for configured channels
+# State shared by replicas (Chatwoot ids, dedupe ids, rate budgets, per-user locks);
+# the default in-memory store keeps everything local to this process
+state_store = build_state_store(
+    config.state.backend,
+    path=config.state.path,
+    url=config.state.url,
+    prefix=config.state.prefix,
+    pool_size=config.state.pool_size,
+    lock_ttl=config.state.lock_ttl,
+    lock_timeout=config.state.lock_timeout,
+)
+shared_state = state_store if state_store.shared else None
+
+# Redelivered webhooks/updates (same message or event id) are processed once
+dedupe = (
+    DedupeStore(
+        max_size=config.dedupe.max_size,
+        ttl=config.dedupe.ttl,
+        path=config.dedupe.path if config.dedupe.persistent else None,
+        state=shared_state,
+    )
+    if config.dedupe.enabled
+    else None
+)
+
+# Build adapters registry only for configured channels (none in ingress workers)
 adapters: Dict[str, Any] = {}
 
-if config.wasender:
-    adapters["whatsapp"] = WasenderAdapter(bus=bus, config=config.wasender)
+if config.wasender and not ingress_only:
+    adapters["whatsapp"] = WasenderAdapter(
+        bus=bus, config=config.wasender, http=http_pool, state=shared_state
+    )
+
+if config.telegram and not ingress_only:
+    adapters["telegram"] = TelegramAdapter(
+        bus=bus, config=config.telegram, journal=journal, dedupe=dedupe
+    )
 
-if config.telegram:
-    adapters["telegram"] = TelegramAdapter(bus=bus, config=config.telegram)
+if config.vk and not ingress_only:
+    adapters["vk"] = VkAdapter(
+        bus=bus, config=config.vk, http=http_pool, state=shared_state
+    )
 
-if config.vk:
-    adapters["vk"] = VkAdapter(bus=bus, config=config.vk)
+# Durable outbound queue: agent replies survive restarts and are sent per recipient in order
+outbox = (
+    OutboundDispatcher(
+        store=build_outbox_store(config.outbox.backend, config.outbox.path),
+        adapters=adapters,
+        workers_per_channel=config.outbox.workers_per_channel,
+        default_workers=config.outbox.workers,
+        max_attempts=config.outbox.max_attempts,
+        retry_base_delay=config.outbox.retry_base_delay,
+        retry_max_delay=config.outbox.retry_max_delay,
+    )
+    if config.outbox.enabled and not ingress_only
+    else None
+)
 
-router = MessageRouter(adapters=adapters)
+router = MessageRouter(adapters=adapters, outbox=outbox)
 
 # Wire adapter incoming → application router (existing behavior)
 for a in adapters.values():
     a.on_message(router.handle_incoming)
 
+# Runtime statistics exposed on GET /stats
+stats_providers = {
+    "http": http_pool.stats,
+    "bus": bus.stats,
+    "state": state_store.stats,
+}
+if outbox:
+    stats_providers["outbox"] = outbox.stats
+if journal:
+    stats_providers["journal"] = journal.stats
+if dedupe:
+    stats_providers["dedupe"] = dedupe.stats
+if trace_exporter:
+    stats_providers["tracing"] = trace_exporter.stats
+if "whatsapp" in adapters:
+    stats_providers["wasender_api"] = adapters["whatsapp"].stats
+if "vk" in adapters:
+    stats_providers["vk_api"] = adapters["vk"].stats
+if "telegram" in adapters:
+    stats_providers["telegram_sender"] = adapters["telegram"].scheduler.stats
+    stats_providers["telegram_peers"] = adapters["telegram"].peers.stats
+    stats_providers["telegram_senders"] = adapters["telegram"].sender_cache_stats
+
 # Wire bus event handlers (moved out of main into application layer)
-wire_events(bus=bus, config=config, adapters=adapters, router=router)
+shutdown_hooks: List[Callable[[], Awaitable[None]]] = []
+chatwoot_service = (
+    wire_events(
+        bus=bus,
+        config=config,
+        adapters=adapters,
+        router=router,
+        http=http_pool,
+        stats=stats_providers,
+        journal=journal,
+        state=state_store,
+        shutdown=shutdown_hooks,
+    )
+    if not ingress_only
+    else None
+)
+
+
+async def _on_ipc_event(topic: str, payload: Dict[str, Any]) -> None:
+    """Accept an event handed over by an ingress worker, as the HTTP routes would."""
+    if topic == "chatwoot.outgoing" and outbox:
+        # Persist agent replies before the ingress acknowledges the webhook
+        await router.handle_outgoing(payload)
+    elif topic in ("wasender.incoming", "vk.incoming"):
+        # Validated once here; listeners reuse the message object
+        inbound_message(payload)
+        await publish_inbound(bus, journal, topic, payload)
+    else:
+        await bus.publish(topic, payload)
+
+
+# Split deployment: ingress workers publish through the connector's Unix socket
+ipc_client = (
+    IpcClient(config.ipc.socket_path, timeout=config.ipc.timeout)
+    if ingress_only
+    else None
+)
+ipc_server = (
+    IpcServer(config.ipc.socket_path, _on_ipc_event)
+    if config.ipc.role == "connector"
+    else None
+)
+if ipc_client:
+    stats_providers["ipc"] = ipc_client.stats
+if ipc_server:
+    stats_providers["ipc"] = ipc_server.stats
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Log here (server process only; avoids duplicate logs from reloader)
-    logging.info("adapters configured: %s", list(adapters.keys()))
+    logging.info(
+        "role=%s, adapters configured: %s", config.ipc.role, list(adapters.keys())
+    )
+    if ingress_only and dedupe and not config.dedupe.persistent and not shared_state:
+        logging.warning(
+            "[dedupe] ingress workers keep seen ids per process;"
+            " set DEDUPE_PERSISTENT=true or a shared STATE_BACKEND to share them"
+        )
+    await http_pool.start()
+    if trace_exporter:
+        await trace_exporter.start()
+    await state_store.open()
+    await bus.start()
+    if journal:
+        await journal.open()
+    if dedupe:
+        await dedupe.open()
     await asyncio.gather(
         *(a.start() for a in adapters.values()), return_exceptions=True
     )
+    if outbox:
+        await outbox.start()
+    if journal:
+        # Re-process inbound events that were accepted but never reached Chatwoot
+        for entry_id, topic, payload in await journal.replay():
+            payload[JOURNAL_ID_KEY] = entry_id
+            try:
+                inbound_message(payload)
+            except Exception as e:
+                # Written by an older release (raw webhook body) or corrupted;
+                # left pending, it is parked as dead after JOURNAL_MAX_REPLAYS
+                logging.warning("[journal] entry %s not replayable: %s", entry_id, e)
+                continue
+            try:
+                await bus.publish(topic, payload)
+            except BusFull:
+                # Stays in the journal and is replayed on the next start
+                logging.warning(
+                    "[journal] bus full, replay of entry %s deferred", entry_id
+                )
+    if ipc_server:
+        await ipc_server.start()
     try:
         yield
     finally:
+        if ipc_server:
+            await ipc_server.stop()
+        if ipc_client:
+            await ipc_client.aclose()
+        # Finish queued events first: their handlers use everything below
+        await bus.stop()
+        for hook in shutdown_hooks:
+            await hook()
+        if outbox:
+            await outbox.stop()
         await asyncio.gather(
             *(a.stop() for a in adapters.values()), return_exceptions=True
         )
+        if journal:
+            await journal.close()
+        if dedupe:
+            await dedupe.close()
+        await state_store.close()
+        if trace_exporter:
+            await trace_exporter.stop()
+        await http_pool.aclose()
 
 
 app = FastAPI(title="Messaging Bridge", version="0.1.0", lifespan=lifespan)
-app.include_router(create_router(bus=bus, config=config))
+app.include_router(
+    create_router(
+        bus=ipc_client or bus,
+        config=config,
+        stats=stats_providers,
+        # Persist agent replies before acknowledging the Chatwoot webhook
+        on_outgoing=router.handle_outgoing if outbox else None,
+        journal=journal,
+        dedupe=dedupe,
+    )
+)
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, log_level="info")
+    uvicorn.run(
+        "app.main:app",
+        host=os.getenv("HOST") or "127.0.0.1",
+        port=int(os.getenv("PORT") or 8000),
+        # Only ingress workers are stateless enough to run in several processes
+        workers=config.ipc.ingress_workers if ingress_only else 1,
+        log_level="info",
+    )
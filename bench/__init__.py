@@ -0,0 +1 @@
+"""Offline benchmark: fake upstreams and a webhook load generator (python -m bench)."""
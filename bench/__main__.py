@@ -0,0 +1,207 @@
+"""
+End-to-end gateway benchmark against in-process fake upstreams (fully offline).
+
+    python -m bench --messages 2000 --concurrency 64 --mix whatsapp=1,vk=1,chatwoot=1
+
+Webhooks are sent to the real FastAPI app from app.main over an in-process ASGI
+transport; Chatwoot, Wasender and VK are replaced with fakes mounted on the app's
+HTTP pool. Gateway tuning variables (outbox, journal, rate limits, ...) are read
+from the environment as usual, so runs of different releases/settings compare.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+from typing import Any, Dict
+
+import httpx
+
+from bench.load import CHANNELS, LoadGenerator, WebhookFactory
+from bench.upstreams import (
+    DeliveryLog,
+    FakeChatwoot,
+    FakeUpstream,
+    FakeVk,
+    FakeWasender,
+    UpstreamBehavior,
+)
+
+# Credentials of the fake upstreams; Telegram stays disabled (it needs MTProto)
+BENCH_ENV = {
+    "CHATWOOT_API_ACCESS_TOKEN": "bench",
+    "CHATWOOT_ACCOUNT_ID": "1",
+    "CHATWOOT_BASE_URL": "http://chatwoot.bench",
+    "CHATWOOT_WEBHOOK_ID_WHATSAPP": "bench-cw-whatsapp",
+    "CHATWOOT_WEBHOOK_ID_VK": "bench-cw-vk",
+    "CHATWOOT_WEBHOOK_ID_TELEGRAM": "",
+    "WASENDER_WEBHOOK_ID": "bench-wasender",
+    "WASENDER_WEBHOOK_SECRET": "bench-secret",
+    "WASENDER_API_KEY": "bench",
+    "WASENDER_INBOX_ID": "1",
+    "VK_CALLBACK_ID": "bench-vk",
+    "VK_GROUP_ID": "1",
+    "VK_ACCESS_TOKEN": "bench",
+    "VK_SECRET": "bench-secret",
+    "VK_CONFIRMATION": "bench",
+    "VK_INBOX_ID": "2",
+    "TG_API_ID": "",
+    "TG_API_HASH": "",
+    "TG_SESSION_NAME": "",
+    "HTTP_WARMUP": "false",
+}
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in CHANNELS:
+            raise argparse.ArgumentTypeError(
+                f"unknown channel {name!r} (expected {', '.join(CHANNELS)})"
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m bench", description=__doc__.strip())
+    p.add_argument("--messages", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=32, help="webhooks in flight")
+    p.add_argument(
+        "--rate", type=float, default=0.0, help="target msgs/s (0 = unpaced)"
+    )
+    p.add_argument("--users", type=int, default=100, help="distinct senders")
+    p.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=_parse_mix("whatsapp=1,vk=1,chatwoot=1"),
+        help="channel weights, e.g. whatsapp=2,vk=1,chatwoot=1",
+    )
+    p.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=30.0,
+        help="seconds to wait for accepted messages to be delivered",
+    )
+    for name in ("chatwoot", "wasender", "vk"):
+        p.add_argument(f"--{name}-latency-ms", type=float, default=20.0)
+        p.add_argument(f"--{name}-jitter-ms", type=float, default=5.0)
+        p.add_argument(
+            f"--{name}-error-rate",
+            type=float,
+            default=0.0,
+            help="share of requests answered with an injected 5xx",
+        )
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    p.add_argument("--log-level", default="WARNING")
+    return p.parse_args()
+
+
+def _behavior(args: argparse.Namespace, name: str) -> UpstreamBehavior:
+    return UpstreamBehavior(
+        latency_ms=getattr(args, f"{name}_latency_ms"),
+        jitter_ms=getattr(args, f"{name}_jitter_ms"),
+        error_rate=getattr(args, f"{name}_error_rate"),
+    )
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Imported late: app.main builds everything from the environment on import
+    import app.main as gateway
+
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    log = DeliveryLog()
+    upstreams: Dict[str, FakeUpstream] = {
+        "chatwoot": FakeChatwoot(log, _behavior(args, "chatwoot")),
+        "wasender": FakeWasender(log, _behavior(args, "wasender")),
+        "vk": FakeVk(log, _behavior(args, "vk")),
+    }
+    for name, fake in upstreams.items():
+        gateway.http_pool.mount(name, fake.transport())
+
+    transport = httpx.ASGITransport(app=gateway.app)
+    async with gateway.app.router.lifespan_context(gateway.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://gateway.bench"
+        ) as client:
+            generator = LoadGenerator(
+                client=client,
+                factory=WebhookFactory(gateway.config, users=args.users),
+                log=log,
+                upstreams=list(upstreams.values()),
+                messages=args.messages,
+                concurrency=args.concurrency,
+                mix=args.mix,
+                rate=args.rate,
+                drain_timeout=args.drain_timeout,
+            )
+            report = await generator.run()
+    report["upstreams"] = {name: fake.stats() for name, fake in upstreams.items()}
+    return report
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    def latency(row: Dict[str, Any]) -> str:
+        return (
+            "p50={p50_ms} p95={p95_ms} p99={p99_ms} max={max_ms} ms (n={count})".format(
+                **row
+            )
+        )
+
+    print(
+        f"messages:   {report['messages']} sent, {report['accepted']} accepted, "
+        f"{report['delivered']} delivered, {report['lost']} lost"
+    )
+    if report["rejected"]:
+        print(f"rejected:   {report['rejected']}")
+    print(
+        f"throughput: {report['messages_per_second']} msgs/s "
+        f"over {report['duration_s']} s"
+    )
+    print(f"ack:        {latency(report['ack_latency'])}")
+    print(f"end-to-end: {latency(report['end_to_end_latency'])}")
+    for channel, row in report["end_to_end_latency_by_channel"].items():
+        print(f"  {channel:<9} {latency(row)}")
+    print("upstream calls per message:")
+    for name, per_message in report["upstream_calls_per_message"].items():
+        stats = report["upstreams"][name]
+        print(
+            f"  {name:<9} {per_message} ({stats['calls']} calls, "
+            f"{stats['injected_errors']} injected errors)"
+        )
+
+
+def main() -> None:
+    args = _parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # Durable stores go to a throwaway directory, never to ./data
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    os.environ.update(BENCH_ENV)
+    os.environ.update(
+        OUTBOX_PATH=os.path.join(workdir, "outbox.sqlite3"),
+        JOURNAL_PATH=os.path.join(workdir, "inbound.sqlite3"),
+        DEDUPE_PATH=os.path.join(workdir, "dedupe.sqlite3"),
+        TRACE_EXPORT_PATH=os.path.join(workdir, "traces.jsonl"),
+        BUS_SPILL_PATH=os.path.join(workdir, "bus_spill.sqlite3"),
+    )
+
+    report = asyncio.run(_run(args))
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
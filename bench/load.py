@@ -0,0 +1,238 @@
+import asyncio
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.config import AppConfig
+from bench.upstreams import DeliveryLog, FakeUpstream
+
+CHANNELS = ("whatsapp", "vk", "chatwoot")
+
+# (method path, json body, headers) of one webhook
+Webhook = Tuple[str, Dict[str, Any], Dict[str, str]]
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100); None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class WebhookFactory:
+    """Builds realistic webhook bodies for the channels configured in `config`."""
+
+    def __init__(self, config: AppConfig, users: int):
+        self._config = config
+        self._users = max(1, users)
+        # Agent replies go to every messenger that has a Chatwoot webhook id
+        self._reply_channels = {
+            channel: webhook_id
+            for webhook_id, channel in config.chatwoot.channel_by_webhook_id.items()
+            if channel in ("whatsapp", "vk")
+        }
+        self._reply_order = sorted(self._reply_channels)
+
+    def whatsapp(self, n: int, token: str) -> Webhook:
+        wa = self._config.wasender
+        phone = f"7999{n % self._users:07d}"
+        body = {
+            "event": "messages.upsert",
+            "data": {
+                "messages": {
+                    "key": {
+                        "id": f"BENCH{n}",
+                        "fromMe": False,
+                        "remoteJid": f"{phone}@s.whatsapp.net",
+                    },
+                    "pushName": f"Bench {phone}",
+                    "message": {"conversation": f"{token} hello from whatsapp"},
+                }
+            },
+        }
+        return (
+            f"/wasender/webhook/{wa.webhook_id}",
+            body,
+            {"X-Webhook-Signature": wa.webhook_secret},
+        )
+
+    def vk(self, n: int, token: str) -> Webhook:
+        vk = self._config.vk
+        user_id = 100_000 + n % self._users
+        body = {
+            "type": "message_new",
+            "group_id": vk.group_id,
+            "secret": vk.secret,
+            "event_id": f"bench{n}",
+            "object": {
+                "message": {
+                    "id": n + 1,
+                    "from_id": user_id,
+                    "peer_id": user_id,
+                    "text": f"{token} hello from vk",
+                }
+            },
+        }
+        return f"/vk/callback/{vk.callback_id}", body, {}
+
+    def chatwoot(self, n: int, token: str) -> Webhook:
+        """Agent reply on a VK or WhatsApp conversation, alternating between them."""
+        channel = self._reply_order[n % len(self._reply_order)]
+        user = n % self._users
+        sender = (
+            {"custom_attributes": {"vk_peer_id": str(100_000 + user)}}
+            if channel == "vk"
+            else {"phone_number": f"+7999{user:07d}"}
+        )
+        body = {
+            "event": "message_created",
+            "message_type": "outgoing",
+            "id": 1_000_000 + n,
+            "private": False,
+            "content": f"{token} reply from agent",
+            "conversation": {"id": user + 1, "meta": {"sender": sender}},
+        }
+        return f"/chatwoot/webhook/{self._reply_channels[channel]}", body, {}
+
+
+class LoadGenerator:
+    """
+    Fires webhooks at the app and measures how long each message takes to reach
+    its upstream (fake Chatwoot for inbound, fake Wasender/VK for agent replies).
+    - `concurrency` webhooks are in flight at most; `rate` (msgs/s, 0 = as fast as
+      possible) spaces their start times for an open-loop test.
+    - `mix` weights the channels, e.g. {"whatsapp": 1, "vk": 1, "chatwoot": 1}.
+    """
+
+    def __init__(
+        self,
+        *,
+        client: httpx.AsyncClient,
+        factory: WebhookFactory,
+        log: DeliveryLog,
+        upstreams: Sequence[FakeUpstream],
+        messages: int,
+        concurrency: int,
+        mix: Dict[str, float],
+        rate: float = 0.0,
+        drain_timeout: float = 30.0,
+    ):
+        self._client = client
+        self._factory = factory
+        self._log = log
+        self._upstreams = upstreams
+        self._messages = messages
+        self._concurrency = max(1, concurrency)
+        self._rate = rate
+        self._drain_timeout = drain_timeout
+        self._channels = [c for c in CHANNELS if mix.get(c, 0) > 0]
+        self._weights = [mix[c] for c in self._channels]
+        self._sent: Dict[str, Tuple[str, float]] = {}  # token -> (channel, sent at)
+        self._ack_latencies: List[float] = []
+        self._rejected: Dict[str, int] = {}
+
+    def _build(self, n: int) -> Tuple[str, str, Webhook]:
+        channel = random.choices(self._channels, self._weights)[0]
+        token = f"bench-{n}"
+        builder: Callable[[int, str], Webhook] = getattr(self._factory, channel)
+        return channel, token, builder(n, token)
+
+    async def _fire(self, n: int, start: float) -> None:
+        if self._rate > 0:
+            delay = start + n / self._rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        channel, token, (path, body, headers) = self._build(n)
+        sent_at = time.perf_counter()
+        try:
+            resp = await self._client.post(path, json=body, headers=headers)
+            ok = resp.status_code < 300
+        except Exception:
+            ok = False
+        self._ack_latencies.append(time.perf_counter() - sent_at)
+        if ok:
+            self._sent[token] = (channel, sent_at)
+        else:
+            self._rejected[channel] = self._rejected.get(channel, 0) + 1
+
+    async def run(self) -> Dict[str, Any]:
+        calls_before = {u.name: u.calls for u in self._upstreams}
+        queue: "asyncio.Queue[int]" = asyncio.Queue()
+        for n in range(self._messages):
+            queue.put_nowait(n)
+        start = time.perf_counter()
+
+        async def worker() -> None:
+            while not queue.empty():
+                await self._fire(queue.get_nowait(), start)
+
+        await asyncio.gather(*(worker() for _ in range(self._concurrency)))
+        accepted_at = time.perf_counter()
+        await self._log.wait_for(list(self._sent), self._drain_timeout)
+        finished_at = time.perf_counter()
+
+        return self._report(
+            start=start,
+            accepted_at=accepted_at,
+            finished_at=finished_at,
+            calls={u.name: u.calls - calls_before[u.name] for u in self._upstreams},
+        )
+
+    def _report(
+        self,
+        *,
+        start: float,
+        accepted_at: float,
+        finished_at: float,
+        calls: Dict[str, int],
+    ) -> Dict[str, Any]:
+        per_channel: Dict[str, List[float]] = {c: [] for c in self._channels}
+        last_delivery = start
+        for token, (channel, sent_at) in self._sent.items():
+            delivered_at = self._log.delivered.get(token)
+            if delivered_at is not None:
+                per_channel[channel].append(delivered_at - sent_at)
+                last_delivery = max(last_delivery, delivered_at)
+        all_latencies = [v for values in per_channel.values() for v in values]
+        delivered = len(all_latencies)
+        elapsed = max(last_delivery - start, 1e-9)
+
+        def summary(values: Sequence[float]) -> Dict[str, Any]:
+            return {
+                "count": len(values),
+                "p50_ms": _ms(percentile(values, 50)),
+                "p95_ms": _ms(percentile(values, 95)),
+                "p99_ms": _ms(percentile(values, 99)),
+                "max_ms": _ms(max(values) if values else None),
+            }
+
+        return {
+            "messages": self._messages,
+            "accepted": len(self._sent),
+            "rejected": dict(self._rejected),
+            "delivered": delivered,
+            "lost": len(self._sent) - delivered,
+            "duration_s": round(elapsed, 3),
+            "accept_duration_s": round(accepted_at - start, 3),
+            "wall_time_s": round(finished_at - start, 3),
+            "messages_per_second": round(delivered / elapsed, 1),
+            "ack_latency": summary(self._ack_latencies),
+            "end_to_end_latency": summary(all_latencies),
+            "end_to_end_latency_by_channel": {
+                c: summary(values) for c, values in per_channel.items()
+            },
+            "upstream_calls": calls,
+            "upstream_calls_per_message": {
+                name: round(n / delivered, 2) if delivered else None
+                for name, n in calls.items()
+            },
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000.0, 2) if seconds is not None else None
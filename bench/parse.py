@@ -0,0 +1,210 @@
+"""
+Microbenchmark of inbound webhook parsing (CPU per message, no I/O).
+
+    python -m bench.parse --iterations 20000
+
+"legacy" repeats the steps an inbound message used to go through: JSON decoding
+and a generic model in the route, model_dump() for the bus, JSON for the journal,
+re-validation in the adapter and hand-written dict digging in the ingest handlers.
+"envelope" is the current path: the raw body is decoded straight into the typed
+webhook model, normalized once into a frozen UnifiedMessage, serialized once for
+the journal and read as-is by every listener.
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from app.domain.message import TextContent, UnifiedMessage
+from app.domain.webhooks.vk import VkCallback
+from app.domain.webhooks.wasender import WASENDER_WEBHOOK, WasenderUpsertWebhook
+from app.infra.journal import MESSAGE_KEY, inbound_message
+
+WASENDER_BODY = json.dumps(
+    {
+        "event": "messages.upsert",
+        "data": {
+            "messages": {
+                "key": {
+                    "id": "3EB0B430B6F8F1D0E053AC1",
+                    "fromMe": False,
+                    "remoteJid": "79990000001@s.whatsapp.net",
+                },
+                "pushName": "Bench User",
+                "message": {"conversation": "Hello, I have a question about my order"},
+                "messageTimestamp": 1760000000,
+            }
+        },
+        "timestamp": 1760000000123,
+    }
+).encode()
+
+VK_BODY = json.dumps(
+    {
+        "type": "message_new",
+        "group_id": 1,
+        "secret": "bench-secret",
+        "event_id": "5d1a8c0e3f6b2a9d",
+        "v": "5.199",
+        "object": {
+            "message": {
+                "date": 1760000000,
+                "from_id": 100001,
+                "id": 42,
+                "out": 0,
+                "peer_id": 100001,
+                "text": "Hello, I have a question about my order",
+                "conversation_message_id": 7,
+                "fwd_messages": [],
+                "important": False,
+                "attachments": [],
+                "is_hidden": False,
+            },
+            "client_info": {"button_actions": ["text"], "keyboard": True},
+        },
+    }
+).encode()
+
+
+class _LegacyWasenderPayload(BaseModel):
+    """The generic model the Wasender route and adapter used to validate."""
+
+    event: str
+    data: dict
+
+
+def _legacy_wasender(body: bytes) -> None:
+    payload = _LegacyWasenderPayload.model_validate(json.loads(body))
+    payload.data["messages"]["key"]["fromMe"]
+    event = payload.model_dump()
+    json.dumps(event, default=str)
+    # Adapter listener
+    parsed = _LegacyWasenderPayload.model_validate(event)
+    raw = parsed.data["messages"]
+    key = raw.get("key", {})
+    UnifiedMessage(
+        channel="whatsapp",
+        recipient_id=key.get("remoteJid").split("@")[0],
+        sender_id=key.get("remoteJid").split("@")[0],
+        sender_name=raw.get("pushName"),
+        content=TextContent(
+            type="text", text=(raw.get("message") or {}).get("conversation")
+        ),
+        raw=event,
+    )
+    # Lane key, then the ingest handler
+    for _ in range(2):
+        raw = event["data"]["messages"]
+        key = raw.get("key", {}) or {}
+        msg = raw.get("message", {}) or {}
+        (
+            msg.get("conversation")
+            or (msg.get("extendedTextMessage") or {}).get("text")
+            or ""
+        ).strip()
+        (key.get("remoteJid") or key.get("participant") or "").split("@")[0]
+
+
+def _envelope_wasender(body: bytes) -> None:
+    payload = WASENDER_WEBHOOK.validate_json(body)
+    assert isinstance(payload, WasenderUpsertWebhook)
+    payload.key.fromMe
+    event: Dict[str, Any] = {MESSAGE_KEY: payload.to_message()}
+    to_json(event, fallback=str)
+    # Adapter listener, lane key, ingest handler
+    for _ in range(3):
+        inbound_message(event)
+
+
+def _legacy_vk(body: bytes) -> None:
+    payload = json.loads(body)
+    payload.get("type"), payload.get("group_id"), payload.get("secret")
+    message = (payload.get("object") or {}).get("message") or {}
+    payload.get("event_id") or f"message:{message['id']}"
+    event = {"event": "message_new", "message": message, "raw": payload}
+    json.dumps(event, default=str)
+    # Adapter listener
+    msg = event["message"]
+    peer_id = str(msg.get("peer_id"))
+    UnifiedMessage(
+        channel="vk",
+        sender_id=str(msg.get("from_id")),
+        recipient_id=peer_id,
+        content=TextContent(type="text", text=(msg.get("text") or "").strip()),
+        raw=event,
+    )
+    # Lane key, then the ingest handler
+    msg = event.get("message") or {}
+    msg.get("from_id") or msg.get("peer_id")
+    (msg.get("text") or "").strip()
+    str(msg.get("peer_id") or "")
+    str(msg.get("from_id") or "")
+
+
+def _envelope_vk(body: bytes) -> None:
+    payload = VkCallback.model_validate_json(body)
+    payload.type, payload.group_id, payload.secret
+    message = payload.to_message()
+    payload.dedupe_id()
+    event: Dict[str, Any] = {MESSAGE_KEY: message}
+    to_json(event, fallback=str)
+    for _ in range(3):
+        inbound_message(event)
+
+
+def _per_message_us(
+    fn: Callable[[bytes], None], body: bytes, iterations: int, repeat: int
+) -> float:
+    """Best of `repeat` runs, in microseconds per message."""
+    best: Optional[float] = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return (best or 0.0) / iterations * 1e6
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    cases = {
+        "whatsapp": (_legacy_wasender, _envelope_wasender, WASENDER_BODY),
+        "vk": (_legacy_vk, _envelope_vk, VK_BODY),
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    for channel, (legacy, envelope, body) in cases.items():
+        legacy(body), envelope(body)  # warm up
+        before = _per_message_us(legacy, body, args.iterations, args.repeat)
+        after = _per_message_us(envelope, body, args.iterations, args.repeat)
+        results[channel] = {
+            "legacy_us": round(before, 2),
+            "envelope_us": round(after, 2),
+            "saved_us": round(before - after, 2),
+            "speedup": round(before / after, 2) if after else 0.0,
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'channel':<10}{'legacy':>12}{'envelope':>12}{'saved':>12}{'speedup':>9}")
+    for channel, r in results.items():
+        print(
+            f"{channel:<10}{r['legacy_us']:>10.2f}us{r['envelope_us']:>10.2f}us"
+            f"{r['saved_us']:>10.2f}us{r['speedup']:>8.2f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
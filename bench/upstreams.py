@@ -0,0 +1,276 @@
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+# Every benchmark message carries a unique token in its text
+TOKEN_RE = re.compile(r"bench-\d+")
+
+
+class UpstreamBehavior:
+    """Latency and failures injected into every request of one fake upstream."""
+
+    def __init__(
+        self,
+        *,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self) -> float:
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+
+class DeliveryLog:
+    """First arrival time (perf_counter) of every benchmark token at an upstream."""
+
+    def __init__(self):
+        self.delivered: Dict[str, float] = {}
+        self._changed = asyncio.Event()
+
+    def record(self, text: Any) -> None:
+        now = time.perf_counter()
+        for token in TOKEN_RE.findall(str(text or "")):
+            self.delivered.setdefault(token, now)
+        self._changed.set()
+
+    async def wait_for(self, tokens: List[str], timeout: float) -> None:
+        """Return once every token arrived, or after `timeout` seconds."""
+        deadline = time.perf_counter() + timeout
+        while any(t not in self.delivered for t in tokens):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+
+
+class FakeUpstream:
+    """
+    In-process stand-in for an HTTP API, used as an httpx.MockTransport handler.
+    Subclasses implement handle(); latency and errors are applied here.
+    """
+
+    name = ""
+
+    def __init__(self, log: DeliveryLog, behavior: Optional[UpstreamBehavior] = None):
+        self.log = log
+        self.behavior = behavior or UpstreamBehavior()
+        self.calls = 0
+        self.injected_errors = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        delay = self.behavior.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.behavior.error_rate and random.random() < self.behavior.error_rate:
+            self.injected_errors += 1
+            return httpx.Response(
+                self.behavior.error_status, json={"error": "injected"}
+            )
+        return self.handle(request)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        raise NotImplementedError
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "injected_errors": self.injected_errors}
+
+
+class FakeChatwoot(FakeUpstream):
+    """The Chatwoot API v1 endpoints used by ChatwootClient, backed by dicts."""
+
+    name = "chatwoot"
+
+    def __init__(self, log: DeliveryLog, behavior: Optional[UpstreamBehavior] = None):
+        super().__init__(log, behavior)
+        self._ids = 0
+        self.contacts: Dict[int, Dict[str, Any]] = {}
+        self.conversations: Dict[int, Dict[str, Any]] = {}
+        self.messages = 0
+
+    def _next_id(self) -> int:
+        self._ids += 1
+        return self._ids
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        body = json.loads(request.content) if request.content else {}
+
+        if path.endswith("/contacts/search"):
+            q = request.url.params.get("q", "")
+            found = [
+                c
+                for c in self.contacts.values()
+                if q
+                and q
+                in (c.get("phone_number") or "", c.get("identifier") or "", c["name"])
+            ]
+            return httpx.Response(200, json={"payload": found})
+
+        if path.endswith("/contacts/filter"):
+            filters = body.get("payload") or []
+            found = [
+                c
+                for c in self.contacts.values()
+                if all(
+                    str(c["custom_attributes"].get(f["attribute_key"]))
+                    == f["values"][0]
+                    for f in filters
+                )
+            ]
+            return httpx.Response(200, json={"payload": found})
+
+        if path.endswith("/contacts") and request.method == "POST":
+            contact_id = self._next_id()
+            contact = {
+                "id": contact_id,
+                "name": body.get("name") or "",
+                "phone_number": body.get("phone_number"),
+                "identifier": body.get("identifier"),
+                "custom_attributes": dict(body.get("custom_attributes") or {}),
+                "additional_attributes": dict(body.get("additional_attributes") or {}),
+                "contact_inboxes": [
+                    {
+                        "inbox": {"id": body.get("inbox_id")},
+                        "source_id": f"src-{contact_id}",
+                    }
+                ],
+            }
+            self.contacts[contact_id] = contact
+            return httpx.Response(200, json={"payload": {"contact": contact}})
+
+        m = re.search(r"/contacts/(\d+)$", path)
+        if m and request.method == "PATCH":
+            contact = self.contacts.get(int(m.group(1)))
+            if contact is None:
+                return httpx.Response(404, json={"error": "not found"})
+            for key in ("custom_attributes", "additional_attributes"):
+                contact[key].update(body.get(key) or {})
+            return httpx.Response(200, json={"payload": contact})
+
+        m = re.search(r"/contacts/(\d+)/conversations$", path)
+        if m:
+            contact_id = int(m.group(1))
+            payload = [
+                {
+                    "id": conv_id,
+                    "status": conv["status"],
+                    "last_non_activity_message": {
+                        "conversation": {
+                            "contact_inbox": {"source_id": conv["source_id"]}
+                        }
+                    },
+                }
+                for conv_id, conv in self.conversations.items()
+                if conv["contact_id"] == contact_id
+            ]
+            return httpx.Response(200, json={"payload": payload})
+
+        if path.endswith("/conversations") and request.method == "POST":
+            conv_id = self._next_id()
+            self.conversations[conv_id] = {
+                "contact_id": body.get("contact_id"),
+                "source_id": body.get("source_id"),
+                "status": "open",
+            }
+            return httpx.Response(200, json={"id": conv_id})
+
+        m = re.search(r"/conversations/(\d+)/messages$", path)
+        if m:
+            if int(m.group(1)) not in self.conversations:
+                return httpx.Response(404, json={"error": "conversation not found"})
+            self.messages += 1
+            self.log.record(body.get("content"))
+            return httpx.Response(200, json={"id": self._next_id()})
+
+        return httpx.Response(
+            404, json={"error": f"unexpected {request.method} {path}"}
+        )
+
+
+class FakeWasender(FakeUpstream):
+    """Wasender send-message endpoint."""
+
+    name = "wasender"
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/send-message"):
+            body = json.loads(request.content or b"{}")
+            self.log.record(body.get("text"))
+            return httpx.Response(200, json={"success": True, "data": {"msgId": 1}})
+        return httpx.Response(200, json={"success": True})
+
+
+class FakeVk(FakeUpstream):
+    """VK API: users.get, messages.send and execute batches of messages.send."""
+
+    name = "vk"
+
+    _SEND_CALL = "API.messages.send("
+
+    def __init__(self, log: DeliveryLog, behavior: Optional[UpstreamBehavior] = None):
+        super().__init__(log, behavior)
+        self._message_ids = 0
+
+    def _send(self, params: Dict[str, Any]) -> int:
+        self.log.record(params.get("message"))
+        self._message_ids += 1
+        return self._message_ids
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        method = request.url.path.rsplit("/", 1)[-1]
+        params: Dict[str, Any] = dict(request.url.params)
+        if request.content:
+            form = parse_qs(request.content.decode())
+            params.update({k: v[0] for k, v in form.items()})
+
+        if method == "users.get":
+            users = [
+                {
+                    "id": int(uid),
+                    "first_name": "Bench",
+                    "last_name": f"User{uid}",
+                    "city": {"title": "Moscow"},
+                }
+                for uid in str(params.get("user_ids", "")).split(",")
+                if uid.strip().lstrip("-").isdigit()
+            ]
+            return httpx.Response(200, json={"response": users})
+        if method == "messages.send":
+            return httpx.Response(200, json={"response": self._send(params)})
+        if method == "execute":
+            return httpx.Response(200, json={"response": self._execute(params["code"])})
+        return httpx.Response(
+            200, json={"error": {"error_code": 3, "error_msg": "Unknown method"}}
+        )
+
+    def _execute(self, code: str) -> List[Any]:
+        # VkExecuteBatcher sends "return [API.messages.send({...}),...];"
+        decoder = json.JSONDecoder()
+        results: List[Any] = []
+        pos = code.find(self._SEND_CALL)
+        while pos != -1:
+            params, end = decoder.raw_decode(code, pos + len(self._SEND_CALL))
+            results.append(self._send(params))
+            pos = code.find(self._SEND_CALL, end)
+        return results
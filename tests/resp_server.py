@@ -0,0 +1,160 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.infra.state_store import RespStateStore
+
+
+class RespServer:
+    """
+    In-process stand-in for a Redis-protocol server, enough for RespStateStore:
+    PING, AUTH, SELECT, GET, SET [NX] [PX|EX], DEL, INCRBY, PEXPIRE, PTTL and EVAL
+    of the store's own scripts (evaluated in Python).
+    - `delay` holds every reply back, to test timeouts and cancellation.
+    - `commands` records every command received, for assertions on the wire format.
+    """
+
+    def __init__(self, *, delay: float = 0.0):
+        self.delay = delay
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands: List[List[bytes]] = []
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: List[asyncio.StreamWriter] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def stop(self) -> None:
+        for writer in self._clients:
+            writer.close()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        item = self.data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return item
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        self._clients.append(writer)
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    return
+                self.commands.append(args)
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                try:
+                    reply = self._encode(self._dispatch(args))
+                except ValueError as e:
+                    reply = b"-ERR %s\r\n" % str(e).encode()
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    @staticmethod
+    def _encode(reply: Any) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, str):
+            return b"+%s\r\n" % reply.encode()
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+    def _dispatch(self, args: List[bytes]) -> Any:
+        command, rest = args[0].upper().decode(), args[1:]
+        if command in ("PING", "AUTH", "SELECT"):
+            return "PONG" if command == "PING" else "OK"
+        if command == "GET":
+            item = self._live(rest[0])
+            return item[0] if item else None
+        if command == "SET":
+            return self._set(rest[0], rest[1], [o.upper() for o in rest[2:]], rest[2:])
+        if command == "DEL":
+            return sum(1 for key in rest if self.data.pop(key, None) is not None)
+        if command == "INCRBY":
+            return self._incrby(rest[0], int(rest[1]))
+        if command == "PEXPIRE":
+            return self._pexpire(rest[0], int(rest[1]))
+        if command == "PTTL":
+            item = self._live(rest[0])
+            if item is None:
+                return -2
+            return -1 if item[1] is None else int((item[1] - time.monotonic()) * 1000)
+        if command == "EVAL":
+            keys = int(rest[1])
+            return self._eval(rest[0].decode(), rest[2 : 2 + keys], rest[2 + keys :])
+        raise ValueError(f"unknown command '{command}'")
+
+    def _set(
+        self, key: bytes, value: bytes, options: List[bytes], raw: List[bytes]
+    ) -> Any:
+        expires: Optional[float] = None
+        if b"PX" in options:
+            expires = time.monotonic() + int(raw[options.index(b"PX") + 1]) / 1000
+        if b"EX" in options:
+            expires = time.monotonic() + int(raw[options.index(b"EX") + 1])
+        if b"NX" in options and self._live(key) is not None:
+            return None
+        self.data[key] = (value, expires)
+        return "OK"
+
+    def _incrby(self, key: bytes, amount: int) -> int:
+        item = self._live(key)
+        value = int(item[0] if item else 0) + amount
+        self.data[key] = (str(value).encode(), item[1] if item else None)
+        return value
+
+    def _pexpire(self, key: bytes, ms: int) -> int:
+        item = self._live(key)
+        if item is None:
+            return 0
+        self.data[key] = (item[0], time.monotonic() + ms / 1000)
+        return 1
+
+    def _eval(self, script: str, keys: List[bytes], argv: List[bytes]) -> Any:
+        if script == RespStateStore._RELEASE_SCRIPT:
+            item = self._live(keys[0])
+            if item is not None and item[0] == argv[0]:
+                del self.data[keys[0]]
+                return 1
+            return 0
+        if script == RespStateStore._EXTEND_SCRIPT:
+            item = self._live(keys[0])
+            if item is not None and item[0] == argv[0]:
+                return self._pexpire(keys[0], int(argv[1]))
+            return 0
+        if script == RespStateStore._INCR_SCRIPT:
+            amount, ttl_ms = int(argv[0]), int(argv[1])
+            value = self._incrby(keys[0], amount)
+            if ttl_ms > 0 and value == amount:
+                self._pexpire(keys[0], ttl_ms)
+            return value
+        raise ValueError("unknown script")
@@ -0,0 +1,81 @@
+import asyncio
+import time
+import unittest
+from typing import List, Tuple
+
+from telethon import errors
+
+from app.infra.adapters.telegram_telethon import TelegramAdapter
+from app.infra.send_scheduler import SendScheduler
+
+
+class SendSchedulerFloodWaitTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.sent: List[Tuple[float, str, str]] = []
+        self.flooded = False
+        self.scheduler = SendScheduler(
+            name="telegram",
+            send=self._send,
+            throttle_delay=TelegramAdapter._flood_wait_seconds,
+            rate=0,
+            peer_interval=0.0,
+        )
+        self.scheduler.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.scheduler.stop()
+
+    async def _send(self, peer: str, text: str) -> None:
+        started = time.monotonic()
+        await asyncio.sleep(0.01)
+        if text == "a1" and not self.flooded:
+            self.flooded = True
+            self.flood_at = time.monotonic()
+            raise errors.rpcerrorlist.FloodWaitError(request=None, capture=1)
+        self.sent.append((started, peer, text))
+
+    async def test_flood_wait_pauses_every_peer(self) -> None:
+        await self.scheduler.submit("a", "a0")
+        throttled = [
+            asyncio.create_task(self.scheduler.submit("a", text))
+            for text in ("a1", "a2")
+        ]
+        while not self.flooded:
+            await asyncio.sleep(0.005)
+        await asyncio.gather(
+            *throttled,
+            self.scheduler.submit("b", "b0"),
+            self.scheduler.submit("c", "c0"),
+        )
+        self.assertEqual(self.scheduler.stats()["throttled"], 1)
+        # No send to any peer started during the 1s wait
+        for started, peer, text in self.sent[1:]:
+            self.assertGreaterEqual(started, self.flood_at + 0.99, (peer, text))
+        # The throttled message keeps its place in its peer's order
+        self.assertEqual(
+            [text for _, peer, text in self.sent if peer == "a"], ["a0", "a1", "a2"]
+        )
+
+    async def test_long_flood_wait_is_returned_to_the_caller(self) -> None:
+        scheduler = SendScheduler(
+            name="telegram",
+            send=self._always_flooded,
+            throttle_delay=TelegramAdapter._flood_wait_seconds,
+            rate=0,
+            max_wait=5.0,
+        )
+        scheduler.start()
+        try:
+            with self.assertRaises(errors.rpcerrorlist.FloodWaitError):
+                await scheduler.submit("a", "x")
+        finally:
+            await scheduler.stop()
+        self.assertEqual(scheduler.stats()["failed"], 1)
+
+    @staticmethod
+    async def _always_flooded(peer: str, text: str) -> None:
+        raise errors.rpcerrorlist.FloodWaitError(request=None, capture=3600)
+
+
+if __name__ == "__main__":
+    unittest.main()
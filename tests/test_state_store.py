@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+
+from app.infra.metrics import UNLOCKED_RUNS
+from app.infra.state_store import LockTimeout, RespStateStore, best_effort_lock
+from tests.resp_server import RespServer
+
+
+class RespStateStoreTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.server = RespServer()
+        await self.server.start()
+        self.store = RespStateStore(
+            self.server.url, prefix="gw:", timeout=1.0, lock_timeout=0.2
+        )
+        await self.store.open()
+
+    async def asyncTearDown(self) -> None:
+        await self.store.close()
+        await self.server.stop()
+
+    async def test_set_and_get_round_trip_json(self) -> None:
+        await self.store.set("contact", {"id": 7, "name": "Ann"})
+        self.assertEqual(await self.store.get("contact"), {"id": 7, "name": "Ann"})
+        self.assertIn(b"gw:contact", self.server.data)
+        self.assertIsNone(await self.store.get("missing"))
+
+    async def test_set_with_ttl_expires(self) -> None:
+        await self.store.set("conv", 42, ttl=0.05)
+        self.assertEqual(await self.store.get("conv"), 42)
+        await asyncio.sleep(0.1)
+        self.assertIsNone(await self.store.get("conv"))
+
+    async def test_add_only_sets_missing_keys(self) -> None:
+        self.assertTrue(await self.store.add("seen", 1, ttl=10))
+        self.assertFalse(await self.store.add("seen", 2, ttl=10))
+        self.assertEqual(await self.store.get("seen"), 1)
+        await self.store.delete("seen")
+        self.assertTrue(await self.store.add("seen", 3))
+
+    async def test_incr_sets_expiry_once_in_one_command(self) -> None:
+        self.assertEqual(await self.store.incr("budget", 2, ttl=10), 2)
+        self.assertEqual(await self.store.incr("budget", 3, ttl=10), 5)
+        self.assertEqual(await self.store.get("budget"), 5)
+        ttl_ms = self.server._dispatch([b"PTTL", b"gw:budget"])
+        self.assertTrue(0 < ttl_ms <= 10_000)
+        sent = [args[0].upper() for args in self.server.commands]
+        self.assertNotIn(b"INCRBY", sent)
+        self.assertNotIn(b"PEXPIRE", sent)
+
+    async def test_incr_without_ttl_never_expires(self) -> None:
+        await self.store.incr("total")
+        self.assertEqual(self.server._dispatch([b"PTTL", b"gw:total"]), -1)
+
+    async def test_lock_excludes_other_holders(self) -> None:
+        async with self.store.lock("lane:1"):
+            with self.assertRaises(LockTimeout):
+                async with self.store.lock("lane:1", timeout=0.05):
+                    pass
+        async with self.store.lock("lane:1", timeout=0.05):
+            pass
+        self.assertNotIn(b"gw:lock:lane:1", self.server.data)
+
+    async def test_lock_held_past_its_ttl_is_renewed(self) -> None:
+        async with self.store.lock("lane:3", ttl=0.1):
+            await asyncio.sleep(0.35)
+            # Still ours three TTLs later: nobody else can take it
+            self.assertFalse(await self.store.add("lock:lane:3", "other", ttl=10))
+        self.assertIsNone(await self.store.get("lock:lane:3"))
+        self.assertEqual(self.store.stats()["locks"]["lost"], 0)
+
+    async def test_lock_taken_over_is_counted_as_lost(self) -> None:
+        async with self.store.lock("lane:4", ttl=0.1):
+            # Another holder replaces the lock (e.g. the store lost it)
+            await self.store.set("lock:lane:4", "other", ttl=10)
+            await asyncio.sleep(0.1)
+        self.assertEqual(self.store.stats()["locks"]["lost"], 1)
+        self.assertEqual(await self.store.get("lock:lane:4"), "other")
+
+    async def test_best_effort_lock_counts_unlocked_runs(self) -> None:
+        before = UNLOCKED_RUNS.value("timeout")
+        ran = False
+        async with self.store.lock("lane:5"):
+            async with best_effort_lock(self.store, "lane:5", timeout=0.05):
+                ran = True
+        self.assertTrue(ran)
+        self.assertEqual(UNLOCKED_RUNS.value("timeout"), before + 1)
+
+    async def test_release_keeps_a_lock_taken_over_after_expiry(self) -> None:
+        async with self.store.lock("lane:2"):
+            # Expired (e.g. renewals could not reach the server) and taken over
+            # by another holder before this one releases it
+            del self.server.data[b"gw:lock:lane:2"]
+            self.assertTrue(await self.store.add("lock:lane:2", "other", ttl=10))
+        self.assertEqual(await self.store.get("lock:lane:2"), "other")
+
+    async def test_cancelled_command_closes_its_connection(self) -> None:
+        self.server.delay = 0.5
+        task = asyncio.create_task(self.store.get("slow"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(self.store.stats()["connections_idle"], 0)
+        self.server.delay = 0.0
+        await self.store.set("after", 1)
+        self.assertEqual(await self.store.get("after"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()